@@ -2,6 +2,8 @@
 ASGI config for clucker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests for the server-sent events stream of new posts go to
+microblogs.streams, everything else to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -13,4 +15,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'clucker.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from microblogs import streams
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == streams.STREAM_PATH:
+        return await streams.app(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -10,7 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
+import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -27,6 +30,8 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
 
 # Application definition
 
@@ -41,6 +46,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Removes itself at startup unless PROFILING_ENABLED is set
+    'microblogs.profiling.ProfilingMiddleware',
+    # Removes itself at startup unless read replicas are configured
+    'microblogs.routers.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,11 +61,33 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'clucker.urls'
 
+# Request profiling, see microblogs.profiling. Memory tracing with tracemalloc
+# slows every allocation down, so it is enabled separately
+PROFILING_ENABLED = os.environ.get('CLUCKER_PROFILING') == '1'
+PROFILING_TRACE_MEMORY = os.environ.get('CLUCKER_PROFILING_MEMORY') == '1'
+PROFILING_REPEAT_THRESHOLD = 5
+
+# Besides staff, the metrics endpoint is readable by requests with the bearer
+# token CLUCKER_METRICS_TOKEN and from the comma-separated addresses of
+# CLUCKER_METRICS_ALLOWED_IPS; both are off unless set. Only list addresses
+# that cannot be reached through a proxy, which would make every client local
+METRICS_TOKEN = os.environ.get('CLUCKER_METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = list(filter(None, os.environ.get('CLUCKER_METRICS_ALLOWED_IPS', '').split(',')))
+
+
+# Templates
+# CLUCKER_TEMPLATES picks a profile: 'development' (default) keeps the debug
+# information that error pages show for templates, 'production' drops it and
+# compiles the app's templates and form widgets at startup, see
+# microblogs.rendering. Either way the cached loader compiles each template
+# once per process.
+
+TEMPLATE_PROFILE = os.environ.get('CLUCKER_TEMPLATES', 'development')
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -64,23 +95,190 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'debug': DEBUG and TEMPLATE_PROFILE != 'production',
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
+TEMPLATES_PREWARM = TEMPLATE_PROFILE == 'production'
+
+
 WSGI_APPLICATION = 'clucker.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
+# CLUCKER_DB_ENGINE selects 'sqlite' (default) or 'postgres'. Connections are
+# kept open for CLUCKER_DB_CONN_MAX_AGE seconds and health checked before
+# reuse. For pooling across processes run PgBouncer in front of PostgreSQL and
+# set CLUCKER_DB_PGBOUNCER=1, which turns off server-side cursors as
+# transaction pooling requires.
+
+DB_ENGINE = os.environ.get('CLUCKER_DB_ENGINE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('CLUCKER_DB_CONN_MAX_AGE', 60))
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('CLUCKER_DB_NAME', 'clucker'),
+            'USER': os.environ.get('CLUCKER_DB_USER', 'clucker'),
+            'PASSWORD': os.environ.get('CLUCKER_DB_PASSWORD', ''),
+            'HOST': os.environ.get('CLUCKER_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('CLUCKER_DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('CLUCKER_DB_PGBOUNCER') == '1',
+            'OPTIONS': {
+                'connect_timeout': 5,
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('CLUCKER_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Seconds to wait for a write lock before failing
+                'timeout': 20,
+            },
+        }
+    }
+
+# Read replicas and post shards
+# CLUCKER_DB_REPLICAS and CLUCKER_DB_SHARDS are comma-separated lists of
+# PostgreSQL hosts, or of SQLite files when running on SQLite; each entry
+# becomes a database alias copying the default settings. Reads go to a random
+# replica except for a while after a client wrote, see microblogs.routers.
+# Posts are partitioned by author across the shards, see microblogs.sharding.
+# Locally, replicas can be copies of the database file (sqlite3 .backup) and
+# shards empty files migrated with `migrate --database shard1`.
+
+def _copy_database(location):
+    copy = {**DATABASES['default'], 'TEST': {}}
+    copy['HOST' if DB_ENGINE == 'postgres' else 'NAME'] = location
+    return copy
+
+DATABASE_REPLICAS = []
+for index, location in enumerate(filter(None, os.environ.get('CLUCKER_DB_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{index}'] = {**_copy_database(location), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+POST_SHARDS = []
+for index, location in enumerate(filter(None, os.environ.get('CLUCKER_DB_SHARDS', '').split(',')), 1):
+    DATABASES[f'shard{index}'] = _copy_database(location)
+    POST_SHARDS.append(f'shard{index}')
+
+if TESTING:
+    # Stand-ins the router and sharding tests enable with override_settings
+    DATABASES.setdefault('replica1', {**_copy_database(''), 'TEST': {'MIRROR': 'default'}})
+    DATABASES.setdefault('shard1', _copy_database(''))
+    DATABASES.setdefault('shard2', _copy_database(''))
+
+DATABASE_ROUTERS = [
+    *(['microblogs.routers.AuthorShardRouter'] if POST_SHARDS else []),
+    *(['microblogs.routers.PrimaryReplicaRouter'] if DATABASE_REPLICAS else []),
+]
+
+# Seconds a client that wrote keeps reading from the primary
+REPLICA_STICKY_SECONDS = 5
+
+# Applied to every new SQLite connection, see microblogs.db. WAL lets readers
+# run alongside the single writer, and synchronous=NORMAL is safe in WAL mode.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# CLUCKER_CACHE_URL points the cache at a shared backend: redis://host:6379/0
+# (or rediss://, unix://) for Redis, memcached://host:11211 for Memcached.
+# Without it every process has its own LocMemCache, which is only fit for
+# development and tests: the version stamps of microblogs.cache, which decide
+# whether a fragment, feed page or ETag is still current, must be seen by
+# every process, so with more than one worker a shared backend is required.
+
+CACHE_URL = os.environ.get('CLUCKER_CACHE_URL', '')
+
+if CACHE_URL.startswith(('redis://', 'rediss://', 'unix://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+elif CACHE_URL.startswith('memcached://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': CACHE_URL.removeprefix('memcached://').split(','),
+        }
+    }
+elif CACHE_URL:
+    raise ValueError(f'Unsupported CLUCKER_CACHE_URL: {CACHE_URL}')
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            # The default of 300 entries would cull version stamps within seconds
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
     }
+
+# A LocMemCache is as good as a shared cache when only one process uses it:
+# under the test runner, or with CLUCKER_SINGLE_PROCESS=1 for a development
+# server. Otherwise microblogs.checks refuses cached sessions and users on it
+CACHE_SINGLE_PROCESS = TESTING or os.environ.get('CLUCKER_SINGLE_PROCESS') == '1'
+CACHE_SHARED = bool(CACHE_URL) or CACHE_SINGLE_PROCESS
+
+# Entries kept in each process's local LRU in front of the shared cache
+FRAGMENT_CACHE_LOCAL_SIZE = 10000
+FRAGMENT_CACHE_TIMEOUT = 300
+FEED_PAGE_CACHE_TIMEOUT = 30
+
+
+# Sessions and authentication
+# CLUCKER_SESSIONS picks the session engine: 'cached_db' reads sessions from
+# the cache and writes them through to the database, 'cache' keeps them in
+# the cache only, 'signed_cookies' keeps them in a signed cookie with no
+# server storage, and 'db' reads the session table on every request. With a
+# shared cache, sessions default to 'cached_db' and logged in users are
+# loaded from a per-process LRU of AUTH_USER_CACHE_SIZE users, see
+# microblogs.backends. Both rely on logouts and user changes reaching every
+# process through the cache, so without one sessions default to 'db' and
+# users are read from the database; ModelBackend stays listed either way so
+# sessions logged in with it remain valid.
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
 }
 
+SESSION_ENGINE = SESSION_ENGINES[os.environ.get('CLUCKER_SESSIONS', 'cached_db' if CACHE_SHARED else 'db')]
+
+AUTHENTICATION_BACKENDS = [
+    *(['microblogs.backends.CachedModelBackend'] if CACHE_SHARED else []),
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+AUTH_USER_CACHE_SIZE = 10000
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -101,6 +299,86 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/4.1/topics/auth/passwords/
+# CLUCKER_PASSWORD_PROFILE picks one of the hasher lists below. 'production'
+# prefers Argon2 (needs argon2-cffi) and falls back to scrypt, while keeping
+# PBKDF2 so existing hashes still verify and are upgraded on the next login.
+# 'fast' is a deliberately weak hasher that the test runner uses automatically;
+# never select it for a real deployment.
+
+PASSWORD_HASHER_PROFILES = {
+    'default': [
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    ],
+    'production': [
+        *(['microblogs.hashers.TunedArgon2PasswordHasher'] if find_spec('argon2') else []),
+        'microblogs.hashers.TunedScryptPasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    ],
+    'fast': [
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ],
+}
+
+PASSWORD_PROFILE = os.environ.get('CLUCKER_PASSWORD_PROFILE', 'fast' if TESTING else 'default')
+
+PASSWORD_HASHERS = PASSWORD_HASHER_PROFILES[PASSWORD_PROFILE]
+
+# Cost parameters of the tuned production hashers (memory cost in KiB)
+ARGON2_TIME_COST = 3
+ARGON2_MEMORY_COST = 65536
+ARGON2_PARALLELISM = 4
+SCRYPT_WORK_FACTOR = 2 ** 14
+SCRYPT_BLOCK_SIZE = 8
+SCRYPT_PARALLELISM = 1
+
+# Sign ups hash passwords on a pool of this many threads
+PASSWORD_HASHING_WORKERS = os.cpu_count() or 1
+
+# Username and email availability checks, see microblogs.availability
+AVAILABILITY_FILTER_ERROR_RATE = 0.01
+AVAILABILITY_FILTER_MAX_AGE = 300
+
+# Rate limits, see microblogs.ratelimit. Each is (requests, seconds): a
+# client may burst up to `requests` and then go on at requests/seconds.
+# CLUCKER_RATELIMIT picks where the counts live: 'memory' (default) keeps
+# token buckets in each process, so a client gets the allowance once per
+# worker, and 'cache' shares sliding window counts through the default cache.
+# The test runner turns the limits off; their own tests turn them back on.
+
+RATELIMIT_BACKEND = os.environ.get('CLUCKER_RATELIMIT', 'memory')
+RATELIMIT_ENABLED = not TESTING
+RATELIMITS = {
+    # Per address; every sign up hashes a password
+    'sign_up': (10, 3600),
+    # Per logged in user
+    'new_post': (30, 60),
+    # Per address, against enumerating accounts
+    'availability': (60, 60),
+}
+RATELIMIT_MEMORY_SIZE = 100000
+
+# Server-sent events of new posts, served by clucker.asgi at /feed/events,
+# see microblogs.streams. CLUCKER_STREAM_BACKEND picks how posts reach the
+# streams: 'local' (default) only reaches streams of the worker that wrote
+# the post, 'postgres' reaches every worker through LISTEN/NOTIFY.
+
+STREAM_BACKEND = os.environ.get('CLUCKER_STREAM_BACKEND', 'local')
+# Events buffered per stream before it falls back to catching up
+STREAM_QUEUE_SIZE = 100
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_CATCH_UP_LIMIT = 200
+# Catching up starts this much before the last post sent, for posts that
+# committed after newer ones
+STREAM_CATCH_UP_OVERLAP_SECONDS = 30
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
 
@@ -124,4 +402,29 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # User model for authentication purposes
-AUTH_USER_MODEL = 'microblogs.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'microblogs.User'
+
+# Timelines
+# Posts are pushed into at most TIMELINE_LENGTH entries per follower timeline;
+# authors with TIMELINE_FANOUT_LIMIT or more followers are merged in at read time
+TIMELINE_LENGTH = 800
+TIMELINE_FANOUT_LIMIT = 10000
+FEED_PAGE_SIZE = 50
+
+# Trending hashtags
+# Post counts are kept per hashtag in TRENDING_BUCKET_SECONDS buckets; buckets
+# in the last TRENDING_WINDOW_MINUTES are scored with an exponential decay
+TRENDING_BUCKET_SECONDS = 60
+TRENDING_WINDOW_MINUTES = 60
+TRENDING_HALF_LIFE_MINUTES = 15
+TRENDING_SIZE = 10
+# Run refresh_trending more often than this, e.g. with --interval 60
+TRENDING_SNAPSHOT_TIMEOUT = 300
+
+# Jobs
+# With POST_PROCESSING = 'queue', timeline fan-out and hashtag and mention
+# indexing run in the runworker command instead of the saving request
+POST_PROCESSING = os.environ.get('CLUCKER_POST_PROCESSING', 'inline')
+JOB_MAX_ATTEMPTS = 5
+JOB_BACKOFF_SECONDS = 5
+JOB_LEASE_SECONDS = 300
@@ -21,6 +21,22 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.home, name='home'),
     path('feed/', views.feed, name='feed'),
-    path('sign_up/', views.sign_up, name='sign_up')
+    path('new_post/', views.new_post, name='new_post'),
+    path('users/<int:user_id>/', views.profile, name='profile'),
+    path('search/', views.search_view, name='search'),
+    path('tags/<str:name>/', views.hashtag, name='hashtag'),
+    path('mentions/', views.mentions, name='mentions'),
+    path('trending.json', views.trending_json, name='trending_json'),
+    path('feed.json', views.feed_json, name='feed_json'),
+    path('users/<int:user_id>/posts.json', views.user_posts_json, name='user_posts_json'),
+    path('tags/<str:name>.json', views.hashtag_json, name='hashtag_json'),
+    path('async/feed.json', views.feed_async, name='feed_async'),
+    path('async/new_post/', views.new_post_async, name='new_post_async'),
+    path('async/users/<int:user_id>.json', views.profile_async, name='profile_async'),
+    path('export.jsonl', views.export_jsonl, name='export_jsonl'),
+    path('metrics', views.metrics, name='metrics'),
+    path('metrics/cache.json', views.cache_stats, name='cache_stats'),
+    path('sign_up/', views.sign_up, name='sign_up'),
+    path('sign_up/availability.json', views.availability_json, name='availability_json'),
 
 ]
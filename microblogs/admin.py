@@ -1,18 +1,142 @@
 #Configuration of the admin interface for microblogs
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import models
+from django.db.models import F, Max, Min
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .db import estimated_count
 from .models import User, Post
 
+#Tables estimated to hold fewer rows than this are counted exactly
+EXACT_COUNT_THRESHOLD = 100000
+#Filtered changelists count at most this many rows
+FILTERED_COUNT_LIMIT = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    #Avoids COUNT(*) over a whole large table, which reads every row
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= EXACT_COUNT_THRESHOLD:
+                return estimate
+            return queryset.count()
+        #Counting a LIMIT subquery stops after FILTERED_COUNT_LIMIT rows, so
+        #later pages of a very large filtered result are not linked
+        return queryset[:FILTERED_COUNT_LIMIT].count()
+
+
+class ProbedDatesQuerySet(models.QuerySet):
+    """A queryset whose datetimes() probes index ranges.
+
+    The admin date hierarchy lists the years, months or days that have rows
+    with datetimes(), which truncates the field of every row and so scans the
+    whole table. Here the bounds come from the first and last row in index
+    order, then each candidate period is checked with an EXISTS over its
+    range, all of which an index on the field answers without a scan.
+    """
+
+    def aggregate(self, *args, **kwargs):
+        #MIN and MAX in one statement make SQLite scan, so the date hierarchy's
+        #bounds query is answered by one index probe per bound instead
+        if args or not kwargs or self.query.is_sliced or self.query.distinct:
+            return super().aggregate(*args, **kwargs)
+        plain = all(
+            type(aggregate) in (Min, Max) and len(aggregate.source_expressions) == 1
+            and isinstance(aggregate.source_expressions[0], F) and aggregate.filter is None
+            for aggregate in kwargs.values()
+        )
+        if not plain:
+            return super().aggregate(*args, **kwargs)
+        result = {}
+        for alias, aggregate in kwargs.items():
+            field_name = aggregate.source_expressions[0].name
+            order = field_name if isinstance(aggregate, Min) else '-' + field_name
+            result[alias] = (
+                self.filter(**{f'{field_name}__isnull': False})
+                .order_by(order)
+                .values_list(field_name, flat=True)
+                .first()
+            )
+        return result
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None, is_dst=None):
+        if kind not in ('year', 'month', 'day'):
+            return super().datetimes(field_name, kind, order, tzinfo, is_dst)
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        if settings.USE_TZ:
+            tzinfo = tzinfo or timezone.get_current_timezone()
+            bounds = {key: timezone.localtime(value, tzinfo) for key, value in bounds.items()}
+        periods = []
+        start = _truncate(bounds['first'], kind)
+        while start <= bounds['last']:
+            end = _next_period(start, kind)
+            if self.filter(**{f'{field_name}__gte': start, f'{field_name}__lt': end}).exists():
+                periods.append(start)
+            start = end
+        return periods if order == 'ASC' else periods[::-1]
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    #Changelists that stay fast on large tables
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return ProbedDatesQuerySet(model=queryset.model, query=queryset.query, using=queryset._db)
+
+
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(ScalableModelAdmin):
     #Configuration of the admin interface for users
     list_display = [
         'username', 'first_name', 'last_name', 'email', 'is_active',
     ]
+    list_filter = [
+        'is_active',
+    ]
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(ScalableModelAdmin):
     #Configuration of the admin interface for posts
     list_display = [
         'author', 'text', 'created_at',
     ]
+    list_select_related = [
+        'author',
+    ]
+    list_filter = [
+        'created_at',
+    ]
+    date_hierarchy = 'created_at'
+    raw_id_fields = [
+        'author',
+    ]
+
+
+def _truncate(moment, kind):
+    if kind == 'year':
+        moment = moment.replace(month=1)
+    if kind in ('year', 'month'):
+        moment = moment.replace(day=1)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
 
+def _next_period(start, kind):
+    #Arithmetic on zoneinfo datetimes is on wall time, so boundaries stay at
+    #midnight across DST changes
+    if kind == 'day':
+        return start + timedelta(days=1)
+    if kind == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start.replace(year=start.year + 1)
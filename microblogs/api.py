@@ -0,0 +1,175 @@
+"""Compact JSON pages of posts for polling clients, with conditional GETs.
+
+A page is validated by the version stamps of microblogs.cache instead of by
+its content, so an unchanged poll is answered 304 without a query:
+
+- a feed page by its cached (post, author) refs, see fragments.feed_page,
+  and the post and user stamps of those refs;
+- an author's posts by the 'author' stamp, bumped whenever one of their posts
+  is saved or deleted, and their 'user' stamp;
+- a hashtag's posts by the post ids of the page, which takes one index scan.
+
+A changed page is serialized from values() rows and its body kept in the
+cache under its ETag, so other clients polling the same page are answered
+without queries too. Last-Modified, the newest created_at of the page, is
+sent but not used to answer 304, as it does not change when a post is
+edited or deleted. The stamps must be in a cache every process shares, see
+microblogs.checks; otherwise a worker that missed a bump keeps answering
+304 for a changed page. `?fields=` picks a subset of FIELDS. Bodies are encoded
+with orjson when it is installed.
+"""
+import hashlib
+import zlib
+
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from microblogs import archive, fragments, pagination, sharding
+from microblogs.cache import fragment_cache
+from microblogs.models import ArchivedPost, Post, PostHashtag, User
+
+try:
+    import orjson
+except ImportError:
+    import json
+    _encoder = json.JSONEncoder(ensure_ascii=False, check_circular=False, separators=(',', ':'))
+
+    def encode(data):
+        return _encoder.encode(data).encode()
+else:
+    encode = orjson.dumps
+
+#The fields of a post, in the order of the rows below
+FIELDS = ('id', 'author', 'text', 'created_at')
+BODY_TIMEOUT = fragments.FRAGMENT_TIMEOUT
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def parse_fields(value):
+    """Return the FIELDS named in a comma-separated `value`, in FIELDS order.
+
+    All fields for an empty value; raises InvalidFields for unknown names.
+    """
+    if not value:
+        return FIELDS
+    names = set(value.split(','))
+    unknown = names.difference(FIELDS)
+    if unknown:
+        raise InvalidFields(f'Unknown fields: {", ".join(sorted(unknown))}')
+    return tuple(field for field in FIELDS if field in names)
+
+def feed_response(request, user, cursor, fields):
+    #Raises pagination.InvalidCursor for a malformed cursor
+    refs, next_cursor, loaded = fragments.feed_page(user, cursor)
+    versions = fragment_cache.versions(
+        [('post', post_id) for post_id, _ in refs] + [('user', author_id) for _, author_id in refs]
+    )
+    etag = make_etag('feed', user.pk, cursor, fields, refs, sorted(versions.items()))
+
+    def load():
+        if loaded:
+            return [post_row(loaded[post_id]) for post_id, _ in refs if post_id in loaded], next_cursor
+        return post_rows([post_id for post_id, _ in refs]), next_cursor
+    return conditional_response(request, etag, fields, load)
+
+def author_response(request, author_id, cursor, fields):
+    #Raises pagination.InvalidCursor for a malformed cursor and Http404 for a
+    #missing author, the latter only once the page has changed
+    pagination.decode_cursor(cursor)
+    versions = fragment_cache.versions([('author', author_id), ('user', author_id)])
+    etag = make_etag('author', author_id, cursor, fields, sorted(versions.items()))
+
+    def load():
+        author = get_object_or_404(User, pk=author_id)
+        page = archive.author_page(author.pk, cursor)
+        return [post_row(post) for post in page.items], page.next_cursor
+    return conditional_response(request, etag, fields, load)
+
+def hashtag_response(request, name, cursor, fields):
+    #Raises pagination.InvalidCursor for a malformed cursor
+    limit = pagination.PAGE_SIZE
+    links = pagination.older_than(
+        PostHashtag.objects.filter(hashtag__name=name.lower()), pagination.decode_cursor(cursor), 'post_id'
+    )
+    keys = list(
+        links.order_by('-created_at', '-post_id').values_list('created_at', 'post_id', 'post__author_id')[:limit + 1]
+    )
+    next_cursor = None
+    if len(keys) > limit:
+        keys = keys[:limit]
+        next_cursor = pagination.encode_cursor(*keys[-1][:2])
+    refs = [(post_id, author_id) for _, post_id, author_id in keys]
+    versions = fragment_cache.versions(
+        [('post', post_id) for post_id, _ in refs] + [('user', author_id) for _, author_id in refs]
+    )
+    etag = make_etag('hashtag', name.lower(), cursor, fields, refs, sorted(versions.items()))
+    return conditional_response(
+        request, etag, fields, lambda: (post_rows([post_id for post_id, _ in refs]), next_cursor)
+    )
+
+def conditional_response(request, etag, fields, load):
+    """Answer a GET of a page validated by `etag`.
+
+    `load()` returns the page's rows and next cursor and is only called when
+    the body is neither cached nor matched by If-None-Match.
+    """
+    key = f'api:{etag}'
+    response = get_conditional_response(request, etag=etag)
+    cached = fragment_cache.get_many([key], 'api').get(key)
+    if response is None and cached is None:
+        rows, next_cursor = load()
+        last_modified = max((row[3] for row in rows), default=None)
+        last_modified = last_modified and int(last_modified.timestamp())
+        cached = (encode_page(rows, fields, next_cursor), last_modified)
+        fragment_cache.set_many({key: cached}, BODY_TIMEOUT)
+    last_modified = cached[1] if cached else None
+    if response is None:
+        response = HttpResponse(cached[0], content_type='application/json')
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    #Clients may keep the page but must ask whether it is still current
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+def post_rows(post_ids):
+    """Return (id, author, text, created_at) rows of the posts, in order.
+
+    Posts that no longer exist are skipped; archived posts are read from the
+    archive.
+    """
+    if sharding.enabled():
+        posts = sharding.in_bulk(post_ids)
+        rows = {post_id: post_row(post) for post_id, post in posts.items()}
+    else:
+        rows = {
+            row[0]: row
+            for row in Post.objects.filter(pk__in=post_ids).values_list('id', 'author__username', 'text', 'created_at')
+        }
+    missing = [post_id for post_id in post_ids if post_id not in rows]
+    if missing:
+        archived = ArchivedPost.objects.filter(pk__in=missing).values_list(
+            'id', 'author__username', 'compressed_text', 'created_at'
+        )
+        for post_id, author, compressed_text, created_at in archived:
+            rows[post_id] = (post_id, author, zlib.decompress(compressed_text).decode(), created_at)
+    return [rows[post_id] for post_id in post_ids if post_id in rows]
+
+def encode_page(rows, fields, next_cursor):
+    return encode({'posts': [post_json(row, fields) for row in rows], 'next_cursor': next_cursor})
+
+def post_json(row, fields=FIELDS):
+    #The JSON object of a post row with the given fields
+    row = (row[0], row[1], row[2], row[3].isoformat())
+    return {field: row[FIELDS.index(field)] for field in fields}
+
+def post_row(post):
+    return (post.pk, post.author.username, post.text, post.created_at)
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class MicroblogsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'microblogs'
+
+    def ready(self):
+        from microblogs import checks, db, sharding, signals
+        connection_created.connect(db.configure_connection)
+        post_migrate.connect(sharding.reserve_id_ranges)
+        if getattr(settings, 'TEMPLATES_PREWARM', False):
+            from microblogs import rendering
+            rendering.warm()
@@ -0,0 +1,144 @@
+"""Archival of cold posts.
+
+Almost every read is of recent posts, yet the Post table, its indexes and the
+timeline, tag and search tables derived from it keep growing. archive_posts
+moves posts older than POST_ARCHIVE_AFTER_DAYS to ArchivedPost in batches:
+the text is stored zlib-compressed and the post is deleted together with
+everything derived from it, so the hot tables only hold recent posts. On
+PostgreSQL the archive is partitioned by month, so a whole month can later
+be detached or dropped at once; SQLite keeps it in one table.
+
+Archived posts are older than every post left in the Post table, so profile
+and feed pages read the hot tables only and continue into the archive once
+those run out, i.e. when a reader scrolls deep. A feed runs out of timeline
+before it runs out of posts, as timelines are trimmed, so it goes on with
+the Post table before it turns to the archive. Archived posts leave the
+search index and the hashtag and mention pages. Posts on shards, see
+microblogs.sharding, are not archived.
+"""
+import heapq
+import zlib
+from datetime import timedelta, timezone as dt_timezone
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from microblogs import pagination, sharding
+from microblogs.bulk import delete_cascade
+from microblogs.models import ArchivedPost, Follow, Post
+from microblogs.pagination import older_than
+
+ARCHIVE_AFTER_DAYS = getattr(settings, 'POST_ARCHIVE_AFTER_DAYS', 365)
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def cutoff(days=ARCHIVE_AFTER_DAYS):
+    return timezone.now() - timedelta(days=days)
+
+def compress(text):
+    return zlib.compress(text.encode(), 9)
+
+def archive_batch(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move up to `batch_size` of the oldest posts created before `before`.
+
+    Returns the number of posts archived, 0 once none are left.
+    """
+    #Read outside the transaction, as a read-then-write transaction on
+    #SQLite fails rather than waits when another writer commits in between
+    rows = list(
+        Post.objects
+        .filter(created_at__lt=before)
+        .order_by('created_at', 'id')
+        .values_list('id', 'author_id', 'text', 'created_at')[:batch_size]
+    )
+    if not rows:
+        return 0
+    ensure_partitions({created_at for _, _, _, created_at in rows})
+    with transaction.atomic():
+        ArchivedPost.objects.bulk_create(
+            [
+                ArchivedPost(id=post_id, author_id=author_id, compressed_text=compress(text), created_at=created_at)
+                for post_id, author_id, text, created_at in rows
+            ],
+            ignore_conflicts = True,
+        )
+        #No signals, so the authors' posts_count still counts archived posts
+        delete_cascade(Post.objects.filter(pk__in=[row[0] for row in rows]))
+    return len(rows)
+
+def ensure_partitions(moments, using='default'):
+    #Create the monthly archive partitions holding `moments`, on PostgreSQL
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    table = ArchivedPost._meta.db_table
+    months = sorted({_month_start(moment) for moment in moments})
+    with connection.cursor() as cursor:
+        for month in months:
+            following = (month + timedelta(days=32)).replace(day=1)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {table}_p{month:%Y%m} PARTITION OF {table} '
+                'FOR VALUES FROM (%s) TO (%s)',
+                [month, following],
+            )
+
+def archived_posts(queryset, before, limit):
+    #Up to `limit` archived posts older than the key `before`, as unsaved Posts
+    archived = older_than(queryset, before).select_related('author').order_by('-created_at', '-id')[:limit]
+    return [post.to_post() for post in archived]
+
+def author_page(author_id, cursor=None, limit=pagination.PAGE_SIZE):
+    """Return a Page of an author's posts, continuing into the archive.
+
+    Raises pagination.InvalidCursor for a malformed cursor.
+    """
+    before = pagination.decode_cursor(cursor)
+    hot = older_than(sharding.author_posts(author_id), before)
+    posts = sharding.attach_authors(list(hot.order_by('-created_at', '-id')[:limit + 1]))
+    if len(posts) <= limit:
+        posts += archived_posts(
+            ArchivedPost.objects.filter(author_id=author_id), _last_key(posts, before), limit + 1 - len(posts)
+        )
+    return pagination.make_page(posts, limit)
+
+async def aauthor_page(author_id, cursor=None, limit=pagination.PAGE_SIZE):
+    #Async author_page, for use with the async ORM
+    before = pagination.decode_cursor(cursor)
+    hot = older_than(sharding.author_posts(author_id), before)
+    posts = [post async for post in hot.order_by('-created_at', '-id')[:limit + 1]]
+    if len(posts) <= limit:
+        archived = older_than(ArchivedPost.objects.filter(author_id=author_id), _last_key(posts, before))
+        posts += [
+            post.to_post()
+            async for post in archived.select_related('author').order_by('-created_at', '-id')[:limit + 1 - len(posts)]
+        ]
+    return pagination.make_page(posts, limit)
+
+def fill_feed(user_id, posts, limit, before=None):
+    #Continue a feed page that ran out of timeline with older posts of the
+    #user and their followees. Trimmed timeline entries leave their posts in
+    #the Post table, so read that first and only merge in the archive once
+    #the page reaches back past the cutoff, where archived posts may start
+    if len(posts) >= limit:
+        return posts
+    author_ids = [user_id, *Follow.objects.filter(follower_id=user_id).values_list('followee_id', flat=True)]
+    before = _last_key(posts, before)
+    wanted = limit - len(posts)
+    hot = older_than(Post.objects.filter(author_id__in=author_ids), before)
+    hot = list(hot.select_related('author').order_by('-created_at', '-id')[:wanted])
+    if len(hot) == wanted and hot[-1].created_at >= cutoff():
+        return posts + hot
+    archived = archived_posts(ArchivedPost.objects.filter(author_id__in=author_ids), before, wanted)
+    older = heapq.merge(hot, archived, key=lambda post: (post.created_at, post.pk), reverse=True)
+    return posts + list(islice(older, wanted))
+
+def _last_key(posts, before):
+    if not posts:
+        return before
+    return posts[-1].created_at, posts[-1].pk
+
+def _month_start(moment):
+    moment = moment.astimezone(dt_timezone.utc)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
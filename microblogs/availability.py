@@ -0,0 +1,157 @@
+"""Username and email availability checks answered from Bloom filters.
+
+Every process keeps a Bloom filter of the usernames and one of the emails in
+use. A value the filter has never seen is certainly free, which answers the
+usual check for a new name without a query; a probable hit is confirmed
+against the unique index. The filters are built on first use by streaming
+the two columns, take new users as they are saved in this process, and are
+rebuilt after AVAILABILITY_FILTER_MAX_AGE seconds or once they hold more
+values than they were sized for, which also picks up users created by other
+processes or with bulk_create. A rebuild scans outside the lock while the
+old filters keep answering; until the first build is done, checks query.
+An answer is advice for the sign up form, whose unique checks stay the
+authority. The view rate limits checks per client address, as they would
+otherwise let anyone enumerate the accounts.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from microblogs.models import User
+
+FIELDS = ('username', 'email')
+ERROR_RATE = getattr(settings, 'AVAILABILITY_FILTER_ERROR_RATE', 0.01)
+MAX_AGE = getattr(settings, 'AVAILABILITY_FILTER_MAX_AGE', 300)
+#Filters are sized for this many times the values present when built
+HEADROOM = 2
+MIN_CAPACITY = 10000
+SCAN_CHUNK_SIZE = 5000
+
+
+class BloomFilter:
+    """A set that may answer a false "present" but never a false "absent"."""
+
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def _positions(self, value):
+        #Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+
+class _Filters:
+    #The filters of this process, shared by its threads
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filters = None
+        self.built_at = 0
+        #Users saved while a build scans the table, None when no build runs
+        self.pending = None
+
+    def get(self):
+        """Return the filters, or None while the first ones are being built.
+
+        Stale filters are rebuilt by one caller, outside the lock, while the
+        other threads go on using them; the new ones are swapped in whole.
+        """
+        with self.lock:
+            if self.pending is not None or not (self.filters is None or self._stale()):
+                return self.filters
+            pending = self.pending = []
+        filters = None
+        try:
+            filters = _build()
+        finally:
+            with self.lock:
+                #A reset() during the build drops its result
+                if self.pending is pending:
+                    self.pending = None
+                    if filters is not None:
+                        for values in pending:
+                            _add(filters, values)
+                        self.filters = filters
+                        self.built_at = time.monotonic()
+        return filters
+
+    def add(self, user):
+        values = [getattr(user, field) for field in FIELDS]
+        with self.lock:
+            if self.filters is not None:
+                _add(self.filters, values)
+            if self.pending is not None:
+                self.pending.append(values)
+
+    def reset(self):
+        with self.lock:
+            self.filters = None
+            self.pending = None
+
+    def _stale(self):
+        if time.monotonic() - self.built_at > MAX_AGE:
+            return True
+        return any(bloom.count > bloom.capacity for bloom in self.filters.values())
+
+
+_filters = _Filters()
+
+
+def normalize(field, value):
+    if field == 'email':
+        return User.objects.normalize_email(value)
+    return User.normalize_username(value)
+
+def check(field, value):
+    """Return a dict saying whether `value` is free for the User `field`.
+
+    Values the field would reject are reported with their errors.
+    """
+    value = normalize(field, value)
+    try:
+        User._meta.get_field(field).run_validators(value)
+    except ValidationError as error:
+        return {'value': value, 'available': False, 'errors': error.messages}
+    filters = _filters.get()
+    if filters is not None and value not in filters[field]:
+        return {'value': value, 'available': True}
+    return {'value': value, 'available': not User.objects.filter(**{field: value}).exists()}
+
+def user_saved(user):
+    #Called by the post_save handler of User when a checked field was saved
+    _filters.add(user)
+
+def reset():
+    #Drop the filters of this process; the next check builds them again
+    _filters.reset()
+
+def _add(filters, values):
+    for field, value in zip(FIELDS, values):
+        filters[field].add(value)
+
+def _build():
+    rows = User.objects.values_list(*FIELDS).order_by()
+    capacity = max(MIN_CAPACITY, rows.count() * HEADROOM)
+    filters = {field: BloomFilter(capacity) for field in FIELDS}
+    for username, email in rows.iterator(chunk_size=SCAN_CHUNK_SIZE):
+        filters['username'].add(username)
+        filters['email'].add(email)
+    return filters
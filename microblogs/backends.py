@@ -0,0 +1,45 @@
+"""An authentication backend that loads request users from memory.
+
+AuthenticationMiddleware loads the logged in user with a query on every
+request that touches request.user. CachedModelBackend keeps the users it
+loaded in a per-process LRU, keyed by user id and an 'auth' version stamp of
+microblogs.cache that is bumped whenever a user is saved or deleted, so a
+password change, deactivation or edit is seen by the next request of every
+process that shares the cache. It is only listed in AUTHENTICATION_BACKENDS
+when there is such a cache, see microblogs.checks. Fields changed with
+QuerySet.update() without saving, such as the denormalized counters, can be
+stale on request.user; views that show them read the user again.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+
+from microblogs.cache import LRUCache, fragment_cache
+from microblogs.models import User
+
+USER_CACHE_SIZE = getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000)
+
+_users = LRUCache(USER_CACHE_SIZE)
+
+
+class CachedModelBackend(ModelBackend):
+
+    def get_user(self, user_id):
+        #The version is read first, so a save racing the load below can only
+        #leave newer data under an older version; a load of the old row while
+        #the save is uncommitted is orphaned by the bump again on commit
+        version = fragment_cache.versions([('auth', user_id)])[('auth', user_id)]
+        values = _users.get((user_id, version))
+        if values is not None:
+            #A fresh instance per request, as views may modify request.user
+            return User.from_db('default', _field_names(), values)
+        user = super().get_user(user_id)
+        if user is not None:
+            _users.set((user_id, version), tuple(getattr(user, name) for name in _field_names()))
+        return user
+
+
+def clear():
+    _users.clear()
+
+def _field_names():
+    return [field.attname for field in User._meta.concrete_fields]
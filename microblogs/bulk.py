@@ -0,0 +1,41 @@
+"""Bulk deletion helpers.
+
+QuerySet.delete() collects every cascaded row into memory and dispatches
+pre/post_delete signals per object, which does not scale to millions of rows.
+delete_cascade() instead follows the model's reverse relations and issues one
+DELETE ... WHERE fk IN (subquery) per related table, children first. No
+signals are sent, so callers are responsible for any derived data (e.g. the
+denormalized User counters).
+"""
+from django.db import models
+
+
+def delete_cascade(queryset):
+    """Delete the rows of `queryset` and every row that cascades from them.
+
+    SET_NULL relations are cleared and DO_NOTHING relations are left alone;
+    any other on_delete behaviour raises ValueError. Returns the number of
+    rows deleted from the queryset's own table.
+    """
+    for relation in _reverse_relations(queryset.model):
+        related = relation.related_model._base_manager.filter(
+            **{relation.field.name + '__in': queryset.values('pk')}
+        )
+        on_delete = relation.on_delete
+        if on_delete is models.CASCADE:
+            delete_cascade(related)
+        elif on_delete is models.SET_NULL:
+            related.update(**{relation.field.name: None})
+        elif on_delete is not models.DO_NOTHING:
+            raise ValueError(
+                f'Cannot bulk delete through {relation.related_model.__name__}.'
+                f'{relation.field.name} (on_delete={on_delete.__name__})'
+            )
+    return queryset._raw_delete(queryset.db)
+
+def _reverse_relations(model):
+    #Includes the hidden relations of auto-created many-to-many through tables
+    return [
+        field for field in model._meta.get_fields(include_hidden=True)
+        if field.auto_created and not field.concrete and (field.one_to_many or field.one_to_one)
+    ]
@@ -0,0 +1,159 @@
+"""Two-tier cache for rendered feed fragments.
+
+Rendered posts and feed pages are stored under keys that embed version
+stamps (one per post, per user and per user's feed). Saving a post or user,
+or changing a timeline, only replaces the relevant version stamp, so stale
+entries are never read again and simply age out; nothing has to be deleted.
+Because such keys never change meaning, a small per-process LRU can sit in
+front of the shared Django cache without any cross-process invalidation.
+Only the version stamps themselves are always read from the shared cache.
+A write inside a transaction bumps its stamps again when it commits, so a
+reader that cached the old rows under the first new stamp is orphaned too.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')
+LOCAL_SIZE = getattr(settings, 'FRAGMENT_CACHE_LOCAL_SIZE', 10000)
+
+
+class LRUCache:
+    #A bounded, thread safe in-process mapping evicting the least recently used key
+
+    def __init__(self, size):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache:
+    #A local LRU in front of a shared Django cache, counting hits and misses
+
+    def __init__(self, alias=CACHE_ALIAS, local_size=LOCAL_SIZE):
+        self.alias = alias
+        self.local = LRUCache(local_size)
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def get_many(self, keys, namespace):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        local_hits = len(found)
+        if missing:
+            for key, value in self.shared.get_many(missing).items():
+                self.local.set(key, value)
+                found[key] = value
+        self._count(namespace, local_hits, len(found) - local_hits, len(keys) - len(found))
+        return found
+
+    def set_many(self, mapping, timeout):
+        for key, value in mapping.items():
+            self.local.set(key, value)
+        self.shared.set_many(mapping, timeout)
+
+    def versions(self, refs):
+        """Return the current version stamp of every (kind, id) in `refs`.
+
+        Refs without a stamp yet are given a fresh one.
+        """
+        keys = {_version_key(kind, pk): (kind, pk) for kind, pk in refs}
+        stored = self.shared.get_many(keys)
+        missing = {key: _new_version() for key in keys if key not in stored}
+        if missing:
+            self.shared.set_many(missing, None)
+            stored.update(missing)
+        return {keys[key]: version for key, version in stored.items()}
+
+    def bump(self, kind, ids, using=None):
+        """Give every id a new version, orphaning anything cached under the old one.
+
+        Inside a transaction of the `using` database the ids are bumped again
+        once it commits: until then other connections still read the old rows
+        and may cache them under the first new version.
+        """
+        ids = list(ids)
+        self._set_versions(kind, ids)
+        if ids and transaction.get_connection(using).in_atomic_block:
+            transaction.on_commit(lambda: self._set_versions(kind, ids), using=using)
+
+    def _set_versions(self, kind, ids):
+        version = _new_version()
+        self.shared.set_many({_version_key(kind, pk): version for pk in ids}, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['local_entries'] = len(self.local)
+        return stats
+
+    def _count(self, namespace, local_hits, shared_hits, misses):
+        with self._lock:
+            self.counters[namespace + '_local_hits'] += local_hits
+            self.counters[namespace + '_shared_hits'] += shared_hits
+            self.counters[namespace + '_misses'] += misses
+
+
+def _version_key(kind, pk):
+    return f'v:{kind}:{pk}'
+
+def _new_version():
+    #Stamps are never reused, so an evicted stamp cannot revive old entries
+    return time.time_ns()
+
+
+fragment_cache = TieredCache()
+
+
+def bump_posts(post_ids, using=None):
+    fragment_cache.bump('post', post_ids, using)
+
+def bump_users(user_ids, using=None):
+    fragment_cache.bump('user', user_ids, using)
+
+def bump_feeds(user_ids, using=None):
+    fragment_cache.bump('feed', user_ids, using)
+
+def bump_authors(user_ids, using=None):
+    #Any of the authors' posts was written, changed or deleted
+    fragment_cache.bump('author', user_ids, using)
+
+def bump_auth(user_ids, using=None):
+    #Users cached by microblogs.backends
+    fragment_cache.bump('auth', user_ids, using)
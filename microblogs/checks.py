@@ -0,0 +1,54 @@
+"""System checks of the settings the caching layers depend on."""
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+LOCMEM_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+CACHED_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+)
+CACHED_AUTH_BACKEND = 'microblogs.backends.CachedModelBackend'
+
+
+@register(Tags.caches, Tags.security, deploy=False)
+def check_shared_cache(app_configs, **kwargs):
+    """Refuse cached sessions and users on a cache private to each process.
+
+    A logout, password change or deactivation in one process would not reach
+    the cached copies of the others, which would keep the old session and
+    user until they expire.
+    """
+    if getattr(settings, 'CACHE_SINGLE_PROCESS', False):
+        return []
+    errors = []
+    if settings.SESSION_ENGINE in CACHED_SESSION_ENGINES and _is_local(settings.SESSION_CACHE_ALIAS):
+        errors.append(Error(
+            f'SESSION_ENGINE {settings.SESSION_ENGINE} keeps sessions in a cache private to each process.',
+            hint = 'Set CLUCKER_CACHE_URL to a shared cache, or CLUCKER_SESSIONS to db or signed_cookies.',
+            id = 'microblogs.E001',
+        ))
+    stamps_alias = getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')
+    if CACHED_AUTH_BACKEND in settings.AUTHENTICATION_BACKENDS and _is_local(stamps_alias):
+        errors.append(Error(
+            f'{CACHED_AUTH_BACKEND} reads its version stamps from a cache private to each process.',
+            hint = 'Set CLUCKER_CACHE_URL to a shared cache, or remove it from AUTHENTICATION_BACKENDS.',
+            id = 'microblogs.E002',
+        ))
+    return errors
+
+def _is_local(alias):
+    return settings.CACHES.get(alias, {}).get('BACKEND') == LOCMEM_BACKEND
+
+@register(Tags.caches)
+def check_version_stamps(app_configs, **kwargs):
+    #Without a shared cache a bump reaches the process that made it only, so
+    #others go on serving old fragments and answering 304 for changed pages
+    if getattr(settings, 'CACHE_SINGLE_PROCESS', False):
+        return []
+    if not _is_local(getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')):
+        return []
+    return [Warning(
+        'The version stamps of microblogs.cache are kept in a cache private to each process.',
+        hint = 'Set CLUCKER_CACHE_URL to a shared cache, or CLUCKER_SINGLE_PROCESS=1 when running one process.',
+        id = 'microblogs.W001',
+    )]
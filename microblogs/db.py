@@ -0,0 +1,50 @@
+#Per-connection database setup, connected to connection_created in apps.py,
+#and helpers reading the planner statistics of the database
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from microblogs import sharding
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+        with connection.cursor() as cursor:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+    if connection.alias in getattr(settings, 'POST_SHARDS', []):
+        sharding.configure_shard(connection)
+
+def analyze(models, using='default'):
+    #Refresh the planner statistics of the tables of `models`
+    #SQLite's sampled ANALYZE (analysis_limit) skews the statistics enough to
+    #make the planner sort whole joins, so the tables are read in full
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+def estimated_count(model, using='default'):
+    """Return the number of rows the planner statistics record for `model`.
+
+    This is read from pg_class on PostgreSQL and sqlite_stat1 on SQLite,
+    costs one lookup whatever the table size, and is only as current as the
+    last ANALYZE. Returns None when the table has no statistics yet.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+                row = cursor.fetchone()
+                #reltuples is -1 for a table that has never been analyzed
+                return int(row[0]) if row and row[0] >= 0 else None
+            if connection.vendor == 'sqlite':
+                #The first number of every stat row is the row count of the table
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                row = cursor.fetchone()
+                return int(row[0].split()[0]) if row else None
+    except DatabaseError:
+        #sqlite_stat1 only exists once ANALYZE has run
+        return None
+    return None
@@ -0,0 +1,35 @@
+#Fake data generators used by the seed command. This module deliberately does
+#not import Django so that it can run inside worker processes of a pool.
+from faker import Faker
+
+_faker = None
+
+HASHTAGS = [
+    'django', 'python', 'clucker', 'news', 'sport', 'music', 'film', 'food',
+    'travel', 'weather', 'books', 'gaming', 'science', 'art', 'coffee', 'monday',
+]
+
+def _get_faker():
+    global _faker
+    if _faker is None:
+        _faker = Faker('en_GB')
+    return _faker
+
+def fake_users(start, count):
+    #Return (index, first_name, last_name, bio) rows for users start..start+count-1
+    faker = _get_faker()
+    return [
+        (index, faker.first_name(), faker.last_name(), faker.text(max_nb_chars=200))
+        for index in range(start, start + count)
+    ]
+
+def fake_posts(count):
+    #About a third of the posts end with a hashtag drawn from a small vocabulary
+    faker = _get_faker()
+    texts = []
+    for _ in range(count):
+        text = faker.text(max_nb_chars=250)
+        if faker.random.random() < 0.3:
+            text += ' #' + faker.random.choice(HASHTAGS)
+        texts.append(text)
+    return texts
@@ -1,6 +1,7 @@
 from django import forms
 from django.core.validators import RegexValidator
 
+from microblogs.hashers import hash_password
 from microblogs.models import Post, User
 
 class SignUpForm(forms.ModelForm):
@@ -32,14 +33,16 @@ class SignUpForm(forms.ModelForm):
     
     def save(self):
         super().save(commit=False)
-        user = User.objects.create_user(
-            self.cleaned_data.get('username'),
+        #Same as User.objects.create_user, but hashing on the shared hashing pool
+        user = User(
+            username = User.normalize_username(self.cleaned_data.get('username')),
             first_name = self.cleaned_data.get('first_name'),
             last_name = self.cleaned_data.get('last_name'),
-            email = self.cleaned_data.get('email'),
+            email = User.objects.normalize_email(self.cleaned_data.get('email')),
             bio = self.cleaned_data.get('bio'),
-            password = self.cleaned_data.get('new_password'),
+            password = hash_password(self.cleaned_data.get('new_password')),
         )
+        user.save()
         return user
 
 class PostForm(forms.ModelForm):
@@ -0,0 +1,70 @@
+"""Rendering of feed pages from cached fragments, see microblogs.cache."""
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from microblogs import pagination, rendering, sharding, timeline
+from microblogs.cache import fragment_cache
+
+FRAGMENT_TIMEOUT = getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 300)
+#Posts of authors merged in at read time do not bump their readers' feed
+#versions, so cached pages also expire after this many seconds
+FEED_PAGE_TIMEOUT = getattr(settings, 'FEED_PAGE_CACHE_TIMEOUT', 30)
+
+
+def feed_fragments(user, cursor=None):
+    """Return the rendered posts of one feed page and the next page's cursor.
+
+    Raises pagination.InvalidCursor for a malformed cursor.
+    """
+    refs, next_cursor, loaded = feed_page(user, cursor)
+    return render_posts(refs, loaded), next_cursor
+
+def feed_page(user, cursor=None):
+    """Return the (post_id, author_id) refs of one feed page and its next cursor.
+
+    The refs are cached under the user's feed version; when they had to be
+    read, the posts read with them are returned too, mapped by id. Raises
+    pagination.InvalidCursor for a malformed cursor.
+    """
+    version = fragment_cache.versions([('feed', user.pk)])[('feed', user.pk)]
+    key = f'feed:{user.pk}:{version}:{cursor or ""}'
+    cached = fragment_cache.get_many([key], 'page').get(key)
+    loaded = {}
+    if cached is None:
+        limit = pagination.PAGE_SIZE
+        posts = timeline.get_feed(user, limit + 1, before=pagination.decode_cursor(cursor))
+        page = pagination.make_page(posts, limit)
+        loaded = {post.pk: post for post in page.items}
+        cached = ([(post.pk, post.author_id) for post in page.items], page.next_cursor)
+        fragment_cache.set_many({key: cached}, FEED_PAGE_TIMEOUT)
+    refs, next_cursor = cached
+    return refs, next_cursor, loaded
+
+def render_posts(refs, loaded=None):
+    """Render (post_id, author_id) refs to HTML fragments, in order.
+
+    `loaded` may map post ids to already fetched posts; any other post whose
+    fragment is not cached is fetched in a single query. Posts that no longer
+    exist are skipped.
+    """
+    loaded = dict(loaded or {})
+    versions = fragment_cache.versions(
+        [('post', post_id) for post_id, _ in refs] + [('user', author_id) for _, author_id in refs]
+    )
+    keys = {
+        post_id: f'post:{post_id}:{versions[("post", post_id)]}:{versions[("user", author_id)]}'
+        for post_id, author_id in refs
+    }
+    found = fragment_cache.get_many(keys.values(), 'fragment')
+    missing = [post_id for post_id, key in keys.items() if key not in found and post_id not in loaded]
+    if missing:
+        loaded.update(sharding.in_bulk(missing))
+    stale = [post_id for post_id, key in keys.items() if key not in found and post_id in loaded]
+    rendered = dict(zip(
+        [keys[post_id] for post_id in stale],
+        rendering.render_each('_post.html', 'post', [loaded[post_id] for post_id in stale]),
+    ))
+    if rendered:
+        fragment_cache.set_many(rendered, FRAGMENT_TIMEOUT)
+        found.update(rendered)
+    return [mark_safe(found[keys[post_id]]) for post_id, _ in refs if keys[post_id] in found]
@@ -0,0 +1,158 @@
+"""Follower graph operations.
+
+Single follows and unfollows go through the ORM and keep the denormalized
+User counters current via the handlers in microblogs.signals. The bulk
+operations below write many Follow rows at once, bypass those per-row
+signals, and apply the counter deltas with one F-expression UPDATE per
+distinct delta instead.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from microblogs import timeline
+from microblogs.models import Follow, Post, User
+
+BULK_BATCH_SIZE = 1000
+
+
+def follow(follower, followee):
+    #Returns True if a new follow was created
+    if follower.pk == followee.pk:
+        return False
+    _, created = Follow.objects.get_or_create(follower=follower, followee=followee)
+    return created
+
+def unfollow(follower, followee):
+    #Returns True if an existing follow was removed
+    deleted, _ = Follow.objects.filter(follower=follower, followee=followee).delete()
+    return bool(deleted)
+
+def bulk_follow(pairs, backfill=True, batch_size=BULK_BATCH_SIZE):
+    """Create follows for an iterable of (follower_id, followee_id) pairs.
+
+    Self-follows and follows that already exist are skipped. Returns the
+    number of follows created.
+    """
+    pairs = {(follower, followee) for follower, followee in pairs if follower != followee}
+    if not pairs:
+        return 0
+    with transaction.atomic():
+        new_pairs = pairs - _existing(pairs)
+        Follow.objects.bulk_create(
+            [Follow(follower_id=follower, followee_id=followee) for follower, followee in new_pairs],
+            batch_size = batch_size,
+            #A concurrent follow of the same pair is dropped here rather than
+            #failing the batch; reconcile_counters repairs the counters
+            ignore_conflicts = True,
+        )
+        apply_follow_deltas(new_pairs, 1)
+    if backfill:
+        for follower, followee in new_pairs:
+            timeline.backfill(follower, followee)
+    return len(new_pairs)
+
+def bulk_unfollow(pairs):
+    """Remove follows for an iterable of (follower_id, followee_id) pairs.
+
+    Pairs that are not followed are ignored. Returns the number of follows
+    removed.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return 0
+    with transaction.atomic():
+        followers = {follower for follower, _ in pairs}
+        rows = (
+            Follow.objects
+            .select_for_update()
+            .filter(follower_id__in=followers)
+            .values_list('pk', 'follower_id', 'followee_id')
+        )
+        found = {(follower, followee): pk for pk, follower, followee in rows if (follower, followee) in pairs}
+        queryset = Follow.objects.filter(pk__in=found.values())
+        queryset._raw_delete(queryset.db)
+        apply_follow_deltas(found.keys(), -1)
+    for follower, followee in found:
+        timeline.remove_author(follower, followee)
+    return len(found)
+
+def _existing(pairs):
+    #Filtering on followers alone walks one contiguous index range per
+    #follower; adding followee_id__in makes some planners probe every
+    #follower/followee combination instead
+    followers = {follower for follower, _ in pairs}
+    rows = (
+        Follow.objects
+        .filter(follower_id__in=followers)
+        .values_list('follower_id', 'followee_id')
+    )
+    return set(rows) & pairs
+
+def apply_follow_deltas(pairs, sign):
+    #Add sign to both users' counters for every (follower_id, followee_id) pair
+    following = Counter(follower for follower, _ in pairs)
+    followers = Counter(followee for _, followee in pairs)
+    _update_counter('following_count', following, sign)
+    _update_counter('followers_count', followers, sign)
+
+def _update_counter(field, counts, sign):
+    #Group users by how much their counter changes so the number of UPDATEs
+    #is the number of distinct deltas, not the number of users
+    by_delta = defaultdict(list)
+    for user_id, count in counts.items():
+        by_delta[count].append(user_id)
+    for delta, user_ids in by_delta.items():
+        #Never below 0, which the column's CHECK would reject for drifted counters
+        User.objects.filter(pk__in=user_ids).update(**{field: Greatest(F(field) + sign * delta, 0)})
+
+def reconcile_counters(start=None, batch_size=BULK_BATCH_SIZE):
+    """Recompute the denormalized counters of every user in pk-range batches.
+
+    Only users whose stored counters have drifted are written. Yields
+    (last_pk, repaired) after each batch so callers can report progress.
+    """
+    users = User.objects.order_by('pk').only('followers_count', 'following_count', 'posts_count')
+    if start is not None:
+        users = users.filter(pk__gte=start)
+    lower = users.values_list('pk', flat=True).first()
+    while lower is not None:
+        batch = list(
+            users.filter(pk__gte=lower).annotate(
+                actual_followers = _count(Follow, 'followee'),
+                actual_following = _count(Follow, 'follower'),
+                actual_posts = _count(Post, 'author'),
+            )[:batch_size]
+        )
+        if not batch:
+            break
+        drifted = []
+        for user in batch:
+            if (
+                user.followers_count != user.actual_followers
+                or user.following_count != user.actual_following
+                or user.posts_count != user.actual_posts
+            ):
+                user.followers_count = user.actual_followers
+                user.following_count = user.actual_following
+                user.posts_count = user.actual_posts
+                drifted.append(user)
+        with transaction.atomic():
+            User.objects.bulk_update(
+                drifted, ['followers_count', 'following_count', 'posts_count']
+            )
+        yield batch[-1].pk, len(drifted)
+        lower = batch[-1].pk + 1
+
+def _count(model, field):
+    counts = (
+        model.objects
+        .filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), Value(0))
@@ -0,0 +1,42 @@
+"""Password hashing for sign ups.
+
+The tuned hashers take their cost parameters from settings so production can
+trade hashing time against memory without code changes. hash_password runs
+the hashing on a small shared thread pool: the hash functions release the GIL,
+so at most PASSWORD_HASHING_WORKERS hashes are computed at once however many
+sign ups arrive together, and the rest of the process keeps its CPU.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    ScryptPasswordHasher,
+    make_password,
+)
+
+HASHING_WORKERS = getattr(settings, 'PASSWORD_HASHING_WORKERS', os.cpu_count() or 1)
+
+_executor = ThreadPoolExecutor(HASHING_WORKERS, thread_name_prefix='password-hashing')
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    time_cost = getattr(settings, 'ARGON2_TIME_COST', Argon2PasswordHasher.time_cost)
+    memory_cost = getattr(settings, 'ARGON2_MEMORY_COST', Argon2PasswordHasher.memory_cost)
+    parallelism = getattr(settings, 'ARGON2_PARALLELISM', Argon2PasswordHasher.parallelism)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    work_factor = getattr(settings, 'SCRYPT_WORK_FACTOR', ScryptPasswordHasher.work_factor)
+    block_size = getattr(settings, 'SCRYPT_BLOCK_SIZE', ScryptPasswordHasher.block_size)
+    parallelism = getattr(settings, 'SCRYPT_PARALLELISM', ScryptPasswordHasher.parallelism)
+
+
+def hash_password(password):
+    #Blocking call returning make_password(password) computed on the pool
+    return _executor.submit(make_password, password).result()
+
+async def ahash_password(password):
+    return await asyncio.wrap_future(_executor.submit(make_password, password))
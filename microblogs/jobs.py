@@ -0,0 +1,214 @@
+"""A database-backed job queue.
+
+Jobs are rows of the Job table, so enqueueing inside a transaction commits
+or rolls back together with the data the job is about. Workers claim ready
+jobs in batches. Where the database supports SELECT ... FOR UPDATE SKIP
+LOCKED, concurrent workers skip each other's rows; elsewhere (SQLite) a
+conditional UPDATE that only succeeds on still queued rows decides which
+worker gets a job. A finished job is deleted, a failing one is retried
+with exponential backoff and marked failed after JOB_MAX_ATTEMPTS; a job
+whose worker died counts as failing too.
+"""
+import random
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from microblogs.models import Job
+
+MAX_ATTEMPTS = getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+BACKOFF_SECONDS = getattr(settings, 'JOB_BACKOFF_SECONDS', 5)
+MAX_BACKOFF_SECONDS = getattr(settings, 'JOB_MAX_BACKOFF_SECONDS', 3600)
+#Running jobs claimed longer ago than this are assumed lost with their worker
+LEASE_SECONDS = getattr(settings, 'JOB_LEASE_SECONDS', 300)
+CLAIM_BATCH_SIZE = 100
+LOST_ERROR = 'Lease expired: the worker running the job stopped before it finished'
+
+HANDLERS = {}
+
+
+def handler(kind):
+    #Register the decorated function to run jobs of `kind` with their payload.
+    #A job may run more than once after a failure, so handlers are idempotent
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+def enqueue(kind, payload, delay=0):
+    if kind not in HANDLERS:
+        raise ValueError(f'No handler for {kind} jobs')
+    return Job.objects.create(
+        kind = kind,
+        payload = payload,
+        run_after = timezone.now() + timedelta(seconds=delay),
+    )
+
+def claim(batch_size=CLAIM_BATCH_SIZE):
+    """Mark up to `batch_size` ready jobs as running and return them."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    ready = (
+        Job.objects
+        .filter(status=Job.QUEUED, run_after__lte=now)
+        .order_by('run_after', 'id')
+        .values_list('pk', flat=True)
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(ready.select_for_update(skip_locked=True)[:batch_size])
+            _mark_running(ids, token, now)
+    else:
+        #Without row locks the read and the write are separate statements;
+        #a read-then-write transaction on SQLite fails rather than waits when
+        #another writer commits in between
+        ids = list(ready[:batch_size])
+        _mark_running(ids, token, now)
+    return list(Job.objects.filter(pk__in=ids, claim_token=token).order_by('run_after', 'id'))
+
+def _mark_running(ids, token, now):
+    #Only rows still queued are taken, so two workers that read the same ids
+    #cannot both claim a job
+    Job.objects.filter(pk__in=ids, status=Job.QUEUED).update(
+        status = Job.RUNNING,
+        claim_token = token,
+        claimed_at = now,
+    )
+
+def requeue_lost():
+    """Return jobs whose worker stopped without finishing them to the queue.
+
+    Losing the worker counts as an attempt, so a job that kills every worker
+    running it is marked failed after MAX_ATTEMPTS instead of retried forever.
+    Returns how many jobs were requeued or failed.
+    """
+    expired = timezone.now() - timedelta(seconds=LEASE_SECONDS)
+    lost = Job.objects.filter(status=Job.RUNNING, claimed_at__lt=expired)
+    failed = lost.filter(attempts__gte=MAX_ATTEMPTS - 1).update(
+        status = Job.FAILED,
+        attempts = F('attempts') + 1,
+        claim_token = '',
+        last_error = LOST_ERROR,
+    )
+    requeued = lost.update(
+        status = Job.QUEUED,
+        attempts = F('attempts') + 1,
+        claim_token = '',
+    )
+    return failed + requeued
+
+def run(job):
+    """Run one claimed job, then delete it or schedule its retry.
+
+    Returns 'done', 'retried' or 'failed', or 'lost' when the job's lease
+    expired meanwhile and it was requeued or claimed by another worker, whose
+    claim is then left alone.
+    """
+    claimed = Job.objects.filter(pk=job.pk, status=Job.RUNNING, claim_token=job.claim_token)
+    try:
+        HANDLERS[job.kind](job.payload)
+    except Exception:
+        attempts = job.attempts + 1
+        if attempts >= MAX_ATTEMPTS:
+            status, run_after = Job.FAILED, job.run_after
+        else:
+            status, run_after = Job.QUEUED, timezone.now() + timedelta(seconds=backoff(attempts))
+        updated = claimed.update(
+            attempts = attempts,
+            last_error = traceback.format_exc(),
+            claim_token = '',
+            status = status,
+            run_after = run_after,
+        )
+        if not updated:
+            return 'lost'
+        return 'retried' if status == Job.QUEUED else 'failed'
+    if not claimed.delete()[0]:
+        return 'lost'
+    return 'done'
+
+def backoff(attempts):
+    #Exponential, with jitter so jobs failing together do not retry together
+    delay = min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1)
+
+def queue_stats():
+    counts = dict(Job.objects.values_list('status').annotate(count=Count('pk')).order_by())
+    return {status: counts.get(status, 0) for status, _ in Job.STATUSES}
+
+
+class Worker:
+    """Claims batches of jobs and runs them until stopped.
+
+    With concurrency 1 jobs run in the calling thread, which is what tests
+    use; otherwise on a pool of threads or processes.
+    """
+
+    def __init__(self, concurrency=1, executor='thread', batch_size=CLAIM_BATCH_SIZE, poll_interval=1.0):
+        self.concurrency = concurrency
+        self.executor_kind = executor
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.counts = {'done': 0, 'retried': 0, 'failed': 0, 'lost': 0}
+        self.started = time.perf_counter()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, until_empty=False, on_batch=None):
+        executor = self._executor()
+        try:
+            while not self._stop.is_set():
+                requeue_lost()
+                jobs = claim(self.batch_size)
+                if not jobs:
+                    if until_empty:
+                        return
+                    self._stop.wait(self.poll_interval)
+                    continue
+                if executor is None:
+                    outcomes = [run(job) for job in jobs]
+                elif self.executor_kind == 'process':
+                    outcomes = list(executor.map(_run_in_process, [job.pk for job in jobs]))
+                else:
+                    outcomes = list(executor.map(_run_in_thread, jobs))
+                for outcome in outcomes:
+                    self.counts[outcome] += 1
+                if on_batch is not None:
+                    on_batch(self)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        processed = sum(self.counts.values())
+        return {**self.counts, 'elapsed': elapsed, 'jobs_per_second': processed / elapsed if elapsed else 0}
+
+    def _executor(self):
+        if self.concurrency <= 1:
+            return None
+        if self.executor_kind == 'process':
+            #Forked children must not share the parent's database connections
+            connections.close_all()
+            return ProcessPoolExecutor(self.concurrency)
+        return ThreadPoolExecutor(self.concurrency)
+
+
+def _run_in_thread(job):
+    try:
+        return run(job)
+    finally:
+        close_old_connections()
+
+def _run_in_process(job_id):
+    return run(Job.objects.get(pk=job_id))
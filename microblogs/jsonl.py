@@ -0,0 +1,37 @@
+#JSON Lines parsing used by the import_jsonl command. Like fakedata, this
+#module deliberately does not import Django so that it can run inside worker
+#processes of a pool.
+import json
+from datetime import datetime
+
+MODELS = ('user', 'post')
+DATETIME_FIELDS = ('date_joined', 'last_login', 'created_at')
+
+def parse_lines(first_lineno, lines):
+    """Decode a chunk of lines numbered from `first_lineno`.
+
+    Returns (records, errors): records are (lineno, dict) pairs with their
+    datetimes parsed, errors are (lineno, message) pairs. Blank lines are
+    skipped.
+    """
+    records, errors = [], []
+    for lineno, line in enumerate(lines, first_lineno):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            errors.append((lineno, f'Invalid JSON: {error}'))
+            continue
+        if not isinstance(record, dict) or record.get('model') not in MODELS:
+            errors.append((lineno, 'Expected an object with a model of "user" or "post"'))
+            continue
+        try:
+            for field in DATETIME_FIELDS:
+                if record.get(field) is not None:
+                    record[field] = datetime.fromisoformat(record[field])
+        except (TypeError, ValueError):
+            errors.append((lineno, f'Invalid datetime in {field}'))
+            continue
+        records.append((lineno, record))
+    return records, errors
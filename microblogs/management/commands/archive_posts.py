@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from microblogs import archive, db
+from microblogs.models import ArchivedPost, Post, TimelineEntry
+
+class Command(BaseCommand):
+    help = 'Move posts older than a number of days to the compressed archive in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=archive.ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=archive.ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        #Every batch is committed on its own, so an interrupted run can simply
+        #be started again
+        if options['batch_size'] < 1 or options['days'] < 0:
+            raise CommandError('--batch-size must be at least 1 and --days at least 0')
+        before = archive.cutoff(options['days'])
+        started = time.perf_counter()
+        total = 0
+        while True:
+            archived = archive.archive_batch(before, options['batch_size'])
+            if not archived:
+                break
+            total += archived
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Archived {total} posts')
+        if total:
+            #The hot tables shrank, keep the planner's row estimates in step
+            db.analyze([Post, TimelineEntry, ArchivedPost])
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {total} posts created before {before:%Y-%m-%d} in {elapsed:.2f}s ({rate:.0f} posts/s)'
+        ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from microblogs import tags
+from microblogs.models import Post
+
+class Command(BaseCommand):
+    help = 'Extract hashtags and mentions from existing posts in streaming batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=tags.BATCH_SIZE)
+        parser.add_argument('--start', type=int, default=0, help='Resume from this post id')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+        posts = (
+            Post.objects
+            .filter(pk__gte=options['start'])
+            .order_by('pk')
+            .only('pk', 'text', 'created_at')
+            .iterator(chunk_size=batch_size)
+        )
+        total = 0
+        batch = []
+        for post in posts:
+            batch.append(post)
+            if len(batch) == batch_size:
+                total += self._index(batch, options['verbosity'])
+                batch = []
+        total += self._index(batch, options['verbosity'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} posts'))
+
+    def _index(self, batch, verbosity):
+        if not batch:
+            return 0
+        with transaction.atomic():
+            tags.index_posts(batch, replace=True)
+        if verbosity > 1:
+            self.stdout.write(f'Indexed posts up to id {batch[-1].pk}')
+        return len(batch)
@@ -0,0 +1,49 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from microblogs import ratelimit
+
+class Command(BaseCommand):
+    help = 'Measure the time a rate limit check adds to a request, per backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=100000, help='Checks measured per backend')
+        parser.add_argument('--clients', type=int, default=1000, help='Distinct clients the checks come from')
+
+    def handle(self, *args, **options):
+        if options['checks'] < 1 or options['clients'] < 1:
+            raise CommandError('--checks and --clients must be at least 1')
+        checks, clients = options['checks'], options['clients']
+        requests = []
+        for i in range(clients):
+            request = RequestFactory().post('/', REMOTE_ADDR=f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}')
+            request.user = AnonymousUser()
+            requests.append(request)
+
+        def view(request):
+            return HttpResponse()
+
+        #A limit no client reaches, so every check takes the allowed path
+        limits = {'bench': (checks + 1, 60)}
+        baseline = self._time(view, requests, checks)
+        self.stdout.write(f'{"no limit":<8} {baseline * 1e6:8.2f}us per request')
+        for name, backend_class in ratelimit.BACKENDS.items():
+            with mock.patch.object(ratelimit, 'ENABLED', True), \
+                    mock.patch.object(ratelimit, 'LIMITS', limits), \
+                    mock.patch.object(ratelimit, 'backend', backend_class()):
+                elapsed = self._time(ratelimit.ratelimit('bench')(view), requests, checks)
+            self.stdout.write(
+                f'{name:<8} {elapsed * 1e6:8.2f}us per request (+{(elapsed - baseline) * 1e6:.2f}us)'
+            )
+
+    def _time(self, view, requests, checks):
+        count = len(requests)
+        started = time.perf_counter()
+        for i in range(checks):
+            view(requests[i % count])
+        return (time.perf_counter() - started) / checks
@@ -0,0 +1,285 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from io import StringIO
+import itertools
+import json
+import logging
+import math
+import platform
+import subprocess
+import time
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from django.utils import timezone
+
+from microblogs import ratelimit
+from microblogs.bulk import delete_cascade
+from microblogs.management.commands.seed import USERNAME_PREFIX
+from microblogs.models import User
+
+#Users created by the benchmark itself, removed again when it finishes
+BENCH_PREFIX = '@bench_req_'
+BENCH_PASSWORD = 'Password123'
+SCENARIOS = ['home', 'feed', 'feed_async', 'sign_up', 'new_post', 'admin_users', 'admin_posts']
+PERCENTILES = [50, 95, 99]
+
+class Command(BaseCommand):
+    help = 'Measure request latency and throughput of the main pages against a seeded dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', action='store_true',
+            help='Seed --users, --posts and --follows before measuring, on top of any data already there'
+        )
+        parser.add_argument('--users', type=int, default=200, help='Users to seed with --seed')
+        parser.add_argument('--posts', type=int, default=5000, help='Posts to seed with --seed')
+        parser.add_argument('--follows', type=int, default=4000, help='Follows to seed with --seed')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=4, help='Clients running at once')
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Relative p95 increase or throughput drop reported as a regression'
+        )
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['warmup'] < 0:
+            raise CommandError('--requests and --concurrency must be at least 1 and --warmup at least 0')
+        self.options = options
+        #The test clients always send this host, as under the test runner
+        if 'testserver' not in settings.ALLOWED_HOSTS:
+            settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        #Shared by the worker threads; next() of a count is atomic, unlike a generator's
+        self.bench_ids = itertools.count()
+        self._clean_up()
+        if options['seed'] and options['users'] > 0:
+            call_command(
+                'seed', users=options['users'], posts=options['posts'], follows=options['follows'],
+                stdout=self.stdout if options['verbosity'] > 1 else StringIO(),
+            )
+        self.reader = (
+            User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('-following_count').first()
+        )
+        self.admin = User.objects.create_superuser(
+            username = self._username(),
+            email = 'bench_admin@bench.example.org',
+            password = BENCH_PASSWORD,
+            first_name = 'Bench',
+            last_name = 'Admin',
+        )
+        if self.reader is None:
+            self.stdout.write(self.style.WARNING('No seeded users, the feed is measured empty; pass --seed'))
+            self.reader = self.admin
+        #Failed requests are counted in the results instead of logged one by one
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        if options['verbosity'] < 2:
+            request_logger.setLevel(logging.CRITICAL)
+        try:
+            results = {}
+            #Every client is 127.0.0.1 and one user, so limits would answer most writes 429
+            with mock.patch.object(ratelimit, 'ENABLED', False):
+                for name in options['scenarios']:
+                    results[name] = getattr(self, f'_run_{name}')()
+                    self.stdout.write(_format(name, results[name]))
+        finally:
+            request_logger.setLevel(level)
+            self._clean_up()
+        report = {'meta': self._meta(), 'scenarios': results}
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+        if options['compare']:
+            self._compare(report)
+
+    #Scenarios, each returning the summary of its measured requests
+
+    def _run_home(self):
+        return self._measure(lambda client, i: client.get(reverse('home')))
+
+    def _run_feed(self):
+        return self._measure(lambda client, i: client.get(reverse('feed')), user=self.reader)
+
+    def _run_sign_up(self):
+        def sign_up(client, i):
+            username = self._username()
+            return client.post(reverse('sign_up'), {
+                'first_name': 'Bench',
+                'last_name': 'Signup',
+                'username': username,
+                'email': f'{username[1:]}@bench.example.org',
+                'bio': 'Signed up by the benchmark',
+                'new_password': BENCH_PASSWORD,
+                'password_confirmation': BENCH_PASSWORD,
+            })
+        return self._measure(sign_up, expected=(302,))
+
+    def _run_new_post(self):
+        def new_post(client, i):
+            #No hashtag: its trending counts would outlive the clean up
+            return client.post(reverse('new_post'), {'text': f'benchmark cluck {i}'})
+        return self._measure(new_post, user=self.admin, expected=(302,))
+
+    def _run_admin_users(self):
+        url = reverse('admin:microblogs_user_changelist')
+        return self._measure(lambda client, i: client.get(url), user=self.admin)
+
+    def _run_admin_posts(self):
+        url = reverse('admin:microblogs_post_changelist')
+        return self._measure(lambda client, i: client.get(url), user=self.admin)
+
+    def _run_feed_async(self):
+        url = reverse('feed_async')
+        return asyncio.run(self._ameasure(lambda client, i: client.get(url), user=self.reader))
+
+    #Load generation
+
+    def _measure(self, send, user=None, expected=(200,)):
+        #Threads with a test Client each, so requests go through the WSGI handler
+        total, concurrency = self.options['requests'], self.options['concurrency']
+        counts = [total // concurrency + (i < total % concurrency) for i in range(concurrency)]
+
+        def worker(count):
+            client = self._client(Client, user)
+            latencies, errors = [], 0
+            try:
+                for i in range(self.options['warmup'] // concurrency):
+                    send(client, i)
+                for i in range(count):
+                    started = time.perf_counter()
+                    try:
+                        ok = send(client, i).status_code in expected
+                    except Exception:
+                        ok = False
+                    latencies.append(time.perf_counter() - started)
+                    errors += not ok
+            finally:
+                connections.close_all()
+            return latencies, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(worker, counts))
+        elapsed = time.perf_counter() - started
+        return _summary([l for latencies, _ in results for l in latencies], sum(e for _, e in results), elapsed)
+
+    async def _ameasure(self, send, user=None, expected=(200,)):
+        #Concurrent tasks on one event loop with AsyncClients, through the ASGI handler
+        total, concurrency = self.options['requests'], self.options['concurrency']
+        counts = [total // concurrency + (i < total % concurrency) for i in range(concurrency)]
+        clients = [await sync_to_async(self._client)(AsyncClient, user) for _ in counts]
+
+        async def worker(client, count):
+            latencies, errors = [], 0
+            for i in range(self.options['warmup'] // concurrency):
+                await send(client, i)
+            for i in range(count):
+                started = time.perf_counter()
+                try:
+                    ok = (await send(client, i)).status_code in expected
+                except Exception:
+                    ok = False
+                latencies.append(time.perf_counter() - started)
+                errors += not ok
+            return latencies, errors
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(worker(client, count) for client, count in zip(clients, counts)))
+        elapsed = time.perf_counter() - started
+        return _summary([l for latencies, _ in results for l in latencies], sum(e for _, e in results), elapsed)
+
+    def _username(self):
+        return f'{BENCH_PREFIX}{next(self.bench_ids)}'
+
+    def _client(self, client_class, user):
+        client = client_class(raise_request_exception=False)
+        if user is not None:
+            #AsyncClient logs in through a sync Client sharing its cookies
+            login = Client()
+            login.force_login(user)
+            client.cookies = login.cookies
+        return client
+
+    #Reporting
+
+    def _meta(self):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'users': User.objects.count(),
+            'requests': self.options['requests'],
+            'concurrency': self.options['concurrency'],
+        }
+
+    def _compare(self, report):
+        with open(self.options['compare']) as baseline_file:
+            baseline = json.load(baseline_file)['scenarios']
+        threshold = self.options['threshold']
+        regressions = []
+        for name, current in report['scenarios'].items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            p95 = _change(before['p95_ms'], current['p95_ms'])
+            throughput = _change(before['throughput_rps'], current['throughput_rps'])
+            line = f'{name}: p95 {p95:+.1%}, throughput {throughput:+.1%}'
+            if p95 > threshold or throughput < -threshold:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line + ' REGRESSION'))
+            else:
+                self.stdout.write(line)
+        if regressions and self.options['fail_on_regression']:
+            raise CommandError('Regressions in ' + ', '.join(regressions))
+
+    def _clean_up(self):
+        delete_cascade(User.objects.filter(username__startswith=BENCH_PREFIX))
+
+
+def _summary(latencies, errors, elapsed):
+    latencies.sort()
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0,
+    }
+    for percentile in PERCENTILES:
+        summary[f'p{percentile}_ms'] = round(_percentile(latencies, percentile) * 1000, 2)
+    return summary
+
+def _percentile(ordered, percentile):
+    #Nearest-rank percentile of an already sorted list
+    if not ordered:
+        return 0
+    return ordered[max(0, math.ceil(percentile / 100 * len(ordered)) - 1)]
+
+def _change(before, after):
+    return (after - before) / before if before else 0
+
+def _format(name, summary):
+    return (
+        f"{name}: {summary['requests']} requests, {summary['errors']} errors, "
+        f"{summary['throughput_rps']} req/s, p50 {summary['p50_ms']}ms, "
+        f"p95 {summary['p95_ms']}ms, p99 {summary['p99_ms']}ms"
+    )
@@ -0,0 +1,102 @@
+from datetime import timedelta
+import math
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.template.engine import Engine
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from microblogs import rendering
+from microblogs.forms import PostForm, SignUpForm
+from microblogs.models import Post, User
+from microblogs.templatetags import clucker
+
+SCENARIOS = ['fragments', 'fragments_each', 'fragments_each_warm', 'feed_page', 'sign_up', 'compile']
+
+class Command(BaseCommand):
+    help = 'Measure template rendering of a feed page and the sign up form, without a database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=50, help='Posts on the rendered feed page')
+        parser.add_argument('--iterations', type=int, default=200, help='Measured renders per scenario')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured renders per scenario')
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+
+    def handle(self, *args, **options):
+        if options['posts'] < 1 or options['iterations'] < 1 or options['warmup'] < 0:
+            raise CommandError('--posts and --iterations must be at least 1 and --warmup at least 0')
+        self.posts = _posts(options['posts'])
+        self.fragments = [mark_safe(html) for html in rendering.render_each('_post.html', 'post', self.posts)]
+        request = RequestFactory().get('/feed/')
+        request.user = self.posts[0].author
+        self.request = request
+        for scenario in options['scenarios']:
+            run = getattr(self, f'_{scenario}')
+            for _ in range(options['warmup']):
+                run()
+            timings = []
+            for _ in range(options['iterations']):
+                started = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            self.stdout.write(
+                f'{scenario:<20} mean {sum(timings) / len(timings) * 1000:7.2f}ms  '
+                f'p95 {_percentile(timings, 95) * 1000:7.2f}ms'
+            )
+
+    def _fragments(self):
+        #What rendering the missing fragments of a page cost before render_each
+        clucker._format_minute.cache_clear()
+        for post in self.posts:
+            render_to_string('_post.html', {'post': post})
+
+    def _fragments_each(self):
+        clucker._format_minute.cache_clear()
+        rendering.render_each('_post.html', 'post', self.posts)
+
+    def _fragments_each_warm(self):
+        #Fragments expire and are rendered again with the same timestamps
+        rendering.render_each('_post.html', 'post', self.posts)
+
+    def _feed_page(self):
+        render_to_string('feed.html', {
+            'posts': self.fragments, 'form': PostForm(), 'next_cursor': 'cursor', 'trending': [],
+        }, self.request)
+
+    def _sign_up(self):
+        render_to_string('sign_up.html', {'form': SignUpForm()}, self.request)
+
+    def _compile(self):
+        #What the first request of a worker pays for its templates without warm()
+        engine = engines['django'].engine
+        uncached = Engine(
+            dirs=engine.dirs, libraries=engine.libraries, debug=engine.debug,
+            loaders=['django.template.loaders.app_directories.Loader'],
+        )
+        for name in ('feed.html', '_post.html', 'sign_up.html', 'profile.html'):
+            uncached.get_template(name)
+
+
+def _posts(count):
+    #Unsaved posts a minute apart by different authors
+    now = timezone.now()
+    posts = []
+    for i in range(count):
+        author = User(
+            id = i + 1,
+            username = f'@bench_author{i}',
+            first_name = 'Bench',
+            last_name = 'Author',
+            email = f'bench_author{i}@example.org',
+        )
+        text = f'Benchmark cluck number {i} about #templates and @bench_author{i + 1} ' * 2
+        posts.append(Post(id=i + 1, author=author, text=text[:280], created_at=now - timedelta(minutes=i)))
+    return posts
+
+def _percentile(ordered, percent):
+    return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * percent / 100) - 1)]
@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+
+from microblogs.bulk import delete_cascade
+from microblogs.models import Post, User
+
+BENCH_USERNAME = '@bench_writer'
+
+#Django's own SQLite defaults, for comparing against SQLITE_PRAGMAS
+SQLITE_BASELINE_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+}
+
+class Command(BaseCommand):
+    help = 'Measure concurrent post write throughput against the configured database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--posts', type=int, default=2000, help='Posts written per run, across all threads')
+        parser.add_argument(
+            '--sqlite-baseline', action='store_true',
+            help="Use SQLite's rollback journal and synchronous=FULL instead of SQLITE_PRAGMAS"
+        )
+        parser.add_argument('--keep', action='store_true', help='Keep the posts written by the benchmark')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['posts'] < 1:
+            raise CommandError('--threads and --posts must be at least 1')
+        if options['sqlite_baseline']:
+            settings.SQLITE_PRAGMAS = SQLITE_BASELINE_PRAGMAS
+            connection.close()
+        author, _ = User.objects.get_or_create(
+            username = BENCH_USERNAME,
+            defaults = {
+                'first_name': 'Bench',
+                'last_name': 'Writer',
+                'email': 'bench_writer@example.org',
+            },
+        )
+        threads = options['threads']
+        per_thread = [options['posts'] // threads + (i < options['posts'] % threads) for i in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            results = list(executor.map(lambda count: self._write(author, count), per_thread))
+        elapsed = time.perf_counter() - started
+        written = sum(written for written, _ in results)
+        failed = sum(failed for _, failed in results)
+        vendor = connection.vendor
+        self.stdout.write(
+            f'{vendor}: {written} posts from {threads} threads in {elapsed:.2f}s '
+            f'({written / elapsed:.0f} posts/s, {failed} failed)'
+        )
+        if not options['keep']:
+            delete_cascade(User.objects.filter(pk=author.pk))
+
+    def _write(self, author, count):
+        written = failed = 0
+        try:
+            for i in range(count):
+                try:
+                    Post.objects.create(author=author, text=f'benchmark cluck {i}')
+                    written += 1
+                except DatabaseError:
+                    failed += 1
+        finally:
+            connections.close_all()
+        return written, failed
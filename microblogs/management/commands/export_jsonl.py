@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from microblogs import transfer
+
+class Command(BaseCommand):
+    help = 'Stream users and posts out as JSON Lines, users first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File to write; standard output if omitted')
+        parser.add_argument('--models', nargs='+', choices=list(transfer.EXPORTS), default=['user', 'post'])
+        parser.add_argument('--chunk-size', type=int, default=transfer.EXPORT_CHUNK_SIZE)
+        parser.add_argument(
+            '--no-passwords', action='store_true',
+            help='Leave out password hashes; imported accounts then cannot log in'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        lines = transfer.export_lines(
+            [name for name in transfer.EXPORTS if name in options['models']],
+            options['chunk_size'],
+            include_passwords = not options['no_passwords'],
+        )
+        if options['output']:
+            written = 0
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                for line in lines:
+                    output.write(line)
+                    written += 1
+            self.stdout.write(self.style.SUCCESS(f"Exported {written} rows to {options['output']}"))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,77 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import islice
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from microblogs import transfer
+from microblogs.jsonl import parse_lines
+
+#Errors listed individually before only the total is reported
+MAX_LISTED_ERRORS = 20
+
+class Command(BaseCommand):
+    help = (
+        'Import users and posts from a JSON Lines file written by export_jsonl; '
+        'users are matched to existing users of the same username'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=transfer.IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes parsing lines; 1 parses inline'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        self.batch_size = options['batch_size']
+        self.workers = options['workers']
+        importer = transfer.Importer()
+        started = time.perf_counter()
+        try:
+            with open(options['path'], encoding='utf-8') as source:
+                for records, errors in self._parse(source):
+                    importer.errors.extend(errors)
+                    importer.import_records(records)
+        except OSError as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - started
+        for lineno, message in sorted(importer.errors)[:MAX_LISTED_ERRORS]:
+            self.stderr.write(f'Line {lineno}: {message}')
+        counts = importer.counts
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {counts['users_created']} users ({counts['users_matched']} already present) "
+            f"and {counts['posts_created']} posts ({counts['posts_matched']} already present) in {elapsed:.2f}s, "
+            f"skipped {len(importer.errors)} lines"
+        ))
+
+    def _parse(self, source):
+        #Yield parse_lines results for batches of lines in file order, with a
+        #few batches parsed ahead in the pool so memory stays bounded
+        chunks = self._chunks(source)
+        if self.workers <= 1:
+            for first_lineno, lines in chunks:
+                yield parse_lines(first_lineno, lines)
+            return
+        with ProcessPoolExecutor(self.workers) as executor:
+            pending = deque()
+            for first_lineno, lines in chunks:
+                pending.append(executor.submit(parse_lines, first_lineno, lines))
+                if len(pending) >= self.workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _chunks(self, source):
+        first_lineno = 1
+        while True:
+            lines = list(islice(source, self.batch_size))
+            if not lines:
+                return
+            yield first_lineno, lines
+            first_lineno += len(lines)
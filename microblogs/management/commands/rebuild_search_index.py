@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from microblogs import search
+from microblogs.models import Post, User
+
+class Command(BaseCommand):
+    help = 'Recreate the full-text search indexes and re-index posts and users in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=search.REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        for model in (User, Post):
+            total = 0
+            for indexed in search.rebuild(model, options['batch_size']):
+                total += indexed
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{model._meta.verbose_name_plural}: {total} indexed')
+            self.stdout.write(self.style.SUCCESS(f'Indexed {total} {model._meta.verbose_name_plural}'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from microblogs.graph import BULK_BATCH_SIZE, reconcile_counters
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized follower, following and post counters of users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE)
+        parser.add_argument(
+            '--start', type=int, default=None,
+            help='Resume from this user id'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for last_pk, repaired in reconcile_counters(options['start'], options['batch_size']):
+            total += repaired
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Checked users up to id {last_pk}, repaired {repaired}')
+        self.stdout.write(self.style.SUCCESS(f'Repaired counters of {total} users'))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from microblogs import trending
+
+class Command(BaseCommand):
+    help = 'Recompute the trending hashtags snapshot and prune expired buckets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Keep running, refreshing every this many seconds'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if interval is not None and interval <= 0:
+            raise CommandError('--interval must be positive')
+        while True:
+            started = time.perf_counter()
+            pruned = trending.prune()
+            snapshot = trending.refresh()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Refreshed {len(snapshot['hashtags'])} trending hashtags in {elapsed:.2f}s, "
+                f'pruned {pruned} buckets'
+            )
+            if interval is None:
+                return
+            time.sleep(max(0, interval - elapsed))
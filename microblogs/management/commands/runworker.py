@@ -0,0 +1,50 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from microblogs import jobs
+
+class Command(BaseCommand):
+    help = 'Run queued jobs until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Jobs run at once')
+        parser.add_argument('--executor', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--batch-size', type=int, default=jobs.CLAIM_BATCH_SIZE, help='Jobs claimed at once')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--until-empty', action='store_true', help='Stop once no job is ready')
+        parser.add_argument('--report-interval', type=float, default=60, help='Seconds between throughput reports')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--concurrency and --batch-size must be at least 1')
+        worker = jobs.Worker(
+            concurrency = options['concurrency'],
+            executor = options['executor'],
+            batch_size = options['batch_size'],
+            poll_interval = options['poll_interval'],
+        )
+        #Finish the batch in hand on SIGTERM rather than abandoning it
+        signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+        self.reported = time.perf_counter()
+
+        def report(worker):
+            if time.perf_counter() - self.reported >= options['report_interval']:
+                self._report(worker)
+                self.reported = time.perf_counter()
+
+        try:
+            worker.run(until_empty=options['until_empty'], on_batch=report)
+        except KeyboardInterrupt:
+            pass
+        self._report(worker)
+
+    def _report(self, worker):
+        stats = worker.stats()
+        queue = jobs.queue_stats()
+        self.stdout.write(
+            f"{stats['done']} done, {stats['retried']} retried, {stats['failed']} failed, {stats['lost']} lost "
+            f"in {stats['elapsed']:.1f}s ({stats['jobs_per_second']:.0f} jobs/s); "
+            f"{queue['queued']} queued, {queue['failed']} failed in the queue"
+        )
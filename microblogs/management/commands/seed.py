@@ -1,32 +1,139 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import os
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand, CommandError
-from faker import Faker
+from django.db import transaction
 
-import string
-import secrets
+from microblogs import cache, db, graph, tags, timeline
+from microblogs.fakedata import fake_posts, fake_users
+from microblogs.models import Follow, Post, TimelineEntry, User
 
-from microblogs.models import User
+#Seeded users are recognisable by this username prefix, see unseeder
+USERNAME_PREFIX = '@seed_'
+EMAIL_DOMAIN = 'seed.example.org'
 
 class Command(BaseCommand):
-    def __init__(self):
-        super().__init__()
-        self.faker = Faker('en_GB')
+    help = 'Seed the database with fake users, follows and posts for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--follows', type=int, default=1000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes generating fake data; 1 generates inline'
+        )
+        parser.add_argument(
+            '--password', default='Password123',
+            help='Password shared by every seeded user, hashed once'
+        )
 
     def handle(self, *args, **options):
-        for i in range(1, 100):
-            username = "user" + str(i)
-            fullname = self.faker.name()
-            fullname = fullname.split()
-            passwordContuctor = ""
-            passwordCharacters = string.ascii_letters + string.digits
-            for i in range(secrets.choice(string.digits)):
-                passwordContuctor += ''.join(secrets.choice(passwordCharacters))
-            user = User.objects.create_user(
-                username,
-                first_name = fullname[0],
-                last_name = fullname[1],
-                email = self.faker.email(),
-                password = passwordContuctor,
-                bio = self.faker.text()
-            )
-            user.save()
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        self.batch_size = options['batch_size']
+        self.workers = options['workers']
+        self.executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        started = time.perf_counter()
+        try:
+            user_ids = self._timed('users', self._seed_users, options['users'], options['password'])
+            if user_ids:
+                self._timed('follows', self._seed_follows, user_ids, options['follows'])
+                self._timed('posts', self._seed_posts, user_ids, options['posts'])
+                self._timed('counters', self._reconcile, user_ids[0])
+            #Keep the row estimates used by the admin paginators current
+            db.analyze([User, Post, Follow, TimelineEntry])
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Seeding finished in {elapsed:.2f}s'))
+
+    def _timed(self, label, seeder, *args):
+        started = time.perf_counter()
+        result = seeder(*args)
+        rows = len(result) if isinstance(result, list) else result
+        elapsed = time.perf_counter() - started
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(f'{label}: {rows} rows in {elapsed:.2f}s ({rate:.0f} rows/s)')
+        return result
+
+    def _seed_users(self, count, password):
+        #Hashing is deliberately slow, so every seeded user shares one hash
+        password = make_password(password)
+        first = (User.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+        chunks = [
+            (start, min(self.batch_size, first + count - start))
+            for start in range(first, first + count, self.batch_size)
+        ]
+        user_ids = []
+        for rows in self._generate(fake_users, chunks):
+            users = User.objects.bulk_create([
+                User(
+                    username = f'{USERNAME_PREFIX}{index}',
+                    email = f'seed{index}@{EMAIL_DOMAIN}',
+                    first_name = first_name,
+                    last_name = last_name,
+                    bio = bio,
+                    password = password,
+                )
+                for index, first_name, last_name, bio in rows
+            ])
+            #Ids may be reused after unseeder; make sure nothing cached survives
+            cache.bump_users([user.pk for user in users])
+            cache.bump_feeds([user.pk for user in users])
+            user_ids.extend(user.pk for user in users)
+        return user_ids
+
+    def _seed_follows(self, user_ids, count):
+        created = 0
+        remaining = count
+        while remaining > 0 and len(user_ids) > 1:
+            size = min(self.batch_size, remaining)
+            pairs = [tuple(random.sample(user_ids, 2)) for _ in range(size)]
+            created += graph.bulk_follow(pairs, backfill=False)
+            remaining -= size
+        return created
+
+    def _seed_posts(self, user_ids, count):
+        chunks = [
+            (min(self.batch_size, count - start),)
+            for start in range(0, count, self.batch_size)
+        ]
+        created = 0
+        for texts in self._generate(fake_posts, chunks):
+            with transaction.atomic():
+                posts = Post.objects.bulk_create([
+                    Post(author_id=random.choice(user_ids), text=text)
+                    for text in texts
+                ])
+                cache.bump_posts([post.pk for post in posts])
+                timeline.bulk_fan_out(posts)
+                tags.index_posts(posts)
+            created += len(posts)
+        return created
+
+    def _reconcile(self, first_pk):
+        for owner_id in User.objects.filter(pk__gte=first_pk).values_list('pk', flat=True).iterator():
+            timeline.trim(owner_id)
+        return sum(repaired for _, repaired in graph.reconcile_counters(first_pk, self.batch_size))
 
+    def _generate(self, generator, chunks):
+        #Yield generator(*chunk) for every chunk in order, keeping only a few
+        #chunks in flight so memory stays bounded however large the dataset
+        if self.executor is None:
+            for chunk in chunks:
+                yield generator(*chunk)
+            return
+        pending = deque()
+        for chunk in chunks:
+            pending.append(self.executor.submit(generator, *chunk))
+            if len(pending) >= self.workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -1,6 +1,64 @@
+import time
+
 from django.core.management.base import BaseCommand, CommandError
-from ...models import User
+from django.db import transaction
+from django.db.models import Max, Min, Q
+
+from microblogs import graph
+from microblogs.bulk import delete_cascade
+from microblogs.management.commands.seed import USERNAME_PREFIX
+from microblogs.models import Follow, Post, User
 
 class Command(BaseCommand):
-    for i in range(1, 100):
-        ("user" + str(i)).delete()
\ No newline at end of file
+    help = 'Delete the users created by seed together with their posts and follows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Width of the primary key range deleted per transaction'
+        )
+
+    def handle(self, *args, **options):
+        #Every chunk is committed on its own, so an interrupted run leaves a
+        #consistent database and simply running the command again resumes
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        self.batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+        seeded = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        posts = self._delete_in_ranges('posts', Post.objects.filter(author__in=seeded.values('pk')))
+        users = self._delete_in_ranges('users', seeded, before_chunk=self._release_follows)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {users} seeded users and {posts} of their posts'))
+
+    def _delete_in_ranges(self, label, queryset, before_chunk=None):
+        started = time.perf_counter()
+        bounds = queryset.aggregate(lowest=Min('pk'), highest=Max('pk'))
+        lower, highest = bounds['lowest'], bounds['highest']
+        total = 0
+        while lower is not None and lower <= highest:
+            chunk = queryset.filter(pk__gte=lower, pk__lt=lower + self.batch_size)
+            with transaction.atomic():
+                if before_chunk is not None:
+                    before_chunk(chunk)
+                total += delete_cascade(chunk)
+            if self.verbosity > 1:
+                self.stdout.write(f'{label}: deleted up to id {lower + self.batch_size - 1}')
+            lower += self.batch_size
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(f'{label}: {total} rows in {elapsed:.2f}s ({rate:.0f} rows/s)')
+        return total
+
+    def _release_follows(self, users):
+        #Follows between a seeded user and a real one are deleted without
+        #signals, so fix the real user's counters here
+        seeded = User.objects.filter(username__startswith=USERNAME_PREFIX).values('pk')
+        pairs = (
+            Follow.objects
+            .filter(
+                Q(follower__in=users.values('pk')) & ~Q(followee__in=seeded)
+                | Q(followee__in=users.values('pk')) & ~Q(follower__in=seeded)
+            )
+            .values_list('follower_id', 'followee_id')
+        )
+        graph.apply_follow_deltas(list(pairs), -1)
@@ -0,0 +1,88 @@
+from django.db import migrations
+
+#The DDL of microblogs.search as of this migration, kept here so that later
+#changes to that module cannot change what this migration does
+
+SQLITE_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS microblogs_post_fts USING fts5("
+    "text, content='microblogs_post', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS microblogs_post_fts_insert AFTER INSERT ON microblogs_post BEGIN "
+    "INSERT INTO microblogs_post_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS microblogs_post_fts_delete AFTER DELETE ON microblogs_post BEGIN "
+    "INSERT INTO microblogs_post_fts(microblogs_post_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS microblogs_post_fts_update AFTER UPDATE OF text ON microblogs_post BEGIN "
+    "INSERT INTO microblogs_post_fts(microblogs_post_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO microblogs_post_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS microblogs_user_fts USING fts5("
+    "username, first_name, last_name, bio, content='microblogs_user', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS microblogs_user_fts_insert AFTER INSERT ON microblogs_user BEGIN "
+    "INSERT INTO microblogs_user_fts(rowid, username, first_name, last_name, bio) "
+    "VALUES (new.id, new.username, new.first_name, new.last_name, new.bio); END",
+    "CREATE TRIGGER IF NOT EXISTS microblogs_user_fts_delete AFTER DELETE ON microblogs_user BEGIN "
+    "INSERT INTO microblogs_user_fts(microblogs_user_fts, rowid, username, first_name, last_name, bio) "
+    "VALUES ('delete', old.id, old.username, old.first_name, old.last_name, old.bio); END",
+    "CREATE TRIGGER IF NOT EXISTS microblogs_user_fts_update AFTER UPDATE OF username, first_name, last_name, bio "
+    "ON microblogs_user BEGIN "
+    "INSERT INTO microblogs_user_fts(microblogs_user_fts, rowid, username, first_name, last_name, bio) "
+    "VALUES ('delete', old.id, old.username, old.first_name, old.last_name, old.bio); "
+    "INSERT INTO microblogs_user_fts(rowid, username, first_name, last_name, bio) "
+    "VALUES (new.id, new.username, new.first_name, new.last_name, new.bio); END",
+    "INSERT INTO microblogs_post_fts(microblogs_post_fts) VALUES ('rebuild')",
+    "INSERT INTO microblogs_user_fts(microblogs_user_fts) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS microblogs_post_fts_insert',
+    'DROP TRIGGER IF EXISTS microblogs_post_fts_delete',
+    'DROP TRIGGER IF EXISTS microblogs_post_fts_update',
+    'DROP TABLE IF EXISTS microblogs_post_fts',
+    'DROP TRIGGER IF EXISTS microblogs_user_fts_insert',
+    'DROP TRIGGER IF EXISTS microblogs_user_fts_delete',
+    'DROP TRIGGER IF EXISTS microblogs_user_fts_update',
+    'DROP TABLE IF EXISTS microblogs_user_fts',
+]
+
+POSTGRESQL_INSTALL = [
+    "CREATE INDEX IF NOT EXISTS microblogs_post_fts ON microblogs_post "
+    "USING GIN (to_tsvector('english', coalesce(text, '')))",
+    "CREATE INDEX IF NOT EXISTS microblogs_user_fts ON microblogs_user "
+    "USING GIN (to_tsvector('english', coalesce(username, '') || ' ' || coalesce(first_name, '') || ' ' "
+    "|| coalesce(last_name, '') || ' ' || coalesce(bio, '')))",
+]
+
+POSTGRESQL_UNINSTALL = [
+    'DROP INDEX IF EXISTS microblogs_post_fts',
+    'DROP INDEX IF EXISTS microblogs_user_fts',
+]
+
+STATEMENTS = {
+    'sqlite': (SQLITE_INSTALL, SQLITE_UNINSTALL),
+    'postgresql': (POSTGRESQL_INSTALL, POSTGRESQL_UNINSTALL),
+}
+
+
+def _execute(schema_editor, statements):
+    with schema_editor.connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def install_search(apps, schema_editor):
+    install, _ = STATEMENTS.get(schema_editor.connection.vendor, ([], []))
+    _execute(schema_editor, install)
+
+
+def uninstall_search(apps, schema_editor):
+    _, uninstall = STATEMENTS.get(schema_editor.connection.vendor, ([], []))
+    _execute(schema_editor, uninstall)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('microblogs', '0009_user_counters_follow_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.2 on 2026-10-18 10:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('microblogs', '0011_hashtags_mentions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HashtagBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('hashtag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='microblogs.hashtag')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='hashtagbucket',
+            index=models.Index(fields=['started_at'], name='hashtag_bucket_started_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='hashtagbucket',
+            constraint=models.UniqueConstraint(fields=('hashtag', 'started_at'), name='unique_hashtag_bucket'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.2 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('microblogs', '0012_hashtag_buckets'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_active', '-id'], name='user_active_idx'),
+        ),
+    ]
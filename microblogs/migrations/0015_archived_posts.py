@@ -0,0 +1,72 @@
+# Generated by Django 4.1.2 on 2026-10-18 10:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+#On PostgreSQL the archive is partitioned by month of created_at and
+#archive_posts creates the partitions as it needs them, see
+#microblogs.archive. The primary key of a partitioned table has to include
+#the partition key, so there it is (created_at, id).
+PARTITIONED_TABLE = [
+    """
+    CREATE TABLE microblogs_archivedpost (
+        id bigint NOT NULL,
+        compressed_text bytea NOT NULL,
+        created_at timestamp with time zone NOT NULL,
+        author_id bigint NOT NULL
+            REFERENCES microblogs_user (id) DEFERRABLE INITIALLY DEFERRED,
+        PRIMARY KEY (created_at, id)
+    ) PARTITION BY RANGE (created_at)
+    """,
+    'CREATE INDEX archived_recent_idx ON microblogs_archivedpost (created_at DESC, id DESC)',
+    'CREATE INDEX archived_author_recent_idx ON microblogs_archivedpost (author_id, created_at DESC, id DESC)',
+]
+
+
+def create_archive(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in PARTITIONED_TABLE:
+            schema_editor.execute(statement)
+    else:
+        schema_editor.create_model(apps.get_model('microblogs', 'ArchivedPost'))
+
+
+def drop_archive(apps, schema_editor):
+    #Dropping a partitioned table drops its partitions too
+    schema_editor.delete_model(apps.get_model('microblogs', 'ArchivedPost'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('microblogs', '0014_jobs'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ArchivedPost',
+                    fields=[
+                        ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                        ('compressed_text', models.BinaryField()),
+                        ('created_at', models.DateTimeField()),
+                        ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_posts', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'ordering': ['-created_at', '-id'],
+                    },
+                ),
+                migrations.AddIndex(
+                    model_name='archivedpost',
+                    index=models.Index(fields=['-created_at', '-id'], name='archived_recent_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='archivedpost',
+                    index=models.Index(fields=['author', '-created_at', '-id'], name='archived_author_recent_idx'),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_archive, drop_archive),
+    ]
@@ -1,5 +1,8 @@
+import zlib
+
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import models, router, transaction
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
 class User(AbstractUser):
@@ -27,6 +30,41 @@ class User(AbstractUser):
         blank = True,
         max_length = 520
     )
+    #Denormalized counters maintained by microblogs.signals and microblogs.graph
+    #so profiles never need a COUNT(*); reconcile_counters repairs any drift
+    followers_count = models.PositiveIntegerField(
+        default = 0,
+        editable = False
+    )
+    following_count = models.PositiveIntegerField(
+        default = 0,
+        editable = False
+    )
+    posts_count = models.PositiveIntegerField(
+        default = 0,
+        editable = False
+    )
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            #Serves the is_active admin filter in the changelist's -id order
+            models.Index(
+                fields = ['is_active', '-id'],
+                name = 'user_active_idx'
+            ),
+        ]
+
+class PostQuerySet(models.QuerySet):
+
+    def create(self, **kwargs):
+        #QuerySet.create saves to the queryset's database; unless one was
+        #chosen, let the router place the post by its author, see microblogs.sharding
+        if self._db is not None:
+            return super().create(**kwargs)
+        post = self.model(**kwargs)
+        post.save(force_insert=True)
+        return post
+
 
 class Post(models.Model):
     author = models.ForeignKey(
@@ -40,6 +78,264 @@ class Post(models.Model):
         auto_now_add = True,
     )
 
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(
+                fields = ['-created_at', '-id'],
+                name = 'post_recent_idx'
+            ),
+            models.Index(
+                fields = ['author', '-created_at', '-id'],
+                name = 'post_author_recent_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        #The author's posts_count is updated by a post_save handler; keep both
+        #writes in one transaction, unless the post is on a shard
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+
+class Follow(models.Model):
+    follower = models.ForeignKey(
+        User,
+        on_delete = models.CASCADE,
+        related_name = 'following_links'
+    )
+    followee = models.ForeignKey(
+        User,
+        on_delete = models.CASCADE,
+        related_name = 'follower_links'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add = True,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields = ['follower', 'followee'],
+                name = 'unique_follow'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields = ['followee', 'follower'],
+                name = 'follow_followee_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        #Both users' counters are updated by a post_save handler; keep all
+        #three writes in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+class TimelineEntry(models.Model):
+    #One post materialized into one user's feed; created_at is copied from
+    #the post so a page of the feed is a single index range scan
+    owner = models.ForeignKey(
+        User,
+        on_delete = models.CASCADE,
+        related_name = 'timeline_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete = models.CASCADE,
+        related_name = '+'
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields = ['owner', 'post'],
+                name = 'unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields = ['owner', '-created_at', '-post'],
+                name = 'timeline_owner_recent_idx'
+            ),
+        ]
+
+class Hashtag(models.Model):
+    #Stored lowercased and without the leading #
+    name = models.CharField(
+        max_length = 100,
+        unique = True
+    )
+
+class PostHashtag(models.Model):
+    post = models.ForeignKey(
+        Post,
+        on_delete = models.CASCADE,
+        related_name = 'hashtag_links'
+    )
+    hashtag = models.ForeignKey(
+        Hashtag,
+        on_delete = models.CASCADE,
+        related_name = 'post_links'
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields = ['post', 'hashtag'],
+                name = 'unique_post_hashtag'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields = ['hashtag', '-created_at', '-post'],
+                name = 'hashtag_recent_idx'
+            ),
+        ]
+
+class Mention(models.Model):
+    post = models.ForeignKey(
+        Post,
+        on_delete = models.CASCADE,
+        related_name = 'mentions'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete = models.CASCADE,
+        related_name = 'mentions'
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields = ['post', 'user'],
+                name = 'unique_mention'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields = ['user', '-created_at', '-post'],
+                name = 'mention_recent_idx'
+            ),
+        ]
+
+class HashtagBucket(models.Model):
+    #Number of posts using a hashtag that were created in one time bucket
+    hashtag = models.ForeignKey(
+        Hashtag,
+        on_delete = models.CASCADE,
+        related_name = 'buckets'
+    )
+    started_at = models.DateTimeField()
+    count = models.PositiveIntegerField(
+        default = 0
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields = ['hashtag', 'started_at'],
+                name = 'unique_hashtag_bucket'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields = ['started_at'],
+                name = 'hashtag_bucket_started_idx'
+            ),
+        ]
+
+class Job(models.Model):
+    #Work deferred to the runworker command, see microblogs.jobs
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(
+        max_length = 50
+    )
+    payload = models.JSONField(
+        default = dict
+    )
+    status = models.CharField(
+        max_length = 10,
+        choices = STATUSES,
+        default = QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default = 0
+    )
+    run_after = models.DateTimeField(
+        default = timezone.now
+    )
+    claim_token = models.CharField(
+        max_length = 32,
+        blank = True
+    )
+    claimed_at = models.DateTimeField(
+        null = True,
+        blank = True
+    )
+    last_error = models.TextField(
+        blank = True
+    )
+    created_at = models.DateTimeField(
+        auto_now_add = True,
+    )
+
     class Meta:
-        ordering = ['-created_at']
-    
+        indexes = [
+            models.Index(
+                fields = ['status', 'run_after', 'id'],
+                name = 'job_ready_idx'
+            ),
+        ]
+
+class ArchivedPost(models.Model):
+    #A post moved out of the Post table by archive_posts, see microblogs.archive
+    id = models.BigIntegerField(
+        primary_key = True
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete = models.CASCADE,
+        related_name = 'archived_posts'
+    )
+    compressed_text = models.BinaryField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(
+                fields = ['-created_at', '-id'],
+                name = 'archived_recent_idx'
+            ),
+            models.Index(
+                fields = ['author', '-created_at', '-id'],
+                name = 'archived_author_recent_idx'
+            ),
+        ]
+
+    @property
+    def text(self):
+        return zlib.decompress(self.compressed_text).decode()
+
+    def to_post(self):
+        #An unsaved Post with the same id, rendered like any other post
+        post = Post(id=self.pk, author_id=self.author_id, text=self.text, created_at=self.created_at)
+        if ArchivedPost.author.is_cached(self):
+            Post.author.field.set_cached_value(post, self.author)
+        return post
@@ -0,0 +1,87 @@
+"""Keyset pagination over (created_at, id).
+
+Pages are selected with a range condition on the composite index instead of
+OFFSET, so every page costs the same however deep the reader scrolls, and
+rows inserted while paging never shift later pages. Cursors are opaque
+url-safe tokens wrapping the key of the last row of the previous page.
+"""
+import base64
+from collections import namedtuple
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+PAGE_SIZE = getattr(settings, 'FEED_PAGE_SIZE', 50)
+#Ids are 64-bit; larger values in a cursor would overflow the database driver
+MAX_ID = 2 ** 63 - 1
+
+Page = namedtuple('Page', ['items', 'next_cursor'])
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    raw = '%s|%d' % (created_at.isoformat(), pk)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    #Return the (created_at, id) key wrapped by a cursor, or None for no cursor
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), parse_id(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor('Malformed cursor')
+
+def parse_id(value):
+    #An id read from a cursor; ValueError unless it is one the database can hold
+    pk = int(value)
+    if not 1 <= pk <= MAX_ID:
+        raise ValueError(f'Id out of range: {pk}')
+    return pk
+
+def older_than(queryset, key, id_field='id'):
+    #Restrict a queryset to rows strictly after `key` in newest-first order
+    if key is None:
+        return queryset
+    created_at, pk = key
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, **{id_field + '__lt': pk})
+    )
+
+def newer_than(queryset, key, id_field='id'):
+    #Restrict a queryset to rows strictly before `key` in newest-first order
+    if key is None:
+        return queryset
+    created_at, pk = key
+    return queryset.filter(
+        Q(created_at__gt=created_at) | Q(created_at=created_at, **{id_field + '__gt': pk})
+    )
+
+def make_page(items, limit):
+    #`items` holds up to limit + 1 rows; the extra one only signals a next page
+    items = list(items)
+    if len(items) <= limit:
+        return Page(items, None)
+    items = items[:limit]
+    last = items[-1]
+    return Page(items, encode_cursor(last.created_at, last.pk))
+
+def paginate(queryset, cursor=None, limit=PAGE_SIZE):
+    """Return one Page of `queryset` in newest-first order.
+
+    Raises InvalidCursor if `cursor` is not a token produced by this module.
+    """
+    queryset = older_than(queryset, decode_cursor(cursor))
+    return make_page(queryset.order_by('-created_at', '-id')[:limit + 1], limit)
+
+async def apaginate(queryset, cursor=None, limit=PAGE_SIZE):
+    #Async paginate, for use with the async ORM
+    queryset = older_than(queryset, decode_cursor(cursor))
+    rows = [row async for row in queryset.order_by('-created_at', '-id')[:limit + 1]]
+    return make_page(rows, limit)
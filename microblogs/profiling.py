@@ -0,0 +1,223 @@
+"""Opt-in request profiling.
+
+ProfilingMiddleware records, per view, a latency histogram, the number and
+duration of SQL queries, template render time and optionally the memory
+allocated while handling each request. Repeated queries are flagged: the
+same SQL with the same parameters is a duplicate, and the same SQL run with
+PROFILING_REPEAT_THRESHOLD or more different parameters is a likely N+1.
+Every profiled response carries a Server-Timing header, and the totals are
+served in Prometheus text format by the metrics view.
+
+The middleware removes itself at startup unless PROFILING_ENABLED is set,
+so a disabled profiler costs nothing per request.
+"""
+import logging
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+
+logger = logging.getLogger(__name__)
+
+REPEAT_THRESHOLD = getattr(settings, 'PROFILING_REPEAT_THRESHOLD', 5)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar('profiling_request', default=None)
+
+
+class RequestProfile:
+    #What one request spent on queries and templates
+
+    def __init__(self):
+        self.queries = Counter()
+        self.query_seconds = 0.0
+        self.template_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        #Installed with connection.execute_wrapper() for the whole request
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_seconds += time.perf_counter() - started
+            self.queries[sql, _hashable(params)] += 1
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    def duplicates(self):
+        return sum(count - 1 for count in self.queries.values())
+
+    def repeated_statements(self):
+        #SQL executed with at least REPEAT_THRESHOLD different parameters
+        variants = Counter(sql for sql, _ in self.queries)
+        return [sql for sql, count in variants.items() if count >= REPEAT_THRESHOLD]
+
+
+class Histogram:
+    #A cumulative histogram in the shape Prometheus expects
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+class ViewStats:
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.duplicate_queries = 0
+        self.repeated_statements = 0
+        self.template_seconds = 0.0
+        self.allocated_bytes = 0
+
+
+class Registry:
+    #Totals per view name, shared by every thread of the process
+
+    def __init__(self):
+        self.views = defaultdict(ViewStats)
+        self._lock = threading.Lock()
+
+    def record(self, view, elapsed, profile, allocated):
+        with self._lock:
+            stats = self.views[view]
+            stats.latency.observe(elapsed)
+            stats.queries += profile.query_count
+            stats.query_seconds += profile.query_seconds
+            stats.duplicate_queries += profile.duplicates()
+            stats.repeated_statements += len(profile.repeated_statements())
+            stats.template_seconds += profile.template_seconds
+            stats.allocated_bytes += allocated
+
+    def clear(self):
+        with self._lock:
+            self.views.clear()
+
+    def prometheus(self, cache_stats=None):
+        #Render every metric in the Prometheus text exposition format
+        with self._lock:
+            views = sorted(self.views.items())
+            lines = [
+                '# HELP clucker_request_seconds Time spent handling requests.',
+                '# TYPE clucker_request_seconds histogram',
+            ]
+            for view, stats in views:
+                label = f'view="{_escape(view)}"'
+                histogram = stats.latency
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'clucker_request_seconds_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'clucker_request_seconds_bucket{{{label},le="+Inf"}} {histogram.count}')
+                lines.append(f'clucker_request_seconds_sum{{{label}}} {histogram.sum}')
+                lines.append(f'clucker_request_seconds_count{{{label}}} {histogram.count}')
+            for name, attribute, help_text in COUNTERS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for view, stats in views:
+                    lines.append(f'{name}{{view="{_escape(view)}"}} {getattr(stats, attribute)}')
+        if cache_stats:
+            lines.append('# HELP clucker_fragment_cache Fragment cache lookups and local entries.')
+            lines.append('# TYPE clucker_fragment_cache gauge')
+            for key, value in sorted(cache_stats.items()):
+                lines.append(f'clucker_fragment_cache{{stat="{_escape(key)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+COUNTERS = [
+    ('clucker_queries_total', 'queries', 'SQL queries executed.'),
+    ('clucker_query_seconds_total', 'query_seconds', 'Time spent executing SQL queries.'),
+    ('clucker_duplicate_queries_total', 'duplicate_queries', 'Queries repeating an earlier query of the same request.'),
+    ('clucker_repeated_statements_total', 'repeated_statements', 'Statements run with many parameters in one request (likely N+1).'),
+    ('clucker_template_seconds_total', 'template_seconds', 'Time spent rendering templates.'),
+    ('clucker_allocated_bytes_total', 'allocated_bytes', 'Memory allocated while handling requests, when traced.'),
+]
+
+registry = Registry()
+
+
+class ProfilingMiddleware:
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.trace_memory = getattr(settings, 'PROFILING_TRACE_MEMORY', False)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _instrument_templates()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        allocated_before = tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - started
+        #Concurrent requests share the tracer, so this is only exact when serial
+        allocated = max(0, tracemalloc.get_traced_memory()[0] - allocated_before) if self.trace_memory else 0
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.record(view, elapsed, profile, allocated)
+        for sql in profile.repeated_statements():
+            logger.warning('Possible N+1 queries in %s: %s', view, sql)
+        response['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.1f}, '
+            f'db;dur={profile.query_seconds * 1000:.1f};desc="{profile.query_count} queries", '
+            f'tpl;dur={profile.template_seconds * 1000:.1f}'
+        )
+        return response
+
+
+def _instrument_templates():
+    #Time top-level renders; included templates are counted in their parent
+    if getattr(Template.render, 'profiled', False):
+        return
+    render = Template.render
+
+    def profiled_render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return render(self, context, request)
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            profile.template_seconds += time.perf_counter() - started
+
+    profiled_render.profiled = True
+    Template.render = profiled_render
+
+def _hashable(params):
+    try:
+        hash(params)
+        return params
+    except TypeError:
+        return repr(params)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
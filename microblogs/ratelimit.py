@@ -0,0 +1,152 @@
+"""Per-client rate limits for the views that write or are expensive.
+
+A limit of (requests, seconds) lets a client burst up to `requests` and then
+continue at requests/seconds; beyond that the view answers 429 with a
+Retry-After header. Clients are told apart by address or by logged in user.
+MemoryBackend keeps a token bucket per client in each process, which costs a
+lock and a little arithmetic per request but gives every worker its own
+allowance. CacheBackend shares a sliding window count through the default
+cache, at the price of three cache calls per request.
+"""
+from collections import OrderedDict
+import functools
+import inspect
+import math
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+ENABLED = getattr(settings, 'RATELIMIT_ENABLED', True)
+LIMITS = getattr(settings, 'RATELIMITS', {})
+MEMORY_SIZE = getattr(settings, 'RATELIMIT_MEMORY_SIZE', 100000)
+
+
+class MemoryBackend:
+    """Token buckets of this process, forgetting the least recently seen clients."""
+
+    def __init__(self, size=MEMORY_SIZE):
+        self.size = size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, requests, seconds):
+        """Take a token for `key`; return 0, or the seconds until one is free."""
+        rate = requests / seconds
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.pop(key, (requests, now))
+            tokens = min(requests, tokens + (now - stamp) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            if len(self._buckets) > self.size:
+                #A forgotten client starts again with a full bucket
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBackend:
+    """Sliding window counts in the default cache, shared by every process.
+
+    The count of the previous fixed window is weighted by how much of it the
+    sliding window still covers, so a client cannot double its allowance at a
+    window boundary.
+    """
+
+    def hit(self, key, requests, seconds):
+        cache = caches['default']
+        now = time.time()
+        window, elapsed = divmod(now, seconds)
+        current = f'ratelimit:{key}:{int(window)}'
+        cache.add(current, 0, seconds * 2)
+        try:
+            count = cache.incr(current)
+        except ValueError:
+            #Expired between add and incr
+            cache.set(current, 1, seconds * 2)
+            count = 1
+        previous = cache.get(f'ratelimit:{key}:{int(window) - 1}', 0)
+        overlap = 1 - elapsed / seconds
+        if previous * overlap + count <= requests:
+            return 0
+        if not previous or count > requests:
+            return seconds - elapsed
+        #The weight of the previous window drops as the window slides on
+        return min(seconds - elapsed, (previous * overlap + count - requests) * seconds / previous)
+
+    def clear(self):
+        #Counts are shared with other processes and expire on their own
+        pass
+
+
+BACKENDS = {'memory': MemoryBackend, 'cache': CacheBackend}
+
+backend = BACKENDS[getattr(settings, 'RATELIMIT_BACKEND', 'memory')]()
+
+
+def client_key(request, by):
+    #'user' falls back to the address for anonymous requests
+    if by == 'user' and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'ip:{request.META.get("REMOTE_ADDR")}'
+
+def check(scope, key):
+    """Count a request of `key` against the limit of `scope`.
+
+    Returns 0 if it is allowed, else the seconds until the next one is.
+    """
+    if not ENABLED or scope not in LIMITS:
+        return 0
+    requests, seconds = LIMITS[scope]
+    return backend.hit(f'{scope}:{key}', requests, seconds)
+
+def too_many_requests(retry_after, json=False):
+    if json:
+        response = JsonResponse({'error': 'Too many requests'}, status=429)
+    else:
+        response = HttpResponse('Too many requests', status=429, content_type='text/plain')
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def ratelimit(scope, by='ip', methods=('POST',), json=False):
+    """Limit a view to RATELIMITS[scope] requests of `methods` per client.
+
+    `by` is 'ip' or 'user'; `json` answers refused requests with a JSON body.
+    Works on sync and async views.
+    """
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if request.method in methods:
+                    #request.user may need a query, which cannot run in the event loop
+                    key = client_key(request, by) if by == 'ip' else await sync_to_async(client_key)(request, by)
+                    retry_after = check(scope, key)
+                    if retry_after:
+                        return too_many_requests(retry_after, json)
+                return await view(request, *args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if request.method in methods:
+                    retry_after = check(scope, client_key(request, by))
+                    if retry_after:
+                        return too_many_requests(retry_after, json)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def reset():
+    #Forget every count of this process
+    backend.clear()
@@ -0,0 +1,152 @@
+"""Database routers for read replicas and post shards.
+
+PrimaryReplicaRouter sends reads made while handling a request to a random
+replica from DATABASE_REPLICAS and everything else to the primary. Replicas
+lag behind the primary, so a client that just wrote would not see its own
+writes there: ReplicaStickinessMiddleware remembers writes in a cookie and
+the client's requests read from the primary for REPLICA_STICKY_SECONDS.
+Reads inside a transaction, and reads outside requests (commands, workers),
+always go to the primary.
+
+AuthorShardRouter places each post on the shard its author maps to, see
+microblogs.sharding.
+"""
+import contextvars
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from microblogs import sharding
+from microblogs.models import Job, Post, User
+
+STICKY_COOKIE = 'clucker_primary_until'
+
+#Routing state of the request being handled, None outside requests
+_request_state = contextvars.ContextVar('replica_routing', default=None)
+
+
+class _RequestState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def begin_request(pinned=False):
+    #Returns a token for end_request
+    return _request_state.set(_RequestState(pinned))
+
+def end_request(token):
+    #Returns whether the request wrote to the primary
+    state = _request_state.get()
+    _request_state.reset(token)
+    return state is not None and state.wrote
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        replicas = settings.DATABASE_REPLICAS
+        #Jobs are claimed right after they are read, so never from a replica
+        if state is None or state.pinned or not replicas or model is Job:
+            return 'default'
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            #Everything this request reads from now on must see the write
+            state.pinned = True
+            state.wrote = True
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in (None, 'default', *settings.DATABASE_REPLICAS):
+            #Rows of other databases, e.g. a shard being migrated, stay there
+            return instance._state.db
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        #Replicas get their schema from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class AuthorShardRouter:
+    """Routes posts to the shard of their author.
+
+    Posts are the only sharded rows; users and everything else stay on the
+    primary, so a post and its author live in different databases and the
+    relation between them is allowed explicitly.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.POST_SHARDS:
+            return None
+        instance = hints.get('instance')
+        if model is Post and isinstance(instance, User):
+            #e.g. user.post_set
+            return sharding.shard_for(instance.pk)
+        if model is User and isinstance(instance, Post):
+            #e.g. post.author on a post read from a shard
+            return 'default'
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not settings.POST_SHARDS or model is not Post:
+            return None
+        instance = hints.get('instance')
+        if isinstance(instance, Post) and instance.author_id is not None:
+            return sharding.shard_for(instance.author_id)
+        if isinstance(instance, User):
+            return sharding.shard_for(instance.pk)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if settings.POST_SHARDS and {type(obj1), type(obj2)} <= {Post, User}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        #Shards get the whole schema, so the post table and its indexes and
+        #search triggers are the same as on the primary
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    #Keeps a client on the primary for a while after it wrote
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned = float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        token = begin_request(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = end_request(token)
+        if wrote:
+            sticky = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + sticky),
+                max_age = sticky,
+                httponly = True,
+                samesite = 'Lax',
+            )
+        return response
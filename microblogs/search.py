@@ -0,0 +1,170 @@
+"""Full-text search over post texts and user profiles.
+
+On SQLite, posts and users are indexed by FTS5 tables that use the model
+tables as external content. Triggers on the model tables keep the indexes
+current, so bulk_create and raw deletes are covered too. On PostgreSQL,
+GIN indexes over to_tsvector() expressions are maintained by the database
+itself. Results are ranked best first and paged with a keyset on
+(score, id), where a lower score is a better match on both backends.
+"""
+import base64
+import math
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from microblogs.models import Post, User
+from microblogs.pagination import InvalidCursor, Page, parse_id
+
+SEARCH_PAGE_SIZE = getattr(settings, 'SEARCH_PAGE_SIZE', 20)
+REBUILD_BATCH_SIZE = 10000
+
+#Columns of each searchable model that are indexed, by model table
+INDEXED_COLUMNS = {
+    Post._meta.db_table: ['text'],
+    User._meta.db_table: ['username', 'first_name', 'last_name', 'bio'],
+}
+PG_CONFIG = 'english'
+CONTROL_CHARACTERS = re.compile(r'[\x00-\x1f\x7f]')
+
+
+def install(conn=connection):
+    #Create the search indexes and their triggers; safe to run repeatedly
+    with conn.cursor() as cursor:
+        for table, columns in INDEXED_COLUMNS.items():
+            for statement in _install_statements(conn.vendor, table, columns):
+                cursor.execute(statement)
+
+def uninstall(conn=connection):
+    with conn.cursor() as cursor:
+        for table in INDEXED_COLUMNS:
+            if conn.vendor == 'sqlite':
+                for event in ('insert', 'delete', 'update'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{event}')
+                cursor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+            elif conn.vendor == 'postgresql':
+                cursor.execute(f'DROP INDEX IF EXISTS {table}_fts')
+
+def rebuild(model, batch_size=REBUILD_BATCH_SIZE, conn=connection):
+    """Re-index every row of `model`, committing one primary key range at a time.
+
+    Yields the number of rows indexed after each batch.
+    """
+    table = model._meta.db_table
+    columns = INDEXED_COLUMNS[table]
+    install(conn)
+    if conn.vendor == 'postgresql':
+        with conn.cursor() as cursor:
+            cursor.execute(f'REINDEX INDEX {table}_fts')
+        yield model.objects.count()
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('delete-all')")
+    lower = model.objects.order_by('pk').values_list('pk', flat=True).first()
+    highest = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    while lower is not None and lower <= highest:
+        with transaction.atomic(), conn.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table}_fts(rowid, {", ".join(columns)}) '
+                f'SELECT id, {", ".join(columns)} FROM {table} WHERE id >= %s AND id < %s',
+                [lower, lower + batch_size],
+            )
+            indexed = cursor.rowcount
+        yield indexed
+        lower += batch_size
+
+def search_posts(query, cursor=None, limit=SEARCH_PAGE_SIZE):
+    """Return a Page of posts matching `query`, best match first.
+
+    Raises InvalidCursor if `cursor` is not a token returned by a previous page.
+    """
+    page = _search(Post, query, cursor, limit)
+    posts = Post.objects.select_related('author').in_bulk([pk for pk, _ in page.items])
+    return Page([posts[pk] for pk, _ in page.items if pk in posts], page.next_cursor)
+
+def search_users(query, cursor=None, limit=SEARCH_PAGE_SIZE):
+    page = _search(User, query, cursor, limit)
+    users = User.objects.in_bulk([pk for pk, _ in page.items])
+    return Page([users[pk] for pk, _ in page.items if pk in users], page.next_cursor)
+
+def _search(model, query, cursor, limit):
+    table = model._meta.db_table
+    after = _decode_cursor(cursor)
+    #Neither FTS5 nor PostgreSQL accepts a NUL in a query string
+    query = CONTROL_CHARACTERS.sub(' ', query)
+    if connection.vendor == 'sqlite':
+        match = _fts5_query(query)
+        if not match:
+            return Page([], None)
+        score = f'bm25({table}_fts)'
+        sql = f'SELECT rowid, {score} FROM {table}_fts WHERE {table}_fts MATCH %s'
+        params = [match]
+        id_column = 'rowid'
+    else:
+        vector = _pg_vector(table)
+        score = f"-ts_rank({vector}, plainto_tsquery('{PG_CONFIG}', %s))"
+        sql = f"SELECT id, {score} FROM {table} WHERE {vector} @@ plainto_tsquery('{PG_CONFIG}', %s)"
+        params = [query, query]
+        id_column = 'id'
+    if after is not None:
+        sql += f' AND ({score} > %s OR ({score} = %s AND {id_column} > %s))'
+        score_params = [query] if connection.vendor != 'sqlite' else []
+        params += score_params + [after[0]] + score_params + [after[0], after[1]]
+    sql += ' ORDER BY 2, 1 LIMIT %s'
+    params.append(limit + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+    if len(rows) <= limit:
+        return Page(rows, None)
+    rows = rows[:limit]
+    return Page(rows, _encode_cursor(rows[-1][1], rows[-1][0]))
+
+def _fts5_query(query):
+    #Quote every term so user input can never be parsed as FTS5 syntax
+    terms = query.split()
+    return ' '.join('"%s"' % term.replace('"', '""') for term in terms)
+
+def _pg_vector(table):
+    columns = " || ' ' || ".join(f"coalesce({column}, '')" for column in INDEXED_COLUMNS[table])
+    return f"to_tsvector('{PG_CONFIG}', {columns})"
+
+def _encode_cursor(score, pk):
+    raw = '%r|%d' % (score, pk)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_cursor(token):
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        score, pk = raw.split('|')
+        score = float(score)
+        if not math.isfinite(score):
+            raise ValueError(f'Score out of range: {score}')
+        return score, parse_id(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor('Malformed cursor')
+
+def _install_statements(vendor, table, columns):
+    if vendor == 'postgresql':
+        return [f'CREATE INDEX IF NOT EXISTS {table}_fts ON {table} USING GIN ({_pg_vector(table)})']
+    if vendor != 'sqlite':
+        return []
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    delete_old = (
+        f"INSERT INTO {table}_fts({table}_fts, rowid, {column_list}) "
+        f"VALUES ('delete', old.id, {old_values});"
+    )
+    insert_new = f'INSERT INTO {table}_fts(rowid, {column_list}) VALUES (new.id, {new_values});'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5("
+        f"{column_list}, content='{table}', content_rowid='id')",
+        f'CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN {insert_new} END',
+        f'CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN {delete_old} END',
+        f'CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {column_list} ON {table} '
+        f'BEGIN {delete_old} {insert_new} END',
+    ]
@@ -0,0 +1,144 @@
+"""Partitioning of posts by author across the POST_SHARDS databases.
+
+Every author's posts live on one shard, picked from the author id, so a
+profile page reads a single database. A feed spans many authors, so it asks
+each shard holding one of them for its newest posts in parallel and merges
+the newest-first results (scatter-gather).
+
+Post ids must stay unique across databases, as cursors and fragment cache
+keys use them, so each shard hands out ids from its own range: ids on the
+Nth shard start at N << ID_RANGE_BITS and the range of an id tells which
+database holds the post. The range is reserved by reserve_id_range, which
+runs after the shard is migrated.
+
+Only posts are sharded. Users stay on the primary and the shards hold no
+user rows, so foreign keys are not enforced on SQLite shard connections; on
+PostgreSQL the user table has to be replicated to every shard instead.
+Timelines, hashtags, mentions and the search index are tables on the primary
+referencing posts, so they are not kept for sharded posts: feeds are merged
+at read time instead of pushed. Sharding is meant for a fresh database, as
+posts written before it was enabled are not moved, and the number of shards
+is fixed once posts are written to them.
+"""
+import heapq
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections
+
+from microblogs.models import Follow, Post, User
+from microblogs.pagination import older_than
+
+ID_RANGE_BITS = 40
+
+_executor = None
+
+
+def enabled():
+    return bool(settings.POST_SHARDS)
+
+def shard_for(author_id):
+    shards = settings.POST_SHARDS
+    return shards[author_id % len(shards)]
+
+def is_sharded(post):
+    return post._state.db in settings.POST_SHARDS
+
+def database_for_post(post_id):
+    #Ids below the first range belong to posts written before sharding
+    index = post_id >> ID_RANGE_BITS
+    return settings.POST_SHARDS[index - 1] if index else 'default'
+
+def configure_shard(connection):
+    #Posts reference users that only exist on the primary
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA foreign_keys = OFF')
+
+def reserve_id_range(using):
+    """Make the post ids of shard `using` start at its range.
+
+    Does nothing once the shard has handed out ids from its range.
+    """
+    first = (settings.POST_SHARDS.index(using) + 1) << ID_RANGE_BITS
+    connection = connections[using]
+    table = Post._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MAX(id) FROM {connection.ops.quote_name(table)}')
+        highest = cursor.fetchone()[0]
+        if highest is not None and highest >= first:
+            return
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, false)", [table, first])
+        else:
+            cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s', [table])
+            cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, first - 1])
+
+def reserve_id_ranges(sender, using, **kwargs):
+    #Connected to post_migrate in apps.py
+    if sender.name == 'microblogs' and using in settings.POST_SHARDS:
+        reserve_id_range(using)
+
+def author_posts(author_id):
+    """Return a queryset of an author's posts, newest first.
+
+    Authors of sharded posts are on another database, so pass the rows
+    through attach_authors rather than following post.author one by one.
+    """
+    if not enabled():
+        return Post.objects.filter(author_id=author_id).select_related('author')
+    return Post.objects.using(shard_for(author_id)).filter(author_id=author_id)
+
+def attach_authors(posts):
+    #Reads the authors not already loaded from the primary in one query
+    missing = {post.author_id for post in posts if not Post.author.is_cached(post)}
+    authors = User.objects.in_bulk(missing)
+    for post in posts:
+        if post.author_id in authors:
+            Post.author.field.set_cached_value(post, authors[post.author_id])
+    return posts
+
+def in_bulk(post_ids):
+    #Post.objects.in_bulk across the databases holding the given posts
+    if not enabled():
+        return Post.objects.select_related('author').in_bulk(post_ids)
+    by_database = defaultdict(list)
+    for post_id in post_ids:
+        by_database[database_for_post(post_id)].append(post_id)
+    posts = {}
+    for database, ids in by_database.items():
+        posts.update(Post.objects.using(database).in_bulk(ids))
+    attach_authors(list(posts.values()))
+    return posts
+
+def get_feed(user_id, limit, before=None):
+    """Return up to `limit` posts by the user and their followees, newest first.
+
+    `before` is an optional (created_at, post_id) pair as for
+    timeline.get_feed. Each shard holding one of the authors is queried on a
+    pool of threads, so the page takes about as long as the slowest shard.
+    """
+    author_ids = [user_id, *Follow.objects.filter(follower_id=user_id).values_list('followee_id', flat=True)]
+    by_shard = defaultdict(list)
+    for author_id in author_ids:
+        by_shard[shard_for(author_id)].append(author_id)
+    queries = [(shard, ids, limit, before) for shard, ids in by_shard.items()]
+    if len(queries) == 1:
+        results = [_newest_posts(*queries[0])]
+    else:
+        results = list(_pool().map(lambda query: _newest_posts(*query), queries))
+    merged = heapq.merge(*results, key=lambda post: (post.created_at, post.pk), reverse=True)
+    return attach_authors(list(islice(merged, limit)))
+
+def _newest_posts(shard, author_ids, limit, before):
+    posts = older_than(Post.objects.using(shard).filter(author_id__in=author_ids), before)
+    return list(posts.order_by('-created_at', '-id')[:limit])
+
+def _pool():
+    #Long-lived threads, so each keeps its shard connections between feeds
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(len(settings.POST_SHARDS), thread_name_prefix='shard')
+    return _executor
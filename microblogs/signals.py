@@ -0,0 +1,76 @@
+#Signal handlers keeping derived data in step with posts and follows
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from microblogs import availability, cache, jobs, sharding, streams, tasks, timeline
+from microblogs.models import Follow, Post, User
+
+#Saving any of these fields changes how a user's posts are rendered
+RENDERED_USER_FIELDS = {'username', 'first_name', 'last_name', 'bio'}
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    using = instance._state.db
+    cache.bump_auth([instance.pk], using)
+    if created:
+        cache.bump_feeds([instance.pk], using)
+    if update_fields is None or set(availability.FIELDS).intersection(update_fields):
+        availability.user_saved(instance)
+    if update_fields is None or RENDERED_USER_FIELDS.intersection(update_fields):
+        cache.bump_users([instance.pk], using)
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    using = instance._state.db
+    cache.bump_auth([instance.pk], using)
+    cache.bump_users([instance.pk], using)
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    using = instance._state.db
+    cache.bump_posts([instance.pk], using)
+    cache.bump_authors([instance.author_id], using)
+    if raw:
+        return
+    if created:
+        User.objects.filter(pk=instance.author_id).update(posts_count=F('posts_count') + 1)
+        transaction.on_commit(lambda: streams.post_created(instance), using=using)
+    if sharding.is_sharded(instance):
+        #Timelines and the tag index are on the primary, see microblogs.sharding;
+        #the author's own feed is merged at read time and shows the post now
+        cache.bump_feeds([instance.author_id], using)
+        return
+    reindex = update_fields is None or 'text' in update_fields
+    if not (created or reindex):
+        return
+    if settings.POST_PROCESSING == 'queue':
+        #Saved in the same transaction as the post, so neither is lost alone
+        jobs.enqueue('process_post', {'post_id': instance.pk, 'created': created, 'reindex': reindex})
+    else:
+        tasks.process_post(instance, created, reindex)
+
+#Decrements stop at 0: a drifted counter is left for reconcile_counters
+#instead of failing the delete on the CHECK >= 0 of its column
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    using = instance._state.db
+    cache.bump_posts([instance.pk], using)
+    cache.bump_authors([instance.author_id], using)
+    User.objects.filter(pk=instance.author_id).update(posts_count=Greatest(F('posts_count') - 1, 0))
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        User.objects.filter(pk=instance.follower_id).update(following_count=F('following_count') + 1)
+        User.objects.filter(pk=instance.followee_id).update(followers_count=F('followers_count') + 1)
+        timeline.backfill(instance.follower_id, instance.followee_id)
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.follower_id).update(following_count=Greatest(F('following_count') - 1, 0))
+    User.objects.filter(pk=instance.followee_id).update(followers_count=Greatest(F('followers_count') - 1, 0))
+    timeline.remove_author(instance.follower_id, instance.followee_id)
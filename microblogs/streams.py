@@ -0,0 +1,354 @@
+"""Server-sent events of new posts for the followers of their authors.
+
+`app` is a plain ASGI application, mounted at STREAM_PATH by clucker.asgi
+in front of Django, which cannot stream from a coroutine before 4.2. A
+connection costs a coroutine, a bounded queue and a small task waiting for
+the disconnect; there is no thread or database connection per client, and
+one hub-wide timer sends the heartbeats, so a worker can hold many idle
+streams.
+
+Every worker has one Hub, mapping authors to the streams of their
+followers. A new post is handed to the configured backend once its
+transaction commits: LocalBackend delivers it to the hub of the writing
+worker only, PostgresBackend sends it through NOTIFY to a LISTEN thread of
+every worker. A stream follows the authors its user followed when it
+connected.
+
+Event ids are keyset cursors of microblogs.pagination. A client reconnecting
+with Last-Event-ID (or ?last_event_id=, as EventSource cannot set headers on
+its first request) is sent the posts of its feed it missed, and so is a
+stream that fell behind and had events dropped from its full queue. When
+more than CATCH_UP_LIMIT posts were missed a 'reset' event tells the client
+to reload its feed instead.
+
+Posts are published in commit order, which is not the order of their keys:
+a post created before another may commit after it. A stream therefore
+remembers the ids of the posts it sent lately rather than the newest key,
+and catches up from STREAM_CATCH_UP_OVERLAP_SECONDS before that key. After
+a reconnect the posts of that overlap are sent again, so clients drop
+posts they already show by id.
+"""
+import asyncio
+from collections import defaultdict, deque, namedtuple
+from datetime import datetime, timedelta
+import heapq
+from importlib import import_module
+import json
+import logging
+import select
+import threading
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import connections
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+
+from microblogs import api, pagination, timeline
+from microblogs.models import Follow, Post, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/feed/events'
+QUEUE_SIZE = getattr(settings, 'STREAM_QUEUE_SIZE', 100)
+HEARTBEAT_SECONDS = getattr(settings, 'STREAM_HEARTBEAT_SECONDS', 15)
+CATCH_UP_LIMIT = getattr(settings, 'STREAM_CATCH_UP_LIMIT', 200)
+#How long a post may commit after a newer one and still be caught up
+CATCH_UP_OVERLAP = timedelta(seconds=getattr(settings, 'STREAM_CATCH_UP_OVERLAP_SECONDS', 30))
+SENT_IDS_SIZE = 1000
+#Milliseconds EventSource waits before reconnecting
+RETRY_MILLISECONDS = 3000
+NOTIFY_CHANNEL = 'clucker_posts'
+
+Event = namedtuple('Event', ['key', 'data'])
+
+#Queue items other than events
+HEARTBEAT = object()
+DISCONNECT = object()
+
+
+class Subscription:
+    """The queue of one stream and the authors it follows."""
+
+    def __init__(self, author_ids, size):
+        self.author_ids = frozenset(author_ids)
+        self.queue = asyncio.Queue(size)
+        self.lagging = False
+
+    def offer(self, item):
+        #Never waits for a slow client; what does not fit is caught up later
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            if item is not HEARTBEAT:
+                self.lagging = True
+
+    def drain(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+class RecentIds:
+    """The ids of the last `size` posts a stream sent."""
+
+    def __init__(self, size):
+        self._order = deque(maxlen=size)
+        self._ids = set()
+
+    def __contains__(self, post_id):
+        return post_id in self._ids
+
+    def add(self, post_id):
+        if post_id in self._ids:
+            return
+        if len(self._order) == self._order.maxlen:
+            self._ids.discard(self._order[0])
+        self._order.append(post_id)
+        self._ids.add(post_id)
+
+
+class Hub:
+    """The subscriptions of this worker, by followed author.
+
+    Runs on the worker's event loop; publish() may be called from any thread.
+    """
+
+    def __init__(self):
+        self._by_author = defaultdict(set)
+        self._subscriptions = set()
+        self._loop = None
+        self._heartbeat = None
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def subscribe(self, author_ids):
+        subscription = Subscription(author_ids, QUEUE_SIZE)
+        self._loop = asyncio.get_running_loop()
+        for author_id in subscription.author_ids:
+            self._by_author[author_id].add(subscription)
+        self._subscriptions.add(subscription)
+        if self._heartbeat is None:
+            self._heartbeat = self._loop.create_task(self._beat())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for author_id in subscription.author_ids:
+            subscribers = self._by_author.get(author_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_author[author_id]
+        self._subscriptions.discard(subscription)
+        if not self._subscriptions and self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+
+    def publish(self, author_id, event):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self.deliver, author_id, event)
+
+    def deliver(self, author_id, event):
+        for subscription in self._by_author.get(author_id, ()):
+            subscription.offer(event)
+
+    def heartbeat(self):
+        for subscription in self._subscriptions:
+            subscription.offer(HEARTBEAT)
+
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            self.heartbeat()
+
+
+hub = Hub()
+
+
+class LocalBackend:
+    #Posts reach the streams of the worker that wrote them only
+
+    def publish(self, post):
+        #Without streams here the author need not be read for the event
+        if len(hub):
+            hub.publish(post.author_id, _event(api.post_json(api.post_row(post))))
+
+
+class PostgresBackend:
+    """Posts are sent with NOTIFY and received by a LISTEN thread per worker."""
+
+    def __init__(self):
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def publish(self, post):
+        payload = json.dumps({'author_id': post.author_id, 'post': api.post_json(api.post_row(post))})
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [NOTIFY_CHANNEL, payload])
+
+    def listen(self):
+        #Called by every stream; starts the thread of this worker once
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='clucker-listen', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        connection = connections['default']
+        listener = connection.get_new_connection(connection.get_connection_params())
+        listener.autocommit = True
+        try:
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+            while True:
+                if select.select([listener], [], [], HEARTBEAT_SECONDS) == ([], [], []):
+                    continue
+                listener.poll()
+                while listener.notifies:
+                    payload = json.loads(listener.notifies.pop(0).payload)
+                    hub.publish(payload['author_id'], _event(payload['post']))
+        except Exception:
+            logger.exception('Listening for new posts failed; the next stream restarts it')
+        finally:
+            listener.close()
+
+
+BACKENDS = {'local': LocalBackend, 'postgres': PostgresBackend}
+
+backend = BACKENDS[getattr(settings, 'STREAM_BACKEND', 'local')]()
+
+
+def post_created(post):
+    #Called by the post_save handler once the post's transaction committed
+    backend.publish(post)
+
+async def app(scope, receive, send):
+    """The ASGI application of STREAM_PATH."""
+    if scope['method'] != 'GET':
+        return await _respond(send, 405, b'{"error":"GET required"}')
+    headers = dict(scope['headers'])
+    user = await sync_to_async(_authenticate)(headers.get(b'cookie', b'').decode('latin-1'))
+    if not user.is_authenticated:
+        return await _respond(send, 401, b'{"error":"Authentication required"}')
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    last_event_id = headers.get(b'last-event-id', b'').decode('latin-1') or query.get('last_event_id', [''])[0]
+    try:
+        key = pagination.decode_cursor(last_event_id)
+    except pagination.InvalidCursor:
+        return await _respond(send, 400, b'{"error":"Invalid Last-Event-ID"}')
+    if hasattr(backend, 'listen'):
+        backend.listen()
+    author_ids = await sync_to_async(_followed_authors)(user.pk)
+    #Subscribed before catching up, so nothing posted meanwhile is missed
+    subscription = hub.subscribe(author_ids)
+    watcher = asyncio.get_running_loop().create_task(_watch_disconnect(receive, subscription))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await _send(send, b'retry: %d\n\n' % RETRY_MILLISECONDS)
+        sent = RecentIds(SENT_IDS_SIZE)
+        if key is not None:
+            #The client has the post of its last event, if not the ones before
+            sent.add(key[1])
+            key = await _catch_up(send, user.pk, key, sent)
+        while True:
+            item = await subscription.queue.get()
+            if item is DISCONNECT:
+                break
+            if subscription.lagging:
+                subscription.lagging = False
+                subscription.drain()
+                key = await _catch_up(send, user.pk, key, sent)
+            elif item is HEARTBEAT:
+                await _send(send, b': ping\n\n')
+            elif item.key[1] not in sent:
+                await _send(send, _format(item))
+                sent.add(item.key[1])
+                key = item.key if key is None else max(key, item.key)
+    finally:
+        hub.unsubscribe(subscription)
+        watcher.cancel()
+
+def newer_posts(user_id, after, limit=CATCH_UP_LIMIT):
+    """Return rows of up to `limit` + 1 posts of a feed newer than `after`, oldest first.
+
+    Like timeline.get_feed, reads the pushed timeline and the authors merged
+    at read time; posts already moved to the archive are not returned.
+    """
+    pushed = pagination.newer_than(TimelineEntry.objects.filter(owner_id=user_id), after, 'post_id')
+    sources = [list(pushed.order_by('created_at', 'post_id').values_list('created_at', 'post_id')[:limit + 1])]
+    celebrities = list(timeline.celebrity_followees(user_id))
+    if celebrities:
+        pulled = pagination.newer_than(Post.objects.filter(author_id__in=celebrities), after)
+        sources.append(list(pulled.order_by('created_at', 'id').values_list('created_at', 'id')[:limit + 1]))
+    post_ids = []
+    seen = set()
+    for _, post_id in heapq.merge(*sources):
+        if post_id not in seen:
+            seen.add(post_id)
+            post_ids.append(post_id)
+    return api.post_rows(post_ids[:limit + 1])
+
+async def _catch_up(send, user_id, key, sent):
+    #Send what was posted after `key`, less the overlap, and not yet sent;
+    #returns the newest key sent
+    if key is None:
+        await _send(send, b'event: reset\ndata: {}\n\n')
+        return None
+    rows = await sync_to_async(newer_posts)(user_id, (key[0] - CATCH_UP_OVERLAP, 0))
+    if len(rows) > CATCH_UP_LIMIT:
+        await _send(send, b'event: reset\ndata: {}\n\n')
+        return None
+    for row in rows:
+        event = _event(api.post_json(row))
+        if event.key[1] in sent:
+            continue
+        await _send(send, _format(event))
+        sent.add(event.key[1])
+        key = max(key, event.key)
+    return key
+
+async def _watch_disconnect(receive, subscription):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+    subscription.drain()
+    subscription.queue.put_nowait(DISCONNECT)
+
+def _authenticate(cookie_header):
+    request = HttpRequest()
+    session_key = parse_cookie(cookie_header).get(settings.SESSION_COOKIE_NAME)
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    return get_user(request)
+
+def _followed_authors(user_id):
+    return [user_id, *Follow.objects.filter(follower_id=user_id).values_list('followee_id', flat=True)]
+
+def _event(data):
+    key = (datetime.fromisoformat(data['created_at']), data['id'])
+    return Event(key, api.encode(data))
+
+def _format(event):
+    cursor = pagination.encode_cursor(*event.key).encode()
+    return b'id: %s\nevent: post\ndata: %s\n\n' % (cursor, event.data)
+
+async def _send(send, body):
+    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+async def _respond(send, status, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': body})
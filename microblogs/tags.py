@@ -0,0 +1,109 @@
+"""Hashtag and mention extraction.
+
+Posts are parsed when they are written and every #hashtag and @username
+they contain is stored in an indexed link table, so tag timelines and
+mention feeds are keyset range scans instead of scans of every post text.
+"""
+import re
+
+from django.db import transaction
+
+from microblogs import trending
+from microblogs.models import Hashtag, Mention, Post, PostHashtag, User
+from microblogs.pagination import decode_cursor, make_page, older_than
+
+HASHTAG_RE = re.compile(r'(?<![\w#])#(\w{1,100})')
+#Mirrors the username validator on User: @ followed by at least three \w
+MENTION_RE = re.compile(r'(?<![\w@])(@\w{3,})')
+BATCH_SIZE = 1000
+
+
+def extract_hashtags(text):
+    return {name.lower() for name in HASHTAG_RE.findall(text)}
+
+def extract_mentions(text):
+    return set(MENTION_RE.findall(text))
+
+def index_posts(posts, replace=False):
+    """Store the hashtags and mentions of saved posts.
+
+    Works on any number of posts with a fixed number of queries, so bulk
+    paths can call it once per batch. With replace=True, links stored for
+    earlier versions of the posts are removed first and the posts are not
+    counted again towards trending hashtags; without it, only links that
+    were not stored yet are counted, so indexing a post twice is harmless.
+    """
+    posts = list(posts)
+    if not posts:
+        return
+    with transaction.atomic():
+        if replace:
+            post_ids = [post.pk for post in posts]
+            PostHashtag.objects.filter(post_id__in=post_ids).delete()
+            Mention.objects.filter(post_id__in=post_ids).delete()
+        hashtags = {post.pk: extract_hashtags(post.text) for post in posts}
+        mentions = {post.pk: extract_mentions(post.text) for post in posts}
+        tag_ids = _hashtag_ids(set().union(*hashtags.values()))
+        if not replace:
+            #Only links not stored yet are counted, so indexing a post again
+            #(a retried job) does not count its hashtags twice
+            stored = set(
+                PostHashtag.objects
+                .filter(post_id__in=[post.pk for post in posts])
+                .values_list('post_id', 'hashtag_id')
+            )
+            uses = [
+                (tag_ids[name], post.created_at)
+                for post in posts for name in hashtags[post.pk] if (post.pk, tag_ids[name]) not in stored
+            ]
+            #Counted once the posts commit, so the shared bucket rows of popular
+            #hashtags are not locked for the rest of the writing transaction
+            transaction.on_commit(lambda: trending.record(uses))
+        user_ids = dict(
+            User.objects
+            .filter(username__in=set().union(*mentions.values()))
+            .values_list('username', 'pk')
+        )
+        PostHashtag.objects.bulk_create(
+            [
+                PostHashtag(post_id=post.pk, hashtag_id=tag_ids[name], created_at=post.created_at)
+                for post in posts for name in hashtags[post.pk]
+            ],
+            batch_size = BATCH_SIZE,
+            ignore_conflicts = True,
+        )
+        Mention.objects.bulk_create(
+            [
+                Mention(post_id=post.pk, user_id=user_ids[username], created_at=post.created_at)
+                for post in posts for username in mentions[post.pk] if username in user_ids
+            ],
+            batch_size = BATCH_SIZE,
+            ignore_conflicts = True,
+        )
+
+def _hashtag_ids(names):
+    if not names:
+        return {}
+    Hashtag.objects.bulk_create(
+        [Hashtag(name=name) for name in names],
+        batch_size = BATCH_SIZE,
+        ignore_conflicts = True,
+    )
+    return dict(Hashtag.objects.filter(name__in=names).values_list('name', 'pk'))
+
+def hashtag_page(name, cursor=None, limit=50):
+    #Raises pagination.InvalidCursor for a malformed cursor
+    links = PostHashtag.objects.filter(hashtag__name=name.lower())
+    return _post_page(links, cursor, limit)
+
+def mentions_page(user, cursor=None, limit=50):
+    #Raises pagination.InvalidCursor for a malformed cursor
+    return _post_page(Mention.objects.filter(user=user), cursor, limit)
+
+def _post_page(links, cursor, limit):
+    links = older_than(links, decode_cursor(cursor), 'post_id')
+    post_ids = list(
+        links.order_by('-created_at', '-post_id').values_list('post_id', flat=True)[:limit + 1]
+    )
+    posts = Post.objects.select_related('author').in_bulk(post_ids)
+    return make_page([posts[pk] for pk in post_ids if pk in posts], limit)
@@ -0,0 +1,23 @@
+"""Work done after a post is saved, inline or as a queued job.
+
+With POST_PROCESSING set to 'queue', saving a post only records a job and
+the runworker command does the fan-out and hashtag and mention indexing,
+so the request that saved the post returns straight away.
+"""
+from microblogs import jobs, tags, timeline
+from microblogs.models import Post
+
+
+def process_post(post, created, reindex):
+    if reindex:
+        tags.index_posts([post], replace=not created)
+    if created:
+        timeline.fan_out(post)
+
+@jobs.handler('process_post')
+def process_post_job(payload):
+    post = Post.objects.filter(pk=payload['post_id']).first()
+    if post is None:
+        #Deleted before the job ran, along with everything derived from it
+        return
+    process_post(post, payload['created'], payload['reindex'])
@@ -0,0 +1,34 @@
+#Template filters for rendering posts
+import re
+from datetime import datetime
+from functools import lru_cache
+
+from django import template
+from django.utils import dateformat, formats, translation
+
+register = template.Library()
+
+#Format characters whose output changes within a minute or with the timezone
+_SUB_MINUTE_OR_ZONE = re.compile(r'[suvBeIOTZUcr]')
+
+
+@register.filter(expects_localtime=True)
+def timestamp(value):
+    """Render a datetime exactly as {{ value }} does, cached per minute.
+
+    Localized formatting looks up translated month names and a.m./p.m. on
+    every call and costs more than the rest of a post's template; with a
+    format of minute resolution the text only changes once a minute.
+    """
+    if not isinstance(value, datetime):
+        return formats.localize(value)
+    format = formats.get_format('DATETIME_FORMAT')
+    if _SUB_MINUTE_OR_ZONE.search(format):
+        return formats.localize(value)
+    minute = value.replace(second=0, microsecond=0, tzinfo=None)
+    return _format_minute(translation.get_language(), format, minute)
+
+@lru_cache(maxsize=4096)
+def _format_minute(language, format, minute):
+    #The language is only part of the key; the active one does the formatting
+    return dateformat.format(minute, format)
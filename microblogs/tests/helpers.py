@@ -0,0 +1,13 @@
+"""Helpers shared by the tests of the microblogs app."""
+from microblogs.models import User
+
+
+def create_user(username, **fields):
+    """Create a user named `username`, with an email address derived from it."""
+    defaults = {
+        'first_name': 'Test',
+        'last_name': 'User',
+        'email': f'{username[1:]}@example.org',
+        'password': 'Password123',
+    }
+    return User.objects.create_user(username=username, **{**defaults, **fields})
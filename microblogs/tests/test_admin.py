@@ -0,0 +1,113 @@
+"""Tests of the admin changelists."""
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+from django.db import connection
+from django.db.models import Count, Max, Min
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from microblogs import admin as microblogs_admin
+from microblogs.admin import EstimatedCountPaginator, ProbedDatesQuerySet
+from microblogs.db import analyze, estimated_count
+from microblogs.models import Post, User
+
+
+class AdminTestCase(TestCase):
+    """Tests of the admin changelists."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username = '@admin',
+            first_name = 'Ada',
+            last_name = 'Admin',
+            email = 'admin@apples.org',
+            password = 'Password123',
+        )
+        self.client.force_login(self.admin)
+
+    def _create_posts(self, count):
+        for i in range(count):
+            author = User.objects.create(
+                username = f'@author{User.objects.count()}',
+                first_name = 'Author',
+                last_name = str(i),
+                email = f'author{User.objects.count()}@apples.org',
+            )
+            Post.objects.create(author=author, text=f'post {i}')
+
+    def _changelist_queries(self, model):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:microblogs_{model}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_post_changelist_does_not_query_per_row(self):
+        self._create_posts(2)
+        #The first request also loads the logged in user into the auth cache
+        self._changelist_queries('post')
+        few = self._changelist_queries('post')
+        self._create_posts(10)
+        self.assertEqual(self._changelist_queries('post'), few)
+
+    def test_user_changelist_filters_on_is_active(self):
+        response = self.client.get(reverse('admin:microblogs_user_changelist'), {'is_active__exact': '1'})
+        self.assertContains(response, '@admin')
+
+    def test_estimated_count_reads_statistics(self):
+        self._create_posts(3)
+        analyze([Post])
+        self.assertEqual(estimated_count(Post), 3)
+
+    def test_paginator_uses_the_estimate_for_large_tables(self):
+        self._create_posts(3)
+        analyze([Post])
+        self._create_posts(2)
+        with mock.patch.object(microblogs_admin, 'EXACT_COUNT_THRESHOLD', 1):
+            self.assertEqual(EstimatedCountPaginator(Post.objects.all(), 10).count, 3)
+        self.assertEqual(EstimatedCountPaginator(Post.objects.all(), 10).count, 5)
+
+    def test_paginator_caps_filtered_counts(self):
+        self._create_posts(5)
+        with mock.patch.object(microblogs_admin, 'FILTERED_COUNT_LIMIT', 3):
+            paginator = EstimatedCountPaginator(Post.objects.filter(text__startswith='post'), 10)
+            self.assertEqual(paginator.count, 3)
+
+    def test_probed_datetimes_match_truncated_datetimes(self):
+        self._create_posts(4)
+        moments = [
+            datetime(2020, 1, 31, 23, 30, tzinfo=dt_timezone.utc),
+            datetime(2020, 3, 1, tzinfo=dt_timezone.utc),
+            datetime(2020, 3, 15, tzinfo=dt_timezone.utc),
+            datetime(2022, 12, 31, 12, tzinfo=dt_timezone.utc),
+        ]
+        for post, moment in zip(Post.objects.order_by('pk'), moments):
+            Post.objects.filter(pk=post.pk).update(created_at=moment)
+        probed = ProbedDatesQuerySet(model=Post, query=Post.objects.all().query)
+        for kind in ('year', 'month', 'day'):
+            self.assertEqual(
+                probed.datetimes('created_at', kind),
+                list(Post.objects.datetimes('created_at', kind)),
+            )
+        self.assertEqual(
+            probed.datetimes('created_at', 'year', 'DESC'),
+            list(Post.objects.datetimes('created_at', 'year', 'DESC')),
+        )
+
+    def test_probed_bounds_match_aggregate(self):
+        self._create_posts(3)
+        probed = ProbedDatesQuerySet(model=Post, query=Post.objects.all().query)
+        bounds = {'first': Min('created_at'), 'last': Max('created_at')}
+        self.assertEqual(probed.aggregate(**bounds), Post.objects.aggregate(**bounds))
+        self.assertEqual(probed.filter(pk=0).aggregate(**bounds), {'first': None, 'last': None})
+        self.assertEqual(probed.aggregate(total=Count('pk')), {'total': 3})
+
+    def test_date_hierarchy_drills_down(self):
+        self._create_posts(1)
+        post = Post.objects.get()
+        response = self.client.get(
+            reverse('admin:microblogs_post_changelist'),
+            {'created_at__year': post.created_at.year},
+        )
+        self.assertContains(response, 'post 0')
@@ -0,0 +1,134 @@
+"""Tests of the compact JSON API and its conditional GETs."""
+from django.core.cache import cache as shared_cache
+from django.test import TestCase
+from django.urls import reverse
+
+from microblogs import api, archive, backends
+from microblogs.cache import fragment_cache
+from microblogs.models import ArchivedPost, Follow, Post
+from microblogs.tests.helpers import create_user
+
+
+class ApiTestCase(TestCase):
+    """Tests of the compact JSON API and its conditional GETs."""
+
+    def setUp(self):
+        shared_cache.clear()
+        fragment_cache.local.clear()
+        backends.clear()
+        self.george = create_user('@george')
+        self.logan = create_user('@logan')
+        Follow.objects.create(follower=self.logan, followee=self.george)
+        self.posts = [Post.objects.create(author=self.george, text=f'cluck {i} #news') for i in range(3)]
+        self.client.force_login(self.logan)
+        self.feed_url = reverse('feed_json')
+        self.author_url = reverse('user_posts_json', kwargs={'user_id': self.george.pk})
+
+    def _revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_feed_pages_carry_validators(self):
+        response = self.client.get(self.feed_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [post['text'] for post in response.json()['posts']],
+            ['cluck 2 #news', 'cluck 1 #news', 'cluck 0 #news'],
+        )
+        self.assertTrue(response['ETag'])
+        self.assertTrue(response['Last-Modified'])
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_unchanged_feed_polls_are_not_modified_without_queries(self):
+        response = self.client.get(self.feed_url)
+        with self.assertNumQueries(0):
+            again = self._revalidate(self.feed_url, response)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+        self.assertEqual(again.content, b'')
+
+    def test_new_posts_change_the_feed(self):
+        response = self.client.get(self.feed_url)
+        Post.objects.create(author=self.george, text='news')
+        again = self._revalidate(self.feed_url, response)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['posts'][0]['text'], 'news')
+
+    def test_edited_posts_change_the_feed(self):
+        response = self.client.get(self.feed_url)
+        self.posts[0].text = 'edited'
+        self.posts[0].save()
+        again = self._revalidate(self.feed_url, response)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['posts'][-1]['text'], 'edited')
+
+    def test_renamed_authors_change_the_feed(self):
+        response = self.client.get(self.feed_url)
+        self.george.username = '@georgie'
+        self.george.save()
+        again = self._revalidate(self.feed_url, response)
+        self.assertEqual(again.json()['posts'][0]['author'], '@georgie')
+
+    def test_if_modified_since_alone_does_not_validate(self):
+        response = self.client.get(self.feed_url)
+        self.posts[0].text = 'edited'
+        self.posts[0].save()
+        again = self.client.get(self.feed_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['posts'][-1]['text'], 'edited')
+        self.assertEqual(again['Last-Modified'], response['Last-Modified'])
+
+    def test_not_modified_responses_carry_last_modified(self):
+        response = self.client.get(self.feed_url)
+        again = self._revalidate(self.feed_url, response)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['Last-Modified'], response['Last-Modified'])
+
+    def test_fields_can_be_selected(self):
+        response = self.client.get(self.feed_url, {'fields': 'text,id'})
+        self.assertEqual(response.json()['posts'][0], {'id': self.posts[2].pk, 'text': 'cluck 2 #news'})
+        full = self.client.get(self.feed_url)
+        self.assertNotEqual(response['ETag'], full['ETag'])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(self.feed_url, {'fields': 'text,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Unknown fields: password'})
+
+    def test_unchanged_author_polls_are_not_modified_without_queries(self):
+        response = self.client.get(self.author_url)
+        self.assertEqual(len(response.json()['posts']), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._revalidate(self.author_url, response).status_code, 304)
+        self.posts[0].delete()
+        again = self._revalidate(self.author_url, response)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(len(again.json()['posts']), 2)
+
+    def test_missing_authors_are_not_found(self):
+        response = self.client.get(reverse('user_posts_json', kwargs={'user_id': 0}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_hashtag_polls_are_not_modified_after_one_query(self):
+        url = reverse('hashtag_json', kwargs={'name': 'News'})
+        response = self.client.get(url)
+        self.assertEqual(len(response.json()['posts']), 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(self._revalidate(url, response).status_code, 304)
+
+    def test_bodies_are_shared_between_clients(self):
+        self.client.get(self.author_url)
+        self.client.logout()
+        with self.assertNumQueries(0):
+            response = self.client.get(self.author_url)
+        self.assertEqual(len(response.json()['posts']), 3)
+
+    def test_archived_posts_are_read_from_the_archive(self):
+        post = self.posts[0]
+        ArchivedPost.objects.create(
+            id = post.pk + 1000,
+            author = self.george,
+            compressed_text = archive.compress('archived cluck'),
+            created_at = post.created_at,
+        )
+        rows = api.post_rows([self.posts[1].pk, post.pk + 1000, 0])
+        self.assertEqual([row[2] for row in rows], ['cluck 1 #news', 'archived cluck'])
@@ -0,0 +1,122 @@
+"""Tests of the archival of cold posts."""
+from datetime import timedelta
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from microblogs import archive, pagination, timeline
+from microblogs.models import ArchivedPost, Follow, Post, PostHashtag, TimelineEntry
+from microblogs.tests.helpers import create_user
+
+
+class ArchiveTestCase(TestCase):
+    """Tests of the archival of cold posts."""
+
+    def setUp(self):
+        self.george = create_user('@george')
+        self.logan = create_user('@logan')
+        Follow.objects.create(follower=self.logan, followee=self.george)
+        #Four old posts, then three recent ones, oldest first
+        self.old = [self._post(f'old {n} #history', days_ago=400 - n) for n in range(4)]
+        self.recent = [self._post(f'recent {n}') for n in range(3)]
+
+    def _post(self, text, days_ago=0):
+        post = Post.objects.create(author=self.george, text=text)
+        if days_ago:
+            created_at = timezone.now() - timedelta(days=days_ago)
+            Post.objects.filter(pk=post.pk).update(created_at=created_at)
+            TimelineEntry.objects.filter(post=post).update(created_at=created_at)
+            post.refresh_from_db()
+        return post
+
+    def _archive(self):
+        return archive.archive_batch(archive.cutoff(365))
+
+    def test_old_posts_are_moved_to_the_archive(self):
+        self.assertEqual(self._archive(), 4)
+        self.assertEqual(list(Post.objects.all()), self.recent[::-1])
+        archived = ArchivedPost.objects.get(pk=self.old[0].pk)
+        self.assertEqual(archived.text, self.old[0].text)
+        self.assertEqual(archived.created_at, self.old[0].created_at)
+        self.assertEqual(archived.author, self.george)
+
+    def test_derived_rows_are_removed_but_counts_kept(self):
+        self._archive()
+        self.assertFalse(TimelineEntry.objects.filter(post_id__in=[post.pk for post in self.old]).exists())
+        self.assertFalse(PostHashtag.objects.exists())
+        self.george.refresh_from_db()
+        self.assertEqual(self.george.posts_count, 7)
+
+    def test_archiving_respects_the_batch_size(self):
+        self.assertEqual(archive.archive_batch(archive.cutoff(365), batch_size=3), 3)
+        self.assertEqual(list(ArchivedPost.objects.order_by('created_at').values_list('pk', flat=True)), [
+            post.pk for post in self.old[:3]
+        ])
+        self.assertEqual(self._archive(), 1)
+        self.assertEqual(self._archive(), 0)
+
+    def test_archived_text_is_compressed(self):
+        text = 'cluck ' * 40
+        self.assertLess(len(archive.compress(text)), len(text))
+
+    def test_profile_pages_continue_into_the_archive(self):
+        self._archive()
+        first = archive.author_page(self.george.pk, limit=2)
+        self.assertEqual(first.items, self.recent[:0:-1])
+        second = archive.author_page(self.george.pk, first.next_cursor, limit=2)
+        self.assertEqual([post.pk for post in second.items], [self.recent[0].pk, self.old[3].pk])
+        self.assertEqual(second.items[1].author, self.george)
+        third = archive.author_page(self.george.pk, second.next_cursor, limit=3)
+        self.assertEqual([post.pk for post in third.items], [post.pk for post in self.old[2::-1]])
+        self.assertIsNone(third.next_cursor)
+
+    def test_recent_profile_pages_do_not_read_the_archive(self):
+        self._archive()
+        with self.assertNumQueries(1):
+            archive.author_page(self.george.pk, limit=2)
+
+    def test_feed_continues_into_the_archive(self):
+        self._archive()
+        feed = timeline.get_feed(self.logan, limit=5)
+        self.assertEqual([post.pk for post in feed], [post.pk for post in (self.old[2:] + self.recent)[::-1]])
+
+    def test_feed_goes_on_with_posts_trimmed_off_the_timeline(self):
+        self._archive()
+        timeline.trim(self.logan.pk, length=2)
+        feed = timeline.get_feed(self.logan, limit=5)
+        self.assertEqual([post.pk for post in feed], [post.pk for post in (self.old[2:] + self.recent)[::-1]])
+
+    def test_async_feed_goes_on_with_posts_trimmed_off_the_timeline(self):
+        self._archive()
+        timeline.trim(self.logan.pk, length=1)
+        feed = async_to_sync(timeline.aget_feed)(self.logan.pk, limit=4)
+        self.assertEqual([post.pk for post in feed], [post.pk for post in (self.old[3:] + self.recent)[::-1]])
+
+    def test_recent_feed_pages_past_the_timeline_do_not_read_the_archive(self):
+        timeline.trim(self.logan.pk, length=1)
+        with self.assertNumQueries(5):
+            feed = timeline.get_feed(self.logan, limit=3)
+        self.assertEqual(feed, self.recent[::-1])
+
+    def test_profile_view_shows_archived_posts(self):
+        self._archive()
+        cursor = pagination.encode_cursor(self.recent[0].created_at, self.recent[0].pk)
+        response = self.client.get(reverse('profile', args=[self.george.pk]), {'cursor': cursor})
+        self.assertContains(response, 'old 3')
+        self.assertNotContains(response, 'recent 0')
+
+    def test_command_archives_every_old_post(self):
+        output = StringIO()
+        call_command('archive_posts', days=365, batch_size=2, stdout=output)
+        self.assertIn('Archived 4 posts', output.getvalue())
+        self.assertEqual(ArchivedPost.objects.count(), 4)
+        self.assertEqual(Post.objects.count(), 3)
+
+    def test_deleting_a_user_deletes_their_archived_posts(self):
+        self._archive()
+        self.george.delete()
+        self.assertFalse(ArchivedPost.objects.exists())
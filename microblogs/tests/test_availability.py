@@ -0,0 +1,111 @@
+"""Tests of the username and email availability checks."""
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from microblogs import availability, ratelimit
+from microblogs.tests.helpers import create_user
+
+
+class AvailabilityTestCase(TestCase):
+    """Tests of the username and email availability checks."""
+
+    def setUp(self):
+        availability.reset()
+        self.addCleanup(availability.reset)
+        cache.clear()
+        self.url = reverse('availability_json')
+        self.john = create_user('@johndoe')
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = availability.BloomFilter(1000)
+        values = [f'@user{n}' for n in range(1000)]
+        for value in values:
+            bloom.add(value)
+        self.assertTrue(all(value in bloom for value in values))
+
+    def test_bloom_filter_false_positives_stay_near_the_error_rate(self):
+        bloom = availability.BloomFilter(1000, error_rate=0.01)
+        for n in range(1000):
+            bloom.add(f'@user{n}')
+        false_positives = sum(f'@other{n}' in bloom for n in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_free_names_are_answered_without_queries(self):
+        self.client.get(self.url, {'username': '@warmup'})
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'username': '@janedoe', 'email': 'janedoe@example.org'})
+        self.assertEqual(response.json(), {
+            'username': {'value': '@janedoe', 'available': True},
+            'email': {'value': 'janedoe@example.org', 'available': True},
+        })
+
+    def test_taken_names_are_confirmed_by_the_database(self):
+        response = self.client.get(self.url, {'username': '@johndoe', 'email': 'johndoe@EXAMPLE.org'})
+        self.assertEqual(response.json(), {
+            'username': {'value': '@johndoe', 'available': False},
+            'email': {'value': 'johndoe@example.org', 'available': False},
+        })
+
+    def test_probable_hits_that_are_free_are_available(self):
+        availability.check('username', '@warmup')
+        with mock.patch.object(availability.BloomFilter, '__contains__', return_value=True):
+            with self.assertNumQueries(1):
+                self.assertTrue(availability.check('username', '@janedoe')['available'])
+
+    def test_new_users_are_added_to_the_filter(self):
+        availability.check('username', '@warmup')
+        create_user('@janedoe')
+        self.assertFalse(availability.check('username', '@janedoe')['available'])
+
+    def test_renamed_users_are_added_to_the_filter(self):
+        availability.check('username', '@warmup')
+        self.john.username = '@johnny'
+        self.john.save(update_fields=['username'])
+        self.assertFalse(availability.check('username', '@johnny')['available'])
+
+    def test_stale_filters_are_served_while_another_thread_rebuilds_them(self):
+        availability.check('username', '@warmup')
+        filters = availability._filters.filters
+        availability._filters.built_at -= availability.MAX_AGE + 1
+        availability._filters.pending = []
+        with self.assertNumQueries(0):
+            self.assertIs(availability._filters.get(), filters)
+            self.assertTrue(availability.check('username', '@janedoe')['available'])
+
+    def test_checks_query_until_the_first_filters_are_built(self):
+        availability._filters.pending = []
+        with self.assertNumQueries(1):
+            self.assertTrue(availability.check('username', '@janedoe')['available'])
+
+    def test_users_saved_during_a_rebuild_are_in_the_new_filters(self):
+        build = availability._build
+
+        def build_while_saving():
+            filters = build()
+            create_user('@janedoe')
+            return filters
+        with mock.patch.object(availability, '_build', side_effect=build_while_saving):
+            availability._filters.get()
+        self.assertIn('@janedoe', availability._filters.filters['username'])
+
+    def test_invalid_usernames_are_not_available(self):
+        result = availability.check('username', 'nobody')
+        self.assertFalse(result['available'])
+        self.assertIn('Username must consist of @ followed by at least three alphanumericals', result['errors'])
+
+    def test_a_field_is_required(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 400)
+
+    def test_checks_are_rate_limited(self):
+        ratelimit.reset()
+        self.addCleanup(ratelimit.reset)
+        with mock.patch.object(ratelimit, 'ENABLED', True), mock.patch.dict(ratelimit.LIMITS, {'availability': (2, 60)}):
+            for _ in range(2):
+                self.assertEqual(self.client.get(self.url, {'username': '@janedoe'}).status_code, 200)
+            response = self.client.get(self.url, {'username': '@janedoe'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
@@ -0,0 +1,92 @@
+"""Tests of the cached authentication backend."""
+import threading
+from unittest import mock
+
+from django.contrib.auth.backends import ModelBackend
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from microblogs import backends
+from microblogs.backends import CachedModelBackend
+from microblogs.models import User
+
+
+class CachedModelBackendTestCase(TestCase):
+    """Tests of the cached authentication backend."""
+
+    def setUp(self):
+        backends.clear()
+        self.backend = CachedModelBackend()
+        self.john = User.objects.create_user(
+            username = '@johndoe',
+            first_name = 'John',
+            last_name = 'Doe',
+            email = 'johndoe@example.org',
+            password = 'Password123',
+        )
+
+    def test_users_are_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.backend.get_user(self.john.pk)
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.john.pk)
+        self.assertEqual(user, self.john)
+        self.assertEqual(user.username, '@johndoe')
+
+    def test_every_call_gets_its_own_instance(self):
+        self.backend.get_user(self.john.pk)
+        first = self.backend.get_user(self.john.pk)
+        first.first_name = 'Changed'
+        self.assertEqual(self.backend.get_user(self.john.pk).first_name, 'John')
+
+    def test_saving_a_user_reloads_them(self):
+        self.backend.get_user(self.john.pk)
+        self.john.first_name = 'Johnny'
+        self.john.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.backend.get_user(self.john.pk).first_name, 'Johnny')
+
+    def test_deactivated_users_are_not_returned(self):
+        self.backend.get_user(self.john.pk)
+        self.john.is_active = False
+        self.john.save()
+        self.assertIsNone(self.backend.get_user(self.john.pk))
+
+    def test_users_read_before_a_save_commits_are_not_kept(self):
+        stale = User.objects.get(pk=self.john.pk)
+        read = []
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.john.is_active = False
+                self.john.save()
+                #Until the commit another connection still reads the old row
+                with mock.patch.object(ModelBackend, 'get_user', return_value=stale):
+                    reader = threading.Thread(target=lambda: read.append(self.backend.get_user(self.john.pk)))
+                    reader.start()
+                    reader.join()
+        self.assertTrue(read[0].is_active)
+        self.assertIsNone(self.backend.get_user(self.john.pk))
+
+    def test_missing_users_are_not_returned(self):
+        self.assertIsNone(self.backend.get_user(0))
+
+    def test_warm_requests_do_not_query_for_auth(self):
+        self.client.force_login(self.john)
+        self.client.get(reverse('cache_stats'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('cache_stats'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_pages_not_using_the_user_do_not_load_it(self):
+        self.client.force_login(self.john)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('home'))
+
+    def test_password_change_ends_other_sessions(self):
+        self.client.force_login(self.john)
+        self.client.get(reverse('feed'))
+        self.john.set_password('NewPassword123')
+        self.john.save()
+        response = self.client.get(reverse('feed_json'))
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,88 @@
+"""Tests of the request benchmark and its helpers."""
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TransactionTestCase
+
+from microblogs import ratelimit
+from microblogs.management.commands import bench_requests
+from microblogs.models import HashtagBucket, Post, User
+
+
+class BenchRequestsTestCase(SimpleTestCase):
+    """Tests of the request benchmark helpers."""
+
+    def test_percentiles_use_nearest_rank(self):
+        ordered = [i / 100 for i in range(1, 101)]
+        self.assertEqual(bench_requests._percentile(ordered, 50), 0.5)
+        self.assertEqual(bench_requests._percentile(ordered, 99), 0.99)
+        self.assertEqual(bench_requests._percentile([0.2], 95), 0.2)
+        self.assertEqual(bench_requests._percentile([], 95), 0)
+
+    def test_summary(self):
+        summary = bench_requests._summary([0.003, 0.001, 0.002], 1, 0.5)
+        self.assertEqual(summary['requests'], 3)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['throughput_rps'], 6.0)
+        self.assertEqual(summary['p50_ms'], 2.0)
+        self.assertEqual(summary['p99_ms'], 3.0)
+
+    def _compare(self, before, after, **options):
+        command = bench_requests.Command(stdout=StringIO())
+        handle, path = tempfile.mkstemp(suffix='.json')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'w') as baseline:
+            json.dump({'scenarios': {'feed': before}}, baseline)
+        command.options = {'compare': path, 'threshold': 0.2, 'fail_on_regression': False, **options}
+        command._compare({'scenarios': {'feed': after}})
+        return command.stdout._out.getvalue()
+
+    def test_compare_reports_regressions(self):
+        before = {'p95_ms': 10.0, 'throughput_rps': 100.0}
+        self.assertNotIn('REGRESSION', self._compare(before, {'p95_ms': 11.0, 'throughput_rps': 95.0}))
+        self.assertIn('REGRESSION', self._compare(before, {'p95_ms': 15.0, 'throughput_rps': 100.0}))
+        self.assertIn('REGRESSION', self._compare(before, {'p95_ms': 10.0, 'throughput_rps': 50.0}))
+
+    def test_compare_can_fail_on_regression(self):
+        with self.assertRaises(CommandError):
+            self._compare(
+                {'p95_ms': 10.0, 'throughput_rps': 100.0},
+                {'p95_ms': 20.0, 'throughput_rps': 100.0},
+                fail_on_regression = True,
+            )
+
+    def test_usernames_are_unique_across_threads(self):
+        command = bench_requests.Command()
+        command.bench_ids = itertools.count()
+        with ThreadPoolExecutor(8) as executor:
+            usernames = list(executor.map(lambda i: command._username(), range(2000)))
+        self.assertEqual(len(set(usernames)), 2000)
+
+
+class BenchRequestsRunTestCase(TransactionTestCase):
+    """Tests of a full run of the request benchmark."""
+
+    def test_writes_are_measured_with_the_limits_configured(self):
+        #All clients share one address and user, which the limits would refuse.
+        #One client only: the in-memory test database locks tables across threads
+        self.addCleanup(ratelimit.reset)
+        output = StringIO()
+        with mock.patch.object(ratelimit, 'ENABLED', True):
+            call_command(
+                'bench_requests', requests=40, warmup=4, concurrency=1,
+                scenarios=['home', 'sign_up', 'new_post'], stdout=output,
+            )
+        lines = output.getvalue().splitlines()
+        self.assertEqual([line.split(':')[0] for line in lines[-3:]], ['home', 'sign_up', 'new_post'])
+        for line in lines[-3:]:
+            self.assertIn('40 requests, 0 errors', line)
+        self.assertFalse(User.objects.filter(username__startswith=bench_requests.BENCH_PREFIX).exists())
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(HashtagBucket.objects.exists())
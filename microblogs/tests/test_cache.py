@@ -0,0 +1,103 @@
+"""Tests of the feed fragment cache."""
+from django.core.cache import cache as shared_cache
+from django.test import TestCase
+from django.urls import reverse
+
+from microblogs import fragments
+from microblogs.cache import LRUCache, fragment_cache
+from microblogs.models import Follow, Post, User
+
+
+class LRUCacheTestCase(TestCase):
+    """Tests of the local LRU cache."""
+
+    def test_least_recently_used_key_is_evicted(self):
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+        self.assertEqual(len(lru), 2)
+
+
+class FragmentCacheTestCase(TestCase):
+    """Tests of the feed fragment cache."""
+
+    def setUp(self):
+        shared_cache.clear()
+        fragment_cache.local.clear()
+        self.george = User.objects.create(
+            username = '@george',
+            first_name = 'George',
+            last_name = 'Lemons',
+            email = 'georgelemons@apples.org',
+        )
+        self.logan = User.objects.create(
+            username = '@logan',
+            first_name = 'Logan',
+            last_name = 'Grapes',
+            email = 'logangrapes@lemonade.org',
+        )
+        Follow.objects.create(follower=self.logan, followee=self.george)
+        self.post = Post.objects.create(author=self.george, text='first cluck')
+
+    def test_warm_feed_runs_no_post_queries(self):
+        fragments.feed_fragments(self.logan)
+        with self.assertNumQueries(0):
+            posts, next_cursor = fragments.feed_fragments(self.logan)
+        self.assertEqual(len(posts), 1)
+        self.assertIn('first cluck', posts[0])
+        self.assertIsNone(next_cursor)
+
+    def test_new_post_invalidates_feed_page(self):
+        fragments.feed_fragments(self.logan)
+        Post.objects.create(author=self.george, text='second cluck')
+        posts, _ = fragments.feed_fragments(self.logan)
+        self.assertEqual(len(posts), 2)
+        self.assertIn('second cluck', posts[0])
+
+    def test_editing_post_invalidates_fragment(self):
+        fragments.feed_fragments(self.logan)
+        self.post.text = 'edited cluck'
+        self.post.save()
+        posts, _ = fragments.feed_fragments(self.logan)
+        self.assertIn('edited cluck', posts[0])
+
+    def test_fragments_rendered_before_the_commit_are_orphaned(self):
+        fragments.feed_fragments(self.logan)
+        stale = Post.objects.get(pk=self.post.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.text = 'edited cluck'
+            self.post.save()
+            #Another connection still reads the committed row until the commit
+            fragments.render_posts([(stale.pk, stale.author_id)], {stale.pk: stale})
+        posts, _ = fragments.feed_fragments(self.logan)
+        self.assertIn('edited cluck', posts[0])
+
+    def test_renaming_author_invalidates_fragment(self):
+        fragments.feed_fragments(self.logan)
+        self.george.username = '@georgina'
+        self.george.save()
+        posts, _ = fragments.feed_fragments(self.logan)
+        self.assertIn('@georgina', posts[0])
+
+    def test_hits_and_misses_are_counted(self):
+        before = fragment_cache.stats()
+        fragments.feed_fragments(self.logan)
+        fragments.feed_fragments(self.logan)
+        after = fragment_cache.stats()
+        self.assertEqual(after.get('page_misses', 0) - before.get('page_misses', 0), 1)
+        self.assertEqual(after.get('page_local_hits', 0) - before.get('page_local_hits', 0), 1)
+
+    def test_cache_stats_is_staff_only(self):
+        self.client.force_login(self.logan)
+        response = self.client.get(reverse('cache_stats'))
+        self.assertEqual(response.status_code, 403)
+        self.logan.is_staff = True
+        self.logan.save()
+        response = self.client.get(reverse('cache_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('local_entries', response.json())
@@ -0,0 +1,50 @@
+"""Tests of the system checks of the cache settings."""
+from django.test import SimpleTestCase, override_settings
+
+from microblogs.checks import check_shared_cache, check_version_stamps
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+REDIS = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379'}}
+CACHED = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+    'AUTHENTICATION_BACKENDS': [
+        'microblogs.backends.CachedModelBackend',
+        'django.contrib.auth.backends.ModelBackend',
+    ],
+}
+
+
+class ChecksTestCase(SimpleTestCase):
+    """Tests of the system checks of the cache settings."""
+
+    def _error_ids(self):
+        return [error.id for error in check_shared_cache(None)]
+
+    @override_settings(CACHE_SINGLE_PROCESS=False, CACHES=LOCMEM, **CACHED)
+    def test_cached_sessions_and_users_need_a_shared_cache(self):
+        self.assertEqual(self._error_ids(), ['microblogs.E001', 'microblogs.E002'])
+
+    @override_settings(CACHE_SINGLE_PROCESS=False, CACHES=REDIS, **CACHED)
+    def test_shared_caches_pass(self):
+        self.assertEqual(self._error_ids(), [])
+
+    @override_settings(
+        CACHE_SINGLE_PROCESS = False,
+        CACHES = LOCMEM,
+        SESSION_ENGINE = 'django.contrib.sessions.backends.db',
+        AUTHENTICATION_BACKENDS = ['django.contrib.auth.backends.ModelBackend'],
+    )
+    def test_uncached_sessions_and_users_pass(self):
+        self.assertEqual(self._error_ids(), [])
+
+    @override_settings(CACHE_SINGLE_PROCESS=True, CACHES=LOCMEM, **CACHED)
+    def test_a_single_process_may_use_a_local_cache(self):
+        self.assertEqual(self._error_ids(), [])
+
+    @override_settings(CACHE_SINGLE_PROCESS=False, CACHES=LOCMEM)
+    def test_version_stamps_should_be_shared(self):
+        self.assertEqual([warning.id for warning in check_version_stamps(None)], ['microblogs.W001'])
+
+    @override_settings(CACHE_SINGLE_PROCESS=False, CACHES=REDIS)
+    def test_shared_version_stamps_pass(self):
+        self.assertEqual(check_version_stamps(None), [])
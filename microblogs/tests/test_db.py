@@ -0,0 +1,26 @@
+"""Tests of the per-connection database setup."""
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from microblogs.db import configure_connection
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite pragmas')
+class SQLitePragmasTestCase(TestCase):
+    """Tests of the per-connection database setup."""
+
+    def test_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -4096})
+    def test_pragmas_come_from_settings(self):
+        configure_connection(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -4096)
@@ -0,0 +1,89 @@
+"""Tests of the follower graph and its denormalized counters."""
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from microblogs import graph
+from microblogs.models import Follow, Post, User
+from microblogs.tests.helpers import create_user
+
+
+class GraphTestCase(TestCase):
+    """Tests of the follower graph and its denormalized counters."""
+
+    def setUp(self):
+        self.george = create_user('@george')
+        self.logan = create_user('@logan')
+        self.petra = create_user('@petra')
+
+    def test_follow_updates_counters(self):
+        self.assertTrue(graph.follow(self.logan, self.george))
+        self.assertFalse(graph.follow(self.logan, self.george))
+        self._assert_counts(self.logan, following=1)
+        self._assert_counts(self.george, followers=1)
+
+    def test_user_cannot_follow_themselves(self):
+        self.assertFalse(graph.follow(self.george, self.george))
+        self._assert_counts(self.george)
+
+    def test_unfollow_updates_counters(self):
+        graph.follow(self.logan, self.george)
+        self.assertTrue(graph.unfollow(self.logan, self.george))
+        self.assertFalse(graph.unfollow(self.logan, self.george))
+        self._assert_counts(self.logan)
+        self._assert_counts(self.george)
+
+    def test_posts_update_counter(self):
+        post = Post.objects.create(author=self.george, text='cluck')
+        Post.objects.create(author=self.george, text='cluck cluck')
+        self._assert_counts(self.george, posts=2)
+        post.delete()
+        self._assert_counts(self.george, posts=1)
+
+    def test_drifted_counters_do_not_go_below_zero(self):
+        post = Post.objects.create(author=self.george, text='cluck')
+        graph.follow(self.logan, self.george)
+        User.objects.update(posts_count=0, followers_count=0, following_count=0)
+        post.delete()
+        graph.unfollow(self.logan, self.george)
+        self._assert_counts(self.george)
+        self._assert_counts(self.logan)
+
+    def test_bulk_follow(self):
+        created = graph.bulk_follow([
+            (self.logan.pk, self.george.pk),
+            (self.petra.pk, self.george.pk),
+            (self.logan.pk, self.petra.pk),
+            (self.logan.pk, self.logan.pk),
+        ])
+        self.assertEqual(created, 3)
+        self.assertEqual(graph.bulk_follow([(self.logan.pk, self.george.pk)]), 0)
+        self._assert_counts(self.george, followers=2)
+        self._assert_counts(self.logan, following=2)
+        self._assert_counts(self.petra, followers=1, following=1)
+
+    def test_bulk_unfollow(self):
+        graph.bulk_follow([(self.logan.pk, self.george.pk), (self.petra.pk, self.george.pk)])
+        removed = graph.bulk_unfollow([(self.logan.pk, self.george.pk), (self.logan.pk, self.petra.pk)])
+        self.assertEqual(removed, 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self._assert_counts(self.george, followers=1)
+        self._assert_counts(self.logan)
+
+    def test_reconcile_repairs_drifted_counters(self):
+        graph.follow(self.logan, self.george)
+        Post.objects.create(author=self.george, text='cluck')
+        User.objects.update(followers_count=7, following_count=7, posts_count=7)
+        out = StringIO()
+        call_command('reconcile_counters', batch_size=2, stdout=out)
+        self.assertIn('Repaired counters of 3 users', out.getvalue())
+        self._assert_counts(self.george, followers=1, posts=1)
+        self._assert_counts(self.logan, following=1)
+        self._assert_counts(self.petra)
+
+    def _assert_counts(self, user, followers=0, following=0, posts=0):
+        user.refresh_from_db()
+        self.assertEqual(user.followers_count, followers)
+        self.assertEqual(user.following_count, following)
+        self.assertEqual(user.posts_count, posts)
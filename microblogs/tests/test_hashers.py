@@ -0,0 +1,25 @@
+"""Tests of the password hashing helpers."""
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import check_password, make_password
+from django.test import TestCase, override_settings
+
+from microblogs.hashers import ahash_password, hash_password
+
+
+class HashersTestCase(TestCase):
+    """Tests of the password hashing helpers."""
+
+    def test_hash_password_on_pool_verifies(self):
+        encoded = hash_password('Password123')
+        self.assertTrue(check_password('Password123', encoded))
+        self.assertFalse(check_password('Password124', encoded))
+
+    def test_ahash_password_verifies(self):
+        encoded = async_to_sync(ahash_password)('Password123')
+        self.assertTrue(check_password('Password123', encoded))
+
+    @override_settings(PASSWORD_HASHERS=['microblogs.hashers.TunedScryptPasswordHasher'])
+    def test_tuned_scrypt_hasher(self):
+        encoded = make_password('Password123')
+        self.assertTrue(encoded.startswith('scrypt$'))
+        self.assertTrue(check_password('Password123', encoded))
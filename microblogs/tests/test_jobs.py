@@ -0,0 +1,154 @@
+"""Tests of the job queue and worker."""
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from microblogs import jobs, tasks
+from microblogs.models import HashtagBucket, Job, Post, PostHashtag, TimelineEntry, User
+
+
+class JobsTestCase(TestCase):
+    """Tests of the job queue and worker."""
+
+    def setUp(self):
+        self.george = User.objects.create_user(
+            username = '@george',
+            first_name = 'George',
+            last_name = 'Lemons',
+            email = 'georgelemons@apples.org',
+            password = 'Password123',
+        )
+        self.calls = []
+        self._register('record', lambda payload: self.calls.append(payload))
+
+    def _register(self, kind, function):
+        jobs.handler(kind)(function)
+        self.addCleanup(jobs.HANDLERS.pop, kind)
+
+    def test_enqueue_needs_a_handler(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue('unknown', {})
+
+    def test_claimed_jobs_are_not_claimed_again(self):
+        first = jobs.enqueue('record', {'n': 1})
+        jobs.enqueue('record', {'n': 2}, delay=60)
+        self.assertEqual(jobs.claim(), [first])
+        self.assertEqual(Job.objects.get(pk=first.pk).status, Job.RUNNING)
+        self.assertEqual(jobs.claim(), [])
+
+    def test_claim_respects_the_batch_size(self):
+        for n in range(5):
+            jobs.enqueue('record', {'n': n})
+        self.assertEqual([job.payload['n'] for job in jobs.claim(batch_size=3)], [0, 1, 2])
+
+    def test_finished_jobs_are_deleted(self):
+        jobs.enqueue('record', {'n': 1})
+        self.assertEqual(jobs.run(jobs.claim()[0]), 'done')
+        self.assertEqual(self.calls, [{'n': 1}])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failing_jobs_are_retried_with_backoff_then_failed(self):
+        def fail(payload):
+            raise RuntimeError('broken')
+        self._register('fail', fail)
+        job = jobs.enqueue('fail', {})
+        self.assertEqual(jobs.run(jobs.claim()[0]), 'retried')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('RuntimeError: broken', job.last_error)
+        Job.objects.update(attempts=jobs.MAX_ATTEMPTS - 1, run_after=timezone.now())
+        self.assertEqual(jobs.run(jobs.claim()[0]), 'failed')
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+    def test_backoff_grows_exponentially(self):
+        self.assertLessEqual(jobs.backoff(1), jobs.BACKOFF_SECONDS)
+        self.assertGreaterEqual(jobs.backoff(4), jobs.BACKOFF_SECONDS * 4)
+        self.assertLessEqual(jobs.backoff(100), jobs.MAX_BACKOFF_SECONDS)
+
+    def test_lost_jobs_are_requeued(self):
+        job = jobs.enqueue('record', {})
+        jobs.claim()
+        Job.objects.update(claimed_at=timezone.now() - timedelta(seconds=jobs.LEASE_SECONDS + 1))
+        self.assertEqual(jobs.requeue_lost(), 1)
+        self.assertEqual(jobs.claim(), [job])
+        self.assertEqual(Job.objects.get().attempts, 1)
+
+    def test_jobs_lost_too_often_are_failed(self):
+        jobs.enqueue('record', {})
+        for _ in range(jobs.MAX_ATTEMPTS):
+            self.assertEqual(len(jobs.claim()), 1)
+            Job.objects.update(claimed_at=timezone.now() - timedelta(seconds=jobs.LEASE_SECONDS + 1))
+            self.assertEqual(jobs.requeue_lost(), 1)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, jobs.MAX_ATTEMPTS))
+        self.assertEqual(job.last_error, jobs.LOST_ERROR)
+        self.assertEqual(jobs.claim(), [])
+
+    def test_jobs_whose_lease_was_lost_leave_the_new_claim_alone(self):
+        jobs.enqueue('record', {})
+        slow = jobs.claim()[0]
+        Job.objects.update(claimed_at=timezone.now() - timedelta(seconds=jobs.LEASE_SECONDS + 1))
+        jobs.requeue_lost()
+        fast = jobs.claim()[0]
+        self.assertEqual(jobs.run(slow), 'lost')
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.claim_token), (Job.RUNNING, fast.claim_token))
+        self.assertEqual(jobs.run(fast), 'done')
+        self.assertFalse(Job.objects.exists())
+
+    def test_failing_jobs_whose_lease_was_lost_are_not_rescheduled(self):
+        def fail(payload):
+            raise RuntimeError('broken')
+        self._register('fail', fail)
+        jobs.enqueue('fail', {})
+        slow = jobs.claim()[0]
+        Job.objects.update(claim_token='other')
+        self.assertEqual(jobs.run(slow), 'lost')
+        self.assertEqual(Job.objects.get().attempts, 0)
+
+    def test_retried_post_jobs_count_hashtags_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.george, text='#once')
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.process_post_job({'post_id': post.pk, 'created': True, 'reindex': True})
+        self.assertEqual(HashtagBucket.objects.get().count, 1)
+        self.assertEqual(TimelineEntry.objects.filter(post=post).count(), 1)
+
+    def test_worker_runs_until_empty(self):
+        for n in range(5):
+            jobs.enqueue('record', {'n': n})
+        worker = jobs.Worker(batch_size=2)
+        worker.run(until_empty=True)
+        self.assertEqual(len(self.calls), 5)
+        self.assertEqual(worker.stats()['done'], 5)
+
+    def test_posts_are_processed_inline_by_default(self):
+        post = Post.objects.create(author=self.george, text='#inline')
+        self.assertFalse(Job.objects.exists())
+        self.assertTrue(TimelineEntry.objects.filter(post=post).exists())
+
+    @override_settings(POST_PROCESSING='queue')
+    def test_queued_post_processing(self):
+        self.client.login(username='@george', password='Password123')
+        response = self.client.post(reverse('new_post'), {'text': 'queued #later'})
+        self.assertRedirects(response, reverse('feed'))
+        post = Post.objects.get()
+        self.assertEqual(User.objects.get(pk=self.george.pk).posts_count, 1)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertFalse(PostHashtag.objects.exists())
+        out = StringIO()
+        call_command('runworker', until_empty=True, stdout=out)
+        self.assertIn('1 done', out.getvalue())
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.george, post=post).exists())
+        self.assertTrue(PostHashtag.objects.filter(post=post, hashtag__name='later').exists())
+
+    @override_settings(POST_PROCESSING='queue')
+    def test_jobs_of_deleted_posts_finish(self):
+        Post.objects.create(author=self.george, text='gone').delete()
+        jobs.Worker().run(until_empty=True)
+        self.assertFalse(Job.objects.exists())
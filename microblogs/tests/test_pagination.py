@@ -0,0 +1,90 @@
+"""Tests of keyset pagination over posts."""
+import base64
+
+from django.test import TestCase
+from django.urls import reverse
+
+from microblogs import pagination
+from microblogs.models import Follow, Post, User
+
+
+class PaginationTestCase(TestCase):
+    """Tests of keyset pagination over posts."""
+
+    def setUp(self):
+        self.george = User.objects.create(
+            username = '@george',
+            first_name = 'George',
+            last_name = 'Lemons',
+            email = 'georgelemons@apples.org',
+        )
+        self.posts = [
+            Post.objects.create(author=self.george, text='cluck %d' % i) for i in range(5)
+        ]
+
+    def test_cursor_round_trip(self):
+        post = self.posts[0]
+        token = pagination.encode_cursor(post.created_at, post.pk)
+        self.assertEqual(pagination.decode_cursor(token), (post.created_at, post.pk))
+
+    def test_missing_cursor_decodes_to_none(self):
+        self.assertIsNone(pagination.decode_cursor(''))
+        self.assertIsNone(pagination.decode_cursor(None))
+
+    def test_malformed_cursor_is_rejected(self):
+        with self.assertRaises(pagination.InvalidCursor):
+            pagination.decode_cursor('not-a-cursor')
+
+    def test_cursor_ids_out_of_range_are_rejected(self):
+        for pk in ('0', '-1', str(2 ** 63), '99999999999999999999999'):
+            token = base64.urlsafe_b64encode(f'2020-01-01T00:00:00+00:00|{pk}'.encode()).decode()
+            with self.assertRaises(pagination.InvalidCursor):
+                pagination.decode_cursor(token)
+        url = reverse('user_posts_json', kwargs={'user_id': self.george.pk})
+        self.assertEqual(self.client.get(url, {'cursor': token}).status_code, 400)
+
+    def test_pages_cover_every_post_once(self):
+        seen = []
+        cursor = None
+        while True:
+            page = pagination.paginate(Post.objects.all(), cursor, limit=2)
+            seen.extend(page.items)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(reversed(self.posts)))
+
+    def test_new_posts_do_not_shift_later_pages(self):
+        first = pagination.paginate(Post.objects.all(), limit=2)
+        Post.objects.create(author=self.george, text='late cluck')
+        second = pagination.paginate(Post.objects.all(), first.next_cursor, limit=2)
+        self.assertEqual(second.items, [self.posts[2], self.posts[1]])
+
+    def test_user_posts_json(self):
+        url = reverse('user_posts_json', kwargs={'user_id': self.george.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([post['id'] for post in data['posts']], [post.pk for post in reversed(self.posts)])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_user_posts_json_rejects_bad_cursor(self):
+        url = reverse('user_posts_json', kwargs={'user_id': self.george.pk})
+        response = self.client.get(url, {'cursor': '!!!'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_feed_json_requires_login(self):
+        response = self.client.get(reverse('feed_json'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_feed_json_pages_timeline(self):
+        logan = User.objects.create(
+            username = '@logan',
+            first_name = 'Logan',
+            last_name = 'Grapes',
+            email = 'logangrapes@lemonade.org',
+        )
+        Follow.objects.create(follower=logan, followee=self.george)
+        self.client.force_login(logan)
+        response = self.client.get(reverse('feed_json'))
+        self.assertEqual(len(response.json()['posts']), 5)
@@ -0,0 +1,98 @@
+"""Tests of the post creation and profile views, sync and async."""
+from urllib.parse import urlencode
+
+from django.test import TestCase
+from django.urls import reverse
+
+from microblogs.models import Follow, Post, User
+
+
+class PostViewsTestCase(TestCase):
+    """Tests of the post creation and profile views, sync and async."""
+
+    def setUp(self):
+        self.george = User.objects.create(
+            username = '@george',
+            first_name = 'George',
+            last_name = 'Lemons',
+            email = 'georgelemons@apples.org',
+        )
+        self.logan = User.objects.create(
+            username = '@logan',
+            first_name = 'Logan',
+            last_name = 'Grapes',
+            email = 'logangrapes@lemonade.org',
+        )
+        Follow.objects.create(follower=self.logan, followee=self.george)
+
+    def test_new_post_creates_post(self):
+        self.client.force_login(self.george)
+        response = self.client.post(reverse('new_post'), {'text': 'a fresh cluck'})
+        self.assertRedirects(response, reverse('feed'))
+        self.assertTrue(Post.objects.filter(author=self.george, text='a fresh cluck').exists())
+
+    def test_invalid_new_post_rerenders_feed(self):
+        self.client.force_login(self.george)
+        response = self.client.post(reverse('new_post'), {'text': 'x' * 281})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'feed.html')
+        self.assertTrue(response.context['form'].errors)
+        self.assertFalse(Post.objects.exists())
+
+    def test_new_post_requires_login(self):
+        response = self.client.post(reverse('new_post'), {'text': 'a fresh cluck'})
+        self.assertRedirects(response, reverse('home'))
+        self.assertFalse(Post.objects.exists())
+
+    def test_profile_shows_counts_and_posts(self):
+        Post.objects.create(author=self.george, text='hello from george')
+        response = self.client.get(reverse('profile', kwargs={'user_id': self.george.pk}))
+        self.assertContains(response, 'hello from george')
+        self.assertContains(response, '1 clucks, 1 followers, 0 following')
+
+    async def test_async_feed_requires_login(self):
+        response = await self.async_client.get(reverse('feed_async'))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_async_profile(self):
+        await Post.objects.acreate(author=self.george, text='hello from george')
+        response = await self.async_client.get(reverse('profile_async', kwargs={'user_id': self.george.pk}))
+        data = response.json()
+        self.assertEqual(data['user']['posts_count'], 1)
+        self.assertEqual(data['user']['followers_count'], 1)
+        self.assertEqual([post['text'] for post in data['posts']], ['hello from george'])
+
+    async def test_async_profile_of_missing_user(self):
+        response = await self.async_client.get(reverse('profile_async', kwargs={'user_id': 999}))
+        self.assertEqual(response.status_code, 404)
+
+
+class AsyncAuthenticatedViewsTestCase(TestCase):
+    """Tests of the async views for a signed in user."""
+
+    def setUp(self):
+        self.george = User.objects.create(
+            username = '@george',
+            first_name = 'George',
+            last_name = 'Lemons',
+            email = 'georgelemons@apples.org',
+        )
+        self.async_client.force_login(self.george)
+
+    async def test_async_new_post_and_feed(self):
+        response = await self._post({'text': 'async cluck'})
+        self.assertEqual(response.status_code, 201)
+        response = await self.async_client.get(reverse('feed_async'))
+        self.assertEqual([post['text'] for post in response.json()['posts']], ['async cluck'])
+
+    async def test_async_new_post_rejects_invalid_text(self):
+        response = await self._post({'text': 'x' * 281})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+
+    def _post(self, data):
+        return self.async_client.post(
+            reverse('new_post_async'),
+            urlencode(data),
+            content_type = 'application/x-www-form-urlencoded',
+        )
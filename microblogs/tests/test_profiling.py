@@ -0,0 +1,84 @@
+"""Tests of the request profiling middleware."""
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from microblogs import profiling
+from microblogs.models import Post, User
+
+
+class ProfilingTestCase(TestCase):
+    """Tests of the request profiling middleware."""
+
+    def setUp(self):
+        profiling.registry.clear()
+        self.george = User.objects.create(
+            username = '@george',
+            first_name = 'George',
+            last_name = 'Lemons',
+            email = 'georgelemons@apples.org',
+        )
+        Post.objects.create(author=self.george, text='lemons')
+
+    def test_disabled_profiler_is_not_installed(self):
+        response = self.client.get(reverse('home'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(profiling.registry.views, {})
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_requests_are_recorded_per_view(self):
+        self.client.force_login(self.george)
+        response = self.client.get(reverse('feed'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        stats = profiling.registry.views['feed']
+        self.assertEqual(stats.latency.count, 1)
+        self.assertGreater(stats.queries, 0)
+        self.assertGreater(stats.template_seconds, 0)
+
+    def test_duplicates_and_repeated_statements_are_detected(self):
+        profile = profiling.RequestProfile()
+        execute = lambda sql, params, many, context: None
+        for pk in range(profiling.REPEAT_THRESHOLD):
+            profile(execute, 'SELECT %s', [pk], False, {})
+        profile(execute, 'SELECT %s', [0], False, {})
+        self.assertEqual(profile.query_count, profiling.REPEAT_THRESHOLD + 1)
+        self.assertEqual(profile.duplicates(), 1)
+        self.assertEqual(profile.repeated_statements(), ['SELECT %s'])
+
+    def test_histogram_is_cumulative(self):
+        histogram = profiling.Histogram(buckets=(1, 2))
+        histogram.observe(0.5)
+        histogram.observe(1.5)
+        histogram.observe(3)
+        self.assertEqual(histogram.counts, [1, 2])
+        self.assertEqual(histogram.count, 3)
+
+    @override_settings(PROFILING_ENABLED=True, METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_metrics_are_served_in_prometheus_format(self):
+        self.client.get(reverse('home'))
+        response = self.client.get(reverse('metrics'))
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('clucker_request_seconds_count{view="home"} 1', body)
+        self.assertIn('clucker_queries_total{view="home"}', body)
+        self.assertIn('clucker_fragment_cache{stat="local_entries"}', body)
+
+    def test_metrics_are_not_public_by_default(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_metrics_accept_the_bearer_token(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_metrics_are_allowed_addresses_or_staff_only(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+        self.george.is_staff = True
+        self.george.save()
+        self.client.force_login(self.george)
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,99 @@
+"""Tests of the per-client rate limits."""
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from microblogs import ratelimit
+from microblogs.models import Post, User
+
+
+class RateLimitTestCase(TestCase):
+    """Tests of the per-client rate limits."""
+
+    def setUp(self):
+        ratelimit.reset()
+        self.addCleanup(ratelimit.reset)
+        cache.clear()
+        for patcher in (
+            mock.patch.object(ratelimit, 'ENABLED', True),
+            mock.patch.dict(ratelimit.LIMITS, {'sign_up': (2, 3600), 'new_post': (2, 60)}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.john = User.objects.create_user(
+            username = '@johndoe',
+            first_name = 'John',
+            last_name = 'Doe',
+            email = 'johndoe@example.org',
+            password = 'Password123',
+        )
+
+    def test_memory_buckets_allow_a_burst_then_refill(self):
+        backend = ratelimit.MemoryBackend()
+        with mock.patch.object(ratelimit.time, 'monotonic', return_value=100.0):
+            self.assertEqual([backend.hit('client', 3, 60) for _ in range(3)], [0, 0, 0])
+            self.assertAlmostEqual(backend.hit('client', 3, 60), 20)
+        with mock.patch.object(ratelimit.time, 'monotonic', return_value=120.0):
+            self.assertEqual(backend.hit('client', 3, 60), 0)
+            self.assertGreater(backend.hit('client', 3, 60), 0)
+        self.assertEqual(backend.hit('other', 3, 60), 0)
+
+    def test_memory_backend_forgets_the_least_recent_clients(self):
+        backend = ratelimit.MemoryBackend(size=2)
+        backend.hit('first', 1, 60)
+        backend.hit('second', 1, 60)
+        backend.hit('third', 1, 60)
+        self.assertEqual(backend.hit('first', 1, 60), 0)
+        self.assertGreater(backend.hit('third', 1, 60), 0)
+
+    def test_cache_windows_slide(self):
+        backend = ratelimit.CacheBackend()
+        with mock.patch.object(ratelimit.time, 'time', return_value=6000.0):
+            self.assertEqual([backend.hit('client', 2, 60) for _ in range(2)], [0, 0])
+            self.assertEqual(backend.hit('client', 2, 60), 60)
+        #Half way into the next window, half of the three earlier hits still count
+        with mock.patch.object(ratelimit.time, 'time', return_value=6090.0):
+            self.assertAlmostEqual(backend.hit('client', 2, 60), 10)
+        with mock.patch.object(ratelimit.time, 'time', return_value=6180.0):
+            self.assertEqual(backend.hit('client', 2, 60), 0)
+
+    def test_sign_ups_are_limited_per_address(self):
+        self.client.get(reverse('sign_up'))
+        for _ in range(2):
+            self.assertEqual(self.client.post(reverse('sign_up'), {}).status_code, 200)
+        response = self.client.post(reverse('sign_up'), {})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        other = self.client.post(reverse('sign_up'), {}, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other.status_code, 200)
+
+    def test_posts_are_limited_per_user(self):
+        self.client.force_login(self.john)
+        for i in range(2):
+            self.client.post(reverse('new_post'), {'text': f'cluck {i}'})
+        response = self.client.post(reverse('new_post'), {'text': 'one too many'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_async_posts_are_limited_with_json(self):
+        self.client.force_login(self.john)
+        for i in range(2):
+            self.assertEqual(self.client.post(reverse('new_post_async'), {'text': f'cluck {i}'}).status_code, 201)
+        response = self.client.post(reverse('new_post_async'), {'text': 'one too many'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json(), {'error': 'Too many requests'})
+
+    def test_limits_can_be_turned_off(self):
+        with mock.patch.object(ratelimit, 'ENABLED', False):
+            for _ in range(3):
+                self.assertEqual(self.client.post(reverse('sign_up'), {}).status_code, 200)
+
+    def test_benchmark_reports_every_backend(self):
+        out = StringIO()
+        call_command('bench_ratelimit', checks=10, clients=3, stdout=out)
+        for name in ('no limit', 'memory', 'cache'):
+            self.assertIn(name, out.getvalue())
@@ -0,0 +1,77 @@
+"""Tests of template warming and post rendering."""
+from datetime import date, datetime, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.template import Context, Template, engines
+from django.template.loader import render_to_string
+from django.test import TestCase
+from django.utils import timezone, translation
+
+from microblogs import rendering
+from microblogs.models import Post, User
+from microblogs.templatetags import clucker
+
+
+class RenderingTestCase(TestCase):
+    """Tests of template warming and post rendering."""
+
+    def setUp(self):
+        clucker._format_minute.cache_clear()
+        self.john = User.objects.create_user(
+            username = '@johndoe',
+            first_name = 'John',
+            last_name = 'Doe',
+            email = 'johndoe@example.org',
+            password = 'Password123',
+        )
+
+    def _assert_same_as_variable(self, value):
+        expected = Template('{{ value }}').render(Context({'value': value}))
+        actual = Template('{% load clucker %}{{ value|timestamp }}').render(Context({'value': value}))
+        self.assertEqual(actual, expected)
+
+    def test_timestamp_renders_like_the_plain_variable(self):
+        for moment in (
+            datetime(2022, 10, 18, 0, 0, 30, tzinfo=dt_timezone.utc),
+            datetime(2022, 10, 18, 12, 0, tzinfo=dt_timezone.utc),
+            datetime(2022, 5, 3, 9, 7, 59, 999, tzinfo=dt_timezone.utc),
+            datetime(2022, 9, 1, 21, 45),
+            date(2022, 9, 1),
+            None,
+        ):
+            self._assert_same_as_variable(moment)
+
+    def test_timestamp_follows_the_current_timezone(self):
+        moment = datetime(2022, 10, 18, 23, 30, tzinfo=dt_timezone.utc)
+        self._assert_same_as_variable(moment)
+        with timezone.override('Asia/Tokyo'):
+            self._assert_same_as_variable(moment)
+
+    def test_timestamp_follows_the_active_language(self):
+        moment = datetime(2022, 10, 18, 23, 30, tzinfo=dt_timezone.utc)
+        self._assert_same_as_variable(moment)
+        with translation.override('pl'):
+            self._assert_same_as_variable(moment)
+
+    def test_render_each_matches_render_to_string(self):
+        posts = [Post.objects.create(author=self.john, text=f'<b>cluck {i}</b>') for i in range(3)]
+        self.assertEqual(
+            rendering.render_each('_post.html', 'post', posts),
+            [render_to_string('_post.html', {'post': post}) for post in posts],
+        )
+        self.assertIn('&lt;b&gt;cluck 0&lt;/b&gt;', rendering.render_each('_post.html', 'post', posts)[0])
+
+    def test_warm_compiles_every_template_of_the_app(self):
+        loader = engines['django'].engine.template_loaders[0]
+        loader.reset()
+        names = rendering.warm()
+        self.assertIn('_post.html', names)
+        self.assertIn('feed.html', names)
+        self.assertTrue(set(names) <= set(loader.get_template_cache))
+
+    def test_benchmark_reports_every_scenario(self):
+        out = StringIO()
+        call_command('bench_templates', posts=3, iterations=2, warmup=0, stdout=out)
+        for scenario in ('fragments', 'feed_page', 'sign_up', 'compile'):
+            self.assertIn(scenario, out.getvalue())
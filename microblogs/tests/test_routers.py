@@ -0,0 +1,98 @@
+"""Tests of the read replica router."""
+from django.db import connections, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from microblogs import routers
+from microblogs.models import Job, Post, User
+
+
+@override_settings(
+    DATABASE_REPLICAS = ['replica1'],
+    DATABASE_ROUTERS = ['microblogs.routers.PrimaryReplicaRouter'],
+)
+class PrimaryReplicaRouterTestCase(TransactionTestCase):
+    """Tests of the read replica router."""
+
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        self.router = routers.PrimaryReplicaRouter()
+        self.john = User.objects.create_user(
+            username = '@johndoe',
+            first_name = 'John',
+            last_name = 'Doe',
+            email = 'johndoe@example.org',
+            password = 'Password123',
+        )
+
+    def _in_request(self, pinned=False):
+        token = routers.begin_request(pinned)
+        self.addCleanup(routers.end_request, token)
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_reads_in_requests_use_a_replica(self):
+        self._in_request()
+        self.assertEqual(self.router.db_for_read(Post), 'replica1')
+        self.assertEqual(self.router.db_for_read(User), 'replica1')
+
+    def test_reads_after_a_write_use_the_primary(self):
+        self._in_request()
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_rows_read_from_a_replica_are_written_to_the_primary(self):
+        post = Post(author=self.john, text='Hello')
+        post._state.db = 'replica1'
+        self.assertEqual(self.router.db_for_write(Post, instance=post), 'default')
+        post._state.db = 'shard1'
+        self.assertEqual(self.router.db_for_write(Post, instance=post), 'shard1')
+
+    def test_pinned_requests_read_from_the_primary(self):
+        self._in_request(pinned=True)
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_jobs_are_read_from_the_primary(self):
+        self._in_request()
+        self.assertEqual(self.router.db_for_read(Job), 'default')
+
+    def test_reads_in_transactions_use_the_primary(self):
+        self._in_request()
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'microblogs'))
+        self.assertIsNone(self.router.allow_migrate('default', 'microblogs'))
+
+    def test_writing_sets_the_sticky_cookie(self):
+        self.client.force_login(self.john)
+        response = self.client.post(reverse('new_post'), {'text': 'Hello'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(routers.STICKY_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[routers.STICKY_COOKIE]['max-age'], 5)
+
+    def test_sticky_clients_read_from_the_primary(self):
+        self.client.force_login(self.john)
+        self.client.post(reverse('new_post'), {'text': 'Hello'})
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            response = self.client.get(reverse('feed'))
+        self.assertContains(response, 'Hello')
+        self.assertEqual(len(replica), 0)
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+    def test_other_clients_read_from_a_replica(self):
+        self.client.force_login(self.john)
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            response = self.client.get(reverse('profile', args=[self.john.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(replica), 0)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_middleware_is_not_used_without_replicas(self):
+        self.client.force_login(self.john)
+        response = self.client.post(reverse('new_post'), {'text': 'Hello'})
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
@@ -0,0 +1,96 @@
+"""Tests of full-text search."""
+import base64
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from microblogs import search
+from microblogs.pagination import InvalidCursor
+from microblogs.models import Post, User
+
+
+class SearchTestCase(TestCase):
+    """Tests of full-text search."""
+
+    def setUp(self):
+        self.george = User.objects.create(
+            username = '@george',
+            first_name = 'George',
+            last_name = 'Lemons',
+            email = 'georgelemons@apples.org',
+            bio = 'I sell oranges',
+        )
+        self.lemons = Post.objects.create(author=self.george, text='lemons are sour')
+        self.oranges = Post.objects.create(author=self.george, text='oranges and lemons and more lemons')
+        Post.objects.create(author=self.george, text='nothing to see here')
+
+    def test_search_finds_matching_posts(self):
+        page = search.search_posts('lemons')
+        self.assertEqual(set(page.items), {self.lemons, self.oranges})
+
+    def test_search_requires_all_terms(self):
+        page = search.search_posts('oranges lemons')
+        self.assertEqual(page.items, [self.oranges])
+
+    def test_search_sees_edits_and_deletes(self):
+        self.lemons.text = 'limes are sour'
+        self.lemons.save()
+        self.assertEqual(search.search_posts('limes').items, [self.lemons])
+        self.assertEqual(search.search_posts('lemons').items, [self.oranges])
+        self.oranges.delete()
+        self.assertEqual(search.search_posts('lemons').items, [])
+
+    def test_search_indexes_bulk_created_posts(self):
+        Post.objects.bulk_create([Post(author=self.george, text='bulk lemons')])
+        self.assertEqual(len(search.search_posts('lemons').items), 3)
+
+    def test_search_query_syntax_is_escaped(self):
+        self.assertEqual(search.search_posts('lemons" OR "x').items, [])
+        self.assertEqual(search.search_posts('NEAR(').items, [])
+
+    def test_control_characters_are_ignored(self):
+        self.assertEqual(search.search_posts('\x00').items, [])
+        self.assertEqual(search.search_users('geo\x00rge').items, [])
+        response = self.client.get(reverse('search'), {'q': 'sour\x00', 'kind': 'posts'})
+        self.assertContains(response, 'lemons are sour')
+
+    def test_search_pages_do_not_overlap(self):
+        for i in range(5):
+            Post.objects.create(author=self.george, text=f'lemons {i}')
+        seen = []
+        cursor = None
+        while True:
+            page = search.search_posts('lemons', cursor, limit=2)
+            seen.extend(page.items)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_cursors_out_of_range_are_rejected(self):
+        for raw in ('1e999|1', 'nan|1', '-1.5|99999999999999999999999'):
+            token = base64.urlsafe_b64encode(raw.encode()).decode()
+            with self.assertRaises(InvalidCursor):
+                search.search_posts('lemons', token)
+
+    def test_search_users(self):
+        self.assertEqual(search.search_users('oranges').items, [self.george])
+        self.assertEqual(search.search_users('@george').items, [self.george])
+
+    def test_search_view(self):
+        response = self.client.get(reverse('search'), {'q': 'sour'})
+        self.assertContains(response, 'lemons are sour')
+        response = self.client.get(reverse('search'), {'q': 'george', 'kind': 'users'})
+        self.assertContains(response, '@george')
+
+    def test_rebuild_command(self):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("INSERT INTO microblogs_post_fts(microblogs_post_fts) VALUES ('delete-all')")
+            self.assertEqual(search.search_posts('lemons').items, [])
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+        self.assertEqual(len(search.search_posts('lemons').items), 2)
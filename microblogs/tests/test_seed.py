@@ -0,0 +1,40 @@
+"""Tests of the seed command."""
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from microblogs.management.commands.seed import USERNAME_PREFIX
+from microblogs.models import Follow, Post, TimelineEntry, User
+
+
+class SeedCommandTestCase(TestCase):
+    """Tests of the seed command."""
+
+    def test_seed_creates_requested_rows(self):
+        out = StringIO()
+        call_command('seed', users=6, posts=20, follows=10, batch_size=4, workers=1, stdout=out)
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        self.assertEqual(users.count(), 6)
+        self.assertEqual(Post.objects.count(), 20)
+        self.assertLessEqual(Follow.objects.count(), 10)
+        self.assertIn('rows/s', out.getvalue())
+
+    def test_seeded_users_share_one_valid_password(self):
+        call_command('seed', users=3, posts=0, follows=0, workers=1, password='Seeded123', stdout=StringIO())
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        self.assertEqual(len({user.password for user in users}), 1)
+        self.assertTrue(users.first().check_password('Seeded123'))
+
+    def test_seeded_users_are_valid(self):
+        call_command('seed', users=3, posts=0, follows=0, workers=1, stdout=StringIO())
+        for user in User.objects.all():
+            user.full_clean()
+
+    def test_seed_maintains_counters_and_timelines(self):
+        call_command('seed', users=5, posts=15, follows=8, batch_size=4, workers=1, stdout=StringIO())
+        for user in User.objects.all():
+            self.assertEqual(user.posts_count, Post.objects.filter(author=user).count())
+            self.assertEqual(user.followers_count, Follow.objects.filter(followee=user).count())
+        for post in Post.objects.all():
+            self.assertTrue(TimelineEntry.objects.filter(owner=post.author, post=post).exists())
@@ -0,0 +1,103 @@
+"""Tests of posts sharded by author."""
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from microblogs import sharding, timeline
+from microblogs.models import Follow, Post, TimelineEntry, User
+
+SHARDS = ['shard1', 'shard2']
+
+
+@override_settings(
+    POST_SHARDS = SHARDS,
+    DATABASE_ROUTERS = ['microblogs.routers.AuthorShardRouter'],
+)
+class ShardingTestCase(TransactionTestCase):
+    """Tests of posts sharded by author."""
+
+    databases = {'default', *SHARDS}
+
+    def setUp(self):
+        #Done on connection and after migrate outside tests, when the shards
+        #are configured from the start
+        for shard in SHARDS:
+            sharding.configure_shard(connections[shard])
+            sharding.reserve_id_range(shard)
+        self.users = [
+            User.objects.create_user(
+                username = f'@user{n}',
+                first_name = 'User',
+                last_name = f'Number{n}',
+                email = f'user{n}@example.org',
+                password = 'Password123',
+            )
+            for n in range(4)
+        ]
+        self.reader = self.users[0]
+        for followee in self.users[1:]:
+            Follow.objects.create(follower=self.reader, followee=followee)
+
+    def _post(self, author, text):
+        return Post.objects.create(author=author, text=text)
+
+    def test_posts_are_stored_on_their_authors_shard(self):
+        for author in self.users:
+            post = self._post(author, 'Hello')
+            shard = sharding.shard_for(author.pk)
+            self.assertEqual(post._state.db, shard)
+            self.assertTrue(Post.objects.using(shard).filter(pk=post.pk).exists())
+            self.assertEqual(sharding.database_for_post(post.pk), shard)
+        self.assertFalse(Post.objects.using('default').exists())
+
+    def test_post_ids_are_unique_across_shards(self):
+        ids = [self._post(author, 'Hello').pk for author in self.users]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(post_id >> sharding.ID_RANGE_BITS for post_id in ids))
+
+    def test_posts_count_is_kept_on_the_primary(self):
+        self._post(self.users[1], 'Hello')
+        self.users[1].refresh_from_db()
+        self.assertEqual(self.users[1].posts_count, 1)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_feed_merges_every_shard_newest_first(self):
+        posts = [self._post(author, f'Post {n}') for n, author in enumerate(self.users * 2)]
+        self.assertEqual(len({post._state.db for post in posts}), 2)
+        feed = timeline.get_feed(self.reader, limit=5)
+        self.assertEqual([post.pk for post in feed], [post.pk for post in posts[::-1][:5]])
+        self.assertEqual(feed[0].author, posts[-1].author)
+        older = timeline.get_feed(self.reader, limit=5, before=(feed[-1].created_at, feed[-1].pk))
+        self.assertEqual([post.pk for post in older], [post.pk for post in posts[::-1][5:]])
+
+    def test_feed_only_holds_followed_authors(self):
+        Follow.objects.filter(followee=self.users[2]).delete()
+        self._post(self.users[2], 'Unfollowed')
+        followed = self._post(self.users[1], 'Followed')
+        self.assertEqual(timeline.get_feed(self.reader), [followed])
+
+    def test_in_bulk_reads_every_shard(self):
+        posts = [self._post(author, 'Hello') for author in self.users]
+        found = sharding.in_bulk([post.pk for post in posts])
+        self.assertEqual(sorted(found), sorted(post.pk for post in posts))
+        self.assertEqual(found[posts[1].pk].author, self.users[1])
+
+    def test_profile_lists_posts_from_the_authors_shard(self):
+        self._post(self.users[1], 'Sharded hello')
+        response = self.client.get(reverse('profile', args=[self.users[1].pk]))
+        self.assertContains(response, 'Sharded hello')
+
+    def test_feed_page_shows_sharded_posts(self):
+        self._post(self.users[1], 'From shard one')
+        self._post(self.users[2], 'From shard two')
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('feed'))
+        self.assertContains(response, 'From shard one')
+        self.assertContains(response, 'From shard two')
+
+    def test_sharded_posts_can_be_deleted(self):
+        post = self._post(self.users[1], 'Hello')
+        post.delete()
+        self.assertFalse(Post.objects.using(sharding.shard_for(self.users[1].pk)).exists())
+        self.users[1].refresh_from_db()
+        self.assertEqual(self.users[1].posts_count, 0)
@@ -0,0 +1,166 @@
+"""Tests of the server-sent events stream of new posts."""
+import asyncio
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.test import TestCase
+
+from microblogs import backends, pagination, streams
+from microblogs.models import Follow, Post
+from microblogs.tests.helpers import create_user
+
+
+class _Connection:
+    #Drives streams.app like an ASGI server with one client
+
+    def __init__(self, headers=(), query=b''):
+        self.messages = asyncio.Queue()
+        self.disconnected = asyncio.Event()
+        self.requested = False
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': streams.STREAM_PATH,
+            'query_string': query, 'headers': list(headers),
+        }
+        self.task = asyncio.get_running_loop().create_task(streams.app(scope, self._receive, self.messages.put))
+
+    async def _receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def start(self):
+        return await asyncio.wait_for(self.messages.get(), 2)
+
+    async def chunk(self):
+        return (await asyncio.wait_for(self.messages.get(), 2))['body']
+
+    async def events(self, count):
+        #The data lines of the next `count` post events
+        events = []
+        while len(events) < count:
+            chunk = await self.chunk()
+            if chunk.startswith(b'id: '):
+                events.append(chunk)
+        return events
+
+    async def close(self):
+        self.disconnected.set()
+        await asyncio.wait_for(self.task, 2)
+
+
+class StreamsTestCase(TestCase):
+    """Tests of the server-sent events stream of new posts."""
+
+    def setUp(self):
+        backends.clear()
+        self.george = create_user('@george')
+        self.logan = create_user('@logan')
+        self.stranger = create_user('@stranger')
+        Follow.objects.create(follower=self.logan, followee=self.george)
+        self.client.force_login(self.logan)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        self.headers = [(b'cookie', cookie.encode())]
+
+    def _create_posts(self, author, texts):
+        #Posts whose on-commit callbacks never run, inside the test's transaction
+        return [Post.objects.create(author=author, text=text) for text in texts]
+
+    def _post(self, author, *texts):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [Post.objects.create(author=author, text=text) for text in texts]
+
+    async def _connect(self, last_event_id=None):
+        headers = list(self.headers)
+        if last_event_id:
+            headers.append((b'last-event-id', last_event_id.encode()))
+        connection = _Connection(headers)
+        self.assertEqual((await connection.start())['status'], 200)
+        self.assertEqual(await connection.chunk(), b'retry: 3000\n\n')
+        return connection
+
+    async def test_anonymous_clients_are_refused(self):
+        connection = _Connection()
+        self.assertEqual((await connection.start())['status'], 401)
+        await asyncio.wait_for(connection.task, 2)
+
+    async def test_followers_receive_new_posts(self):
+        connection = await self._connect()
+        [post] = await sync_to_async(self._post)(self.george, 'hello followers')
+        [event] = await connection.events(1)
+        cursor = pagination.encode_cursor(post.created_at, post.pk)
+        self.assertTrue(event.startswith(f'id: {cursor}\nevent: post\ndata: '.encode()))
+        self.assertIn(b'"text":"hello followers"', event)
+        await connection.close()
+        self.assertEqual(len(streams.hub), 0)
+
+    async def test_posts_of_other_authors_are_not_sent(self):
+        connection = await self._connect()
+        await sync_to_async(self._post)(self.stranger, 'not for you')
+        await sync_to_async(self._post)(self.george, 'for you')
+        [event] = await connection.events(1)
+        self.assertIn(b'for you', event)
+        self.assertNotIn(b'not for you', event)
+        await connection.close()
+
+    async def test_reconnecting_clients_catch_up(self):
+        first, *missed = await sync_to_async(self._post)(self.george, 'seen', 'missed 1', 'missed 2')
+        connection = await self._connect(pagination.encode_cursor(first.created_at, first.pk))
+        events = await connection.events(2)
+        self.assertIn(b'missed 1', events[0])
+        self.assertIn(b'missed 2', events[1])
+        await connection.close()
+
+    async def test_posts_committed_after_newer_ones_are_sent(self):
+        connection = await self._connect()
+        older, newer = await sync_to_async(self._create_posts)(self.george, ['older', 'newer'])
+        streams.post_created(newer)
+        streams.post_created(older)
+        streams.post_created(newer)
+        streams.post_created(older)
+        await sync_to_async(self._post)(self.george, 'latest')
+        events = await connection.events(3)
+        self.assertEqual([text in event for text, event in zip([b'newer', b'older', b'latest'], events)], [True] * 3)
+        await connection.close()
+
+    async def test_reconnecting_clients_catch_up_on_posts_committed_late(self):
+        late, seen = await sync_to_async(self._post)(self.george, 'late', 'seen')
+        connection = await self._connect(pagination.encode_cursor(seen.created_at, seen.pk))
+        await sync_to_async(self._post)(self.george, 'after')
+        events = await connection.events(2)
+        self.assertIn(b'"text":"late"', events[0])
+        self.assertIn(b'"text":"after"', events[1])
+        await connection.close()
+
+    async def test_invalid_last_event_ids_are_rejected(self):
+        connection = _Connection(self.headers + [(b'last-event-id', b'garbage')])
+        self.assertEqual((await connection.start())['status'], 400)
+        await asyncio.wait_for(connection.task, 2)
+
+    async def test_slow_streams_catch_up_instead_of_buffering(self):
+        [first] = await sync_to_async(self._post)(self.george, 'seen')
+        burst = await sync_to_async(self._create_posts)(self.george, [f'burst {i}' for i in range(5)])
+        with mock.patch.object(streams, 'QUEUE_SIZE', 2):
+            connection = await self._connect(pagination.encode_cursor(first.created_at, first.pk))
+        #Published without yielding to the stream, so its queue overflows
+        for post in burst:
+            streams.post_created(post)
+        events = await connection.events(5)
+        self.assertEqual([b'burst %d' % i in event for i, event in enumerate(events)], [True] * 5)
+        await connection.close()
+
+    async def test_missing_too_much_resets_the_client(self):
+        [first] = await sync_to_async(self._post)(self.george, 'seen')
+        await sync_to_async(self._post)(self.george, 'missed 1', 'missed 2')
+        with mock.patch.object(streams, 'CATCH_UP_LIMIT', 1):
+            connection = await self._connect(pagination.encode_cursor(first.created_at, first.pk))
+            self.assertEqual(await connection.chunk(), b'event: reset\ndata: {}\n\n')
+        await connection.close()
+
+    async def test_heartbeats_are_sent(self):
+        connection = await self._connect()
+        streams.hub.heartbeat()
+        self.assertEqual(await connection.chunk(), b': ping\n\n')
+        await connection.close()
@@ -0,0 +1,108 @@
+"""Tests of hashtag and mention extraction."""
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from microblogs import tags
+from microblogs.forms import PostForm
+from microblogs.models import Hashtag, Mention, Post, PostHashtag, User
+
+
+class TagsTestCase(TestCase):
+    """Tests of hashtag and mention extraction."""
+
+    def setUp(self):
+        self.george = User.objects.create(
+            username = '@george',
+            first_name = 'George',
+            last_name = 'Lemons',
+            email = 'georgelemons@apples.org',
+        )
+        self.sally = User.objects.create(
+            username = '@sally',
+            first_name = 'Sally',
+            last_name = 'Oranges',
+            email = 'sallyoranges@apples.org',
+        )
+
+    def test_extract_hashtags(self):
+        self.assertEqual(tags.extract_hashtags('#Lemons and #limes, not a#b or ##x'), {'lemons', 'limes'})
+
+    def test_extract_mentions(self):
+        self.assertEqual(tags.extract_mentions('hi @sally, @ab and me@george'), {'@sally'})
+
+    def test_saving_a_post_indexes_it(self):
+        post = Post.objects.create(author=self.george, text='#Fruit for @sally and @nobody #fruit')
+        self.assertEqual(list(post.hashtag_links.values_list('hashtag__name', flat=True)), ['fruit'])
+        self.assertEqual(list(post.mentions.values_list('user', flat=True)), [self.sally.pk])
+        self.assertEqual(post.hashtag_links.get().created_at, post.created_at)
+
+    def test_post_form_posts_are_indexed(self):
+        form = PostForm({'text': 'hello #world'})
+        self.assertTrue(form.is_valid())
+        Post.objects.create(author=self.george, text=form.cleaned_data['text'])
+        self.assertEqual(tags.hashtag_page('world').items[0].text, 'hello #world')
+
+    def test_editing_a_post_replaces_its_links(self):
+        post = Post.objects.create(author=self.george, text='#old @sally')
+        post.text = '#new'
+        post.save()
+        self.assertEqual(list(post.hashtag_links.values_list('hashtag__name', flat=True)), ['new'])
+        self.assertFalse(post.mentions.exists())
+
+    def test_bulk_created_posts_are_indexed_in_one_batch(self):
+        posts = Post.objects.bulk_create([
+            Post(author=self.george, text=f'#bulk post {i} for @sally') for i in range(5)
+        ])
+        with self.assertNumQueries(10), self.captureOnCommitCallbacks(execute=True):
+            tags.index_posts(posts)
+        self.assertEqual(PostHashtag.objects.count(), 5)
+        self.assertEqual(Mention.objects.filter(user=self.sally).count(), 5)
+        self.assertEqual(Hashtag.objects.count(), 1)
+
+    def test_hashtag_pages_do_not_overlap(self):
+        posts = [Post.objects.create(author=self.george, text=f'#paged {i}') for i in range(5)]
+        seen = []
+        cursor = None
+        while True:
+            page = tags.hashtag_page('PAGED', cursor, limit=2)
+            seen.extend(page.items)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted(posts, key=lambda post: (post.created_at, post.pk), reverse=True))
+
+    def test_mentions_page(self):
+        mention = Post.objects.create(author=self.george, text='hi @sally')
+        Post.objects.create(author=self.george, text='hi everyone')
+        self.assertEqual(tags.mentions_page(self.sally).items, [mention])
+
+    def test_deleting_a_post_removes_its_links(self):
+        post = Post.objects.create(author=self.george, text='#gone @sally')
+        post.delete()
+        self.assertFalse(PostHashtag.objects.exists())
+        self.assertFalse(Mention.objects.exists())
+
+    def test_backfill_tags_indexes_existing_posts(self):
+        Post.objects.create(author=self.george, text='#backfill @sally')
+        PostHashtag.objects.all().delete()
+        Mention.objects.all().delete()
+        call_command('backfill_tags', batch_size=1, stdout=StringIO())
+        self.assertEqual(PostHashtag.objects.count(), 1)
+        self.assertEqual(Mention.objects.count(), 1)
+
+    def test_hashtag_view(self):
+        Post.objects.create(author=self.george, text='#view me')
+        response = self.client.get(reverse('hashtag', args=['view']))
+        self.assertContains(response, '#view me')
+        response = self.client.get(reverse('hashtag', args=['view']), {'cursor': '!'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_mentions_view_requires_login(self):
+        response = self.client.get(reverse('mentions'))
+        self.assertRedirects(response, reverse('home'))
+        Post.objects.create(author=self.george, text='hi @sally')
+        self.client.force_login(self.sally)
+        self.assertContains(self.client.get(reverse('mentions')), 'hi @sally')
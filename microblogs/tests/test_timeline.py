@@ -0,0 +1,73 @@
+"""Tests of the materialized timelines behind the feed."""
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from microblogs import timeline
+from microblogs.models import Follow, Post, TimelineEntry
+from microblogs.tests.helpers import create_user
+
+
+class TimelineTestCase(TestCase):
+    """Tests of the materialized timelines behind the feed."""
+
+    def setUp(self):
+        self.george = create_user('@george')
+        self.logan = create_user('@logan')
+        self.petra = create_user('@petra')
+
+    def test_post_is_pushed_to_author_and_followers(self):
+        Follow.objects.create(follower=self.logan, followee=self.george)
+        post = Post.objects.create(author=self.george, text='cluck')
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.george, post=post).exists())
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.logan, post=post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.petra, post=post).exists())
+
+    def test_feed_is_newest_first(self):
+        Follow.objects.create(follower=self.logan, followee=self.george)
+        Follow.objects.create(follower=self.logan, followee=self.petra)
+        first = Post.objects.create(author=self.george, text='first')
+        second = Post.objects.create(author=self.petra, text='second')
+        third = Post.objects.create(author=self.george, text='third')
+        self.assertEqual(timeline.get_feed(self.logan), [third, second, first])
+
+    def test_feed_pages_with_before(self):
+        Follow.objects.create(follower=self.logan, followee=self.george)
+        posts = [Post.objects.create(author=self.george, text=str(i)) for i in range(5)]
+        page = timeline.get_feed(self.logan, limit=2)
+        self.assertEqual(page, [posts[4], posts[3]])
+        last = page[-1]
+        page = timeline.get_feed(self.logan, limit=2, before=(last.created_at, last.pk))
+        self.assertEqual(page, [posts[2], posts[1]])
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        post = Post.objects.create(author=self.george, text='cluck')
+        follow = Follow.objects.create(follower=self.logan, followee=self.george)
+        self.assertEqual(timeline.get_feed(self.logan), [post])
+        follow.delete()
+        self.assertEqual(timeline.get_feed(self.logan), [])
+
+    def test_large_audience_is_merged_at_read_time(self):
+        Follow.objects.create(follower=self.logan, followee=self.george)
+        Follow.objects.create(follower=self.petra, followee=self.george)
+        Follow.objects.create(follower=self.logan, followee=self.petra)
+        with mock.patch.object(timeline, 'TIMELINE_FANOUT_LIMIT', 2):
+            celebrity_post = Post.objects.create(author=self.george, text='to everyone')
+            normal_post = Post.objects.create(author=self.petra, text='to logan')
+            self.assertFalse(TimelineEntry.objects.filter(owner=self.logan, post=celebrity_post).exists())
+            self.assertEqual(timeline.get_feed(self.logan), [normal_post, celebrity_post])
+
+    def test_trim_keeps_newest_entries(self):
+        posts = [Post.objects.create(author=self.george, text=str(i)) for i in range(5)]
+        timeline.trim(self.george.pk, length=2)
+        entries = TimelineEntry.objects.filter(owner=self.george).order_by('-created_at', '-post_id')
+        self.assertEqual(list(entries.values_list('post_id', flat=True)), [posts[4].pk, posts[3].pk])
+        self.assertEqual(timeline.get_feed(self.george), posts[::-1])
+
+    def test_feed_view_shows_timeline(self):
+        Follow.objects.create(follower=self.logan, followee=self.george)
+        Post.objects.create(author=self.george, text='hello from george')
+        self.client.force_login(self.logan)
+        response = self.client.get(reverse('feed'))
+        self.assertContains(response, 'hello from george')
@@ -0,0 +1,133 @@
+"""Tests of the JSON Lines export and import."""
+import json
+import os
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from microblogs import transfer
+from microblogs.bulk import delete_cascade
+from microblogs.jsonl import parse_lines
+from microblogs.models import Post, PostHashtag, User
+
+
+class TransferTestCase(TestCase):
+    """Tests of the JSON Lines export and import."""
+
+    def setUp(self):
+        self.george = User.objects.create_user(
+            username = '@george',
+            first_name = 'George',
+            last_name = 'Lemons',
+            email = 'georgelemons@apples.org',
+            password = 'Password123',
+        )
+        self.post = Post.objects.create(author=self.george, text='lemons #fruit')
+        Post.objects.filter(pk=self.post.pk).update(created_at=datetime(2021, 5, 4, 3, 2, 1, 123456, dt_timezone.utc))
+        handle, self.path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def _write(self, records):
+        with open(self.path, 'w') as output:
+            for record in records:
+                output.write(record if isinstance(record, str) else json.dumps(record))
+                output.write('\n')
+
+    def _import(self, workers=1, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_jsonl', self.path, workers=workers, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_export_streams_users_before_posts(self):
+        records = [json.loads(line) for line in transfer.export_lines()]
+        self.assertEqual([record['model'] for record in records], ['user', 'post'])
+        self.assertNotIn('password', records[0])
+        self.assertEqual(records[1]['author'], self.george.pk)
+        self.assertEqual(records[1]['created_at'], '2021-05-04T03:02:01.123456+00:00')
+
+    def test_round_trip_remaps_authors_and_keeps_dates(self):
+        call_command('export_jsonl', output=self.path, stdout=StringIO())
+        delete_cascade(User.objects.all())
+        User.objects.create(username='@taken', first_name='T', last_name='T', email='taken@apples.org')
+        out, err = self._import(batch_size=1)
+        self.assertIn('Imported 1 users', out)
+        george = User.objects.get(username='@george')
+        self.assertNotEqual(george.pk, self.george.pk)
+        self.assertTrue(george.check_password('Password123'))
+        post = Post.objects.get()
+        self.assertEqual(post.author, george)
+        self.assertEqual(post.created_at, datetime(2021, 5, 4, 3, 2, 1, 123456, dt_timezone.utc))
+        self.assertEqual(george.posts_count, 1)
+        self.assertTrue(PostHashtag.objects.filter(post=post, hashtag__name='fruit').exists())
+
+    def test_existing_users_are_matched_by_username(self):
+        call_command('export_jsonl', output=self.path, models=['user'], stdout=StringIO())
+        with open(self.path, 'a') as output:
+            output.write(json.dumps({'model': 'post', 'author': self.george.pk, 'text': 'again'}) + '\n')
+        out, _ = self._import()
+        self.assertIn('0 users (1 already present)', out)
+        self.assertEqual(Post.objects.filter(author=self.george).count(), 2)
+
+    def test_importing_a_file_again_does_not_duplicate_posts(self):
+        call_command('export_jsonl', output=self.path, stdout=StringIO())
+        self._import()
+        out, _ = self._import()
+        self.assertIn('0 users (1 already present) and 0 posts (1 already present)', out)
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_ids_that_are_not_numbers_or_strings_are_skipped(self):
+        self._write([
+            {'model': 'user', 'id': [7], 'username': '@listed', 'first_name': 'L', 'last_name': 'D', 'email': 'l@d.org'},
+            {'model': 'post', 'author': {'id': 7}, 'text': 'keyed'},
+            {'model': 'post', 'author': self.george.pk, 'text': 'unknown'},
+        ])
+        out, err = self._import()
+        self.assertIn('skipped 3 lines', out)
+        self.assertIn('Line 1: Users need their exported id', err)
+        self.assertIn("Line 2: Unknown author {'id': 7}", err)
+        self.assertFalse(User.objects.filter(username='@listed').exists())
+
+    def test_invalid_lines_are_reported_and_skipped(self):
+        self._write([
+            {'model': 'user', 'id': 7, 'username': 'nobody', 'first_name': 'N', 'last_name': 'B', 'email': 'n@b.org'},
+            {'model': 'user', 'id': 8, 'username': '@sally', 'first_name': 'S', 'last_name': 'O', 'email': 'georgelemons@apples.org'},
+            {'model': 'post', 'author': 99, 'text': 'orphan'},
+            {'model': 'post', 'author': 8, 'text': 'x' * 281},
+            'not json',
+            {'model': 'follow'},
+        ])
+        out, err = self._import()
+        self.assertIn('skipped 6 lines', out)
+        self.assertIn('Line 1: username', err)
+        self.assertIn('Line 2: Username or email of @sally is already in use', err)
+        self.assertIn('Line 3: Unknown author 99', err)
+        self.assertIn('Line 5: Invalid JSON', err)
+        self.assertFalse(User.objects.filter(username='@sally').exists())
+
+    def test_parse_lines_in_worker_processes(self):
+        call_command('export_jsonl', output=self.path, stdout=StringIO())
+        delete_cascade(User.objects.all())
+        out, _ = self._import(workers=2)
+        self.assertIn('Imported 1 users', out)
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_parse_lines_numbers_lines(self):
+        records, errors = parse_lines(10, ['{"model": "post", "created_at": "2020-01-01T00:00:00"}\n', '\n', '{}\n'])
+        self.assertEqual(records[0][0], 10)
+        self.assertEqual(records[0][1]['created_at'], datetime(2020, 1, 1))
+        self.assertEqual(errors[0][0], 12)
+
+    def test_export_view_is_staff_only_and_streams(self):
+        self.client.force_login(self.george)
+        self.assertEqual(self.client.get(reverse('export_jsonl')).status_code, 403)
+        self.george.is_staff = True
+        self.george.save()
+        response = self.client.get(reverse('export_jsonl'), {'model': 'post'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['model'] for line in lines], ['post'])
@@ -0,0 +1,111 @@
+"""Tests of trending hashtags."""
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from microblogs import trending
+from microblogs.models import Hashtag, HashtagBucket, Post, User
+
+
+class TrendingTestCase(TestCase):
+    """Tests of trending hashtags."""
+
+    def setUp(self):
+        caches[trending.CACHE_ALIAS].delete_many([trending.SNAPSHOT_KEY, trending.REFRESH_LOCK_KEY])
+        self.george = User.objects.create(
+            username = '@george',
+            first_name = 'George',
+            last_name = 'Lemons',
+            email = 'georgelemons@apples.org',
+        )
+
+    def _bucket(self, name, minutes_ago, count):
+        hashtag, _ = Hashtag.objects.get_or_create(name=name)
+        started_at = trending.bucket_start(timezone.now() - timedelta(minutes=minutes_ago))
+        HashtagBucket.objects.create(hashtag=hashtag, started_at=started_at, count=count)
+
+    def test_posts_are_counted_in_their_bucket(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(author=self.george, text='#lemons')
+            Post.objects.create(author=self.george, text='#lemons and #limes')
+        bucket = HashtagBucket.objects.get(hashtag__name='lemons')
+        self.assertEqual(bucket.count, 2)
+        self.assertEqual(bucket.started_at, trending.bucket_start(timezone.now()))
+
+    def test_edits_are_not_counted_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.george, text='#lemons')
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        self.assertEqual(HashtagBucket.objects.get().count, 1)
+
+    def test_uses_are_counted_once_the_post_commits(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Post.objects.create(author=self.george, text='#lemons')
+            self.assertFalse(HashtagBucket.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(HashtagBucket.objects.get().count, 1)
+
+    def test_snapshots_expire(self):
+        trending.refresh()
+        with mock.patch.object(trending, 'SNAPSHOT_TIMEOUT', 0):
+            trending.refresh()
+        self.assertIsNone(caches[trending.CACHE_ALIAS].get(trending.SNAPSHOT_KEY))
+
+    def test_bulk_uses_are_summed_per_bucket(self):
+        hashtag = Hashtag.objects.create(name='bulk')
+        now = timezone.now()
+        with self.assertNumQueries(2):
+            trending.record([(hashtag.pk, now)] * 50)
+        self.assertEqual(HashtagBucket.objects.get().count, 50)
+
+    def test_recent_uses_outrank_older_ones(self):
+        self._bucket('old', 50, 10)
+        self._bucket('new', 1, 5)
+        self.assertEqual([row['name'] for row in trending.compute()], ['new', 'old'])
+
+    def test_compute_keeps_only_the_top_hashtags(self):
+        for i in range(5):
+            self._bucket(f'tag{i}', 1, i + 1)
+        top = trending.compute(size=2)
+        self.assertEqual([row['name'] for row in top], ['tag4', 'tag3'])
+        self.assertEqual(top[0]['count'], 5)
+
+    def test_buckets_outside_the_window_are_ignored_and_pruned(self):
+        self._bucket('expired', trending.WINDOW.total_seconds() / 60 + 5, 100)
+        self.assertEqual(trending.compute(), [])
+        self.assertEqual(trending.prune(), 1)
+        self.assertFalse(HashtagBucket.objects.exists())
+
+    def test_snapshot_is_served_until_refreshed(self):
+        self._bucket('first', 1, 1)
+        self.assertEqual(trending.snapshot()['hashtags'][0]['name'], 'first')
+        self._bucket('second', 1, 5)
+        self.assertEqual(len(trending.snapshot()['hashtags']), 1)
+        call_command('refresh_trending', stdout=StringIO())
+        self.assertEqual(trending.snapshot()['hashtags'][0]['name'], 'second')
+
+    def test_missing_snapshot_is_computed_by_one_reader_only(self):
+        self._bucket('first', 1, 1)
+        caches[trending.CACHE_ALIAS].add(trending.REFRESH_LOCK_KEY, True)
+        with self.assertNumQueries(0):
+            self.assertEqual(trending.snapshot(), {'generated_at': None, 'hashtags': []})
+        caches[trending.CACHE_ALIAS].delete(trending.REFRESH_LOCK_KEY)
+        self.assertEqual(trending.snapshot()['hashtags'][0]['name'], 'first')
+        self.assertIsNone(caches[trending.CACHE_ALIAS].get(trending.REFRESH_LOCK_KEY))
+
+    def test_trending_json(self):
+        self._bucket('json', 1, 3)
+        response = self.client.get(reverse('trending_json'))
+        self.assertEqual(response.json()['hashtags'][0]['name'], 'json')
+
+    def test_feed_shows_trending_hashtags(self):
+        self._bucket('sidebar', 1, 3)
+        self.assertContains(self.client.get(reverse('feed')), '#sidebar')
@@ -0,0 +1,48 @@
+"""Tests of the unseeder command."""
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from microblogs import graph
+from microblogs.management.commands.seed import USERNAME_PREFIX
+from microblogs.models import Follow, Post, TimelineEntry, User
+
+
+class UnseederCommandTestCase(TestCase):
+    """Tests of the unseeder command."""
+
+    def setUp(self):
+        self.george = User.objects.create(
+            username = '@george',
+            first_name = 'George',
+            last_name = 'Lemons',
+            email = 'georgelemons@apples.org',
+        )
+        self.post = Post.objects.create(author=self.george, text='I am not seeded')
+        call_command('seed', users=8, posts=30, follows=20, batch_size=5, workers=1, stdout=StringIO())
+        self.seeded = User.objects.filter(username__startswith=USERNAME_PREFIX)
+
+    def test_unseeder_deletes_seeded_data_only(self):
+        call_command('unseeder', batch_size=3, stdout=StringIO())
+        self.assertFalse(self.seeded.exists())
+        self.assertEqual(list(User.objects.all()), [self.george])
+        self.assertEqual(list(Post.objects.all()), [self.post])
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(TimelineEntry.objects.count(), 1)
+
+    def test_unseeder_repairs_counters_of_real_users(self):
+        seeded = list(self.seeded[:2])
+        graph.follow(self.george, seeded[0])
+        graph.follow(seeded[1], self.george)
+        call_command('unseeder', batch_size=3, stdout=StringIO())
+        self.george.refresh_from_db()
+        self.assertEqual(self.george.followers_count, 0)
+        self.assertEqual(self.george.following_count, 0)
+        self.assertEqual(self.george.posts_count, 1)
+
+    def test_unseeder_can_run_again(self):
+        call_command('unseeder', stdout=StringIO())
+        out = StringIO()
+        call_command('unseeder', stdout=out)
+        self.assertIn('Deleted 0 seeded users', out.getvalue())
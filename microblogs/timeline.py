@@ -0,0 +1,210 @@
+"""Materialized per-user timelines.
+
+Posts are pushed into each follower's timeline when they are written
+(fan-out-on-write), so reading a feed page is one index range scan over
+TimelineEntry. Authors with a very large audience are skipped at write time
+and their recent posts are merged into the page when it is read instead
+(fan-out-on-read), so a single post can never turn into a write storm.
+"""
+import asyncio
+import heapq
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+
+from microblogs import archive, sharding
+from microblogs.cache import bump_authors, bump_feeds
+from microblogs.models import Follow, Post, TimelineEntry, User
+from microblogs.pagination import older_than
+
+TIMELINE_LENGTH = getattr(settings, 'TIMELINE_LENGTH', 800)
+TIMELINE_FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 10000)
+TIMELINE_TRIM_INTERVAL = getattr(settings, 'TIMELINE_TRIM_INTERVAL', 50)
+FEED_PAGE_SIZE = getattr(settings, 'FEED_PAGE_SIZE', 50)
+FANOUT_BATCH_SIZE = 1000
+
+
+def is_fanout_author(author_id):
+    #Authors at or over the limit are read at feed time instead of pushed
+    return follower_count(author_id) < TIMELINE_FANOUT_LIMIT
+
+def follower_count(user_id):
+    counts = User.objects.filter(pk=user_id).values_list('followers_count', flat=True)
+    return next(iter(counts), 0)
+
+def fan_out(post):
+    #Push a freshly written post into its author's and followers' timelines
+    recipients = [post.author_id]
+    _push(post, recipients)
+    if not is_fanout_author(post.author_id):
+        return
+    followers = (
+        Follow.objects
+        .filter(followee_id=post.author_id)
+        .values_list('follower_id', flat=True)
+        .iterator(chunk_size=FANOUT_BATCH_SIZE)
+    )
+    batch = []
+    for follower_id in followers:
+        batch.append(follower_id)
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            _push(post, batch)
+            batch = []
+    if batch:
+        _push(post, batch)
+
+def bulk_fan_out(posts):
+    #Fan out a batch of posts written with bulk_create, which sends no signals
+    author_ids = {post.author_id for post in posts}
+    fanout_authors = author_ids - set(
+        User.objects
+        .filter(pk__in=author_ids, followers_count__gte=TIMELINE_FANOUT_LIMIT)
+        .values_list('pk', flat=True)
+    )
+    followers = defaultdict(list)
+    follows = (
+        Follow.objects
+        .filter(followee_id__in=fanout_authors)
+        .values_list('follower_id', 'followee_id')
+        .iterator(chunk_size=FANOUT_BATCH_SIZE)
+    )
+    for follower_id, followee_id in follows:
+        followers[followee_id].append(follower_id)
+    entries = [
+        TimelineEntry(owner_id=owner_id, post_id=post.pk, created_at=post.created_at)
+        for post in posts
+        for owner_id in [post.author_id] + followers[post.author_id]
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=FANOUT_BATCH_SIZE, ignore_conflicts=True)
+    bump_feeds({entry.owner_id for entry in entries})
+    bump_authors(author_ids)
+
+def _push(post, owner_ids):
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(owner_id=owner_id, post_id=post.pk, created_at=post.created_at)
+            for owner_id in owner_ids
+        ],
+        ignore_conflicts = True,
+    )
+    bump_feeds(owner_ids)
+    #Trimming every timeline on every push would double the write cost, so
+    #each owner is only trimmed on roughly one push in TIMELINE_TRIM_INTERVAL
+    for owner_id in owner_ids:
+        if (owner_id + post.pk) % TIMELINE_TRIM_INTERVAL == 0:
+            trim(owner_id)
+
+def trim(owner_id, length=TIMELINE_LENGTH):
+    #Drop everything older than the newest `length` entries of a timeline
+    entries = TimelineEntry.objects.filter(owner_id=owner_id)
+    boundary = (
+        entries
+        .order_by('-created_at', '-post_id')
+        .values_list('created_at', 'post_id')[length:length + 1]
+    )
+    boundary = list(boundary)
+    if not boundary:
+        return 0
+    created_at, post_id = boundary[0]
+    deleted, _ = entries.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, post_id__lte=post_id)
+    ).delete()
+    return deleted
+
+def backfill(owner_id, author_id, limit=TIMELINE_LENGTH):
+    #Copy an author's recent posts into a timeline, e.g. after a new follow
+    if not is_fanout_author(author_id):
+        return
+    recent = (
+        Post.objects
+        .filter(author_id=author_id)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:limit]
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(owner_id=owner_id, post_id=post_id, created_at=created_at)
+            for post_id, created_at in recent
+        ],
+        ignore_conflicts = True,
+    )
+    bump_feeds([owner_id])
+
+def remove_author(owner_id, author_id):
+    #Take an author's posts back out of a timeline, e.g. after an unfollow
+    TimelineEntry.objects.filter(owner_id=owner_id, post__author_id=author_id).delete()
+    bump_feeds([owner_id])
+
+def celebrity_followees(user_id):
+    #Followees whose posts were not pushed and must be merged at read time
+    return (
+        User.objects
+        .filter(follower_links__follower_id=user_id, followers_count__gte=TIMELINE_FANOUT_LIMIT)
+        .values_list('pk', flat=True)
+    )
+
+def pushed_keys(user_id, limit, before=None):
+    #(created_at, post_id) keys of the newest entries materialized for a user
+    entries = older_than(TimelineEntry.objects.filter(owner_id=user_id), before, 'post_id')
+    return entries.order_by('-created_at', '-post_id').values_list('created_at', 'post_id')[:limit]
+
+def pulled_keys(author_ids, limit, before=None):
+    #(created_at, post_id) keys of the newest posts of authors merged at read time
+    posts = older_than(Post.objects.filter(author_id__in=author_ids), before)
+    return posts.order_by('-created_at', '-id').values_list('created_at', 'id')[:limit]
+
+def merge_keys(sources, limit):
+    #Merge newest-first key lists into at most `limit` distinct post ids
+    post_ids = []
+    seen = set()
+    for created_at, post_id in heapq.merge(*sources, reverse=True):
+        if post_id in seen:
+            continue
+        seen.add(post_id)
+        post_ids.append(post_id)
+        if len(post_ids) == limit:
+            break
+    return post_ids
+
+def get_feed(user, limit=FEED_PAGE_SIZE, before=None):
+    """Return up to `limit` posts of the user's feed, newest first.
+
+    `before` is an optional (created_at, post_id) pair; only posts strictly
+    older than it are returned, which lets callers page through the feed
+    without OFFSET. With posts sharded, the feed is merged from the shards;
+    otherwise it continues with older posts, then the archive, once the
+    timeline runs out.
+    """
+    if sharding.enabled():
+        return sharding.get_feed(user.pk, limit, before)
+    sources = [list(pushed_keys(user.pk, limit, before))]
+    celebrities = list(celebrity_followees(user.pk))
+    if celebrities:
+        sources.append(list(pulled_keys(celebrities, limit, before)))
+    post_ids = merge_keys(sources, limit)
+    posts = Post.objects.select_related('author').in_bulk(post_ids)
+    posts = [posts[post_id] for post_id in post_ids if post_id in posts]
+    return archive.fill_feed(user.pk, posts, limit, before)
+
+async def aget_feed(user_id, limit=FEED_PAGE_SIZE, before=None):
+    #Async get_feed: the timeline and the read-time authors are fetched concurrently
+    if sharding.enabled():
+        return await sync_to_async(sharding.get_feed)(user_id, limit, before)
+    pushed, celebrities = await asyncio.gather(
+        _alist(pushed_keys(user_id, limit, before)),
+        _alist(celebrity_followees(user_id)),
+    )
+    sources = [pushed]
+    if celebrities:
+        sources.append(await _alist(pulled_keys(celebrities, limit, before)))
+    post_ids = merge_keys(sources, limit)
+    posts = await Post.objects.select_related('author').ain_bulk(post_ids)
+    posts = [posts[post_id] for post_id in post_ids if post_id in posts]
+    if len(posts) < limit:
+        posts = await sync_to_async(archive.fill_feed)(user_id, posts, limit, before)
+    return posts
+
+async def _alist(queryset):
+    return [row async for row in queryset]
@@ -0,0 +1,209 @@
+"""Bulk export and import of users and posts as JSON Lines.
+
+Every line is one JSON object with a "model" of "user" or "post". Exports
+stream rows in primary key order with iterator(), which uses a server-side
+cursor where the database has them, so memory stays flat whatever the table
+size; users come first so that an import sees every author before its posts.
+Imports validate each batch with the model field validators, check unique
+fields with one query per batch, create rows with bulk_create, and map the
+exported user ids to the ids the users get here.
+"""
+import json
+from collections import Counter, defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from microblogs import cache, tags, timeline
+from microblogs.models import Post, User
+
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 1000
+
+#Exported columns, by model name
+USER_FIELDS = ['id', 'username', 'first_name', 'last_name', 'email', 'bio', 'is_active', 'date_joined']
+POST_FIELDS = ['id', 'author', 'text', 'created_at']
+EXPORTS = {
+    'user': (User, USER_FIELDS),
+    'post': (Post, POST_FIELDS),
+}
+
+
+def export_lines(models=('user', 'post'), chunk_size=EXPORT_CHUNK_SIZE, include_passwords=False):
+    """Yield one JSON line per row of the given models.
+
+    Password hashes are only included on request, for moving accounts
+    between installations.
+    """
+    for name in models:
+        model, fields = EXPORTS[name]
+        if include_passwords and model is User:
+            fields = fields + ['password']
+        columns = ['author_id' if field == 'author' else field for field in fields]
+        rows = model.objects.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+        for row in rows:
+            record = {'model': name}
+            record.update(zip(fields, row))
+            yield json.dumps(record, default=_encode) + '\n'
+
+
+class Importer:
+    """Imports batches of parsed records, keeping the id map between batches.
+
+    Invalid records are skipped and collected in `errors` as (lineno,
+    message) pairs; `counts` holds the users created, users matched to an
+    existing user of the same username, posts created and posts already
+    present.
+
+    A user whose username is taken here is taken to be the same person, so
+    their posts are attached to the local account; only import files from
+    an installation whose accounts belong to the same people. A post equal
+    in author, created_at and text to an existing one is not created again,
+    so importing a file twice does not duplicate its posts.
+    """
+
+    def __init__(self):
+        self.user_ids = {}
+        self.counts = Counter()
+        self.errors = []
+
+    def import_records(self, records):
+        #`records` are (lineno, record) pairs as returned by jsonl.parse_lines
+        users = [(lineno, record) for lineno, record in records if record['model'] == 'user']
+        posts = [(lineno, record) for lineno, record in records if record['model'] == 'post']
+        with transaction.atomic():
+            if users:
+                self._import_users(users)
+            if posts:
+                self._import_posts(posts)
+
+    def _import_users(self, records):
+        candidates = []
+        for lineno, record in records:
+            if not _is_id(record.get('id')):
+                self.errors.append((lineno, 'Users need their exported id, a number or a string'))
+                continue
+            user = User(
+                username = record.get('username'),
+                first_name = record.get('first_name'),
+                last_name = record.get('last_name'),
+                email = record.get('email'),
+                bio = record.get('bio') or '',
+                is_active = record.get('is_active', True),
+                date_joined = _aware(record.get('date_joined')) or timezone.now(),
+                #Accounts exported without their hash cannot log in until reset
+                password = record.get('password') or make_password(None),
+            )
+            if self._clean(lineno, user, exclude=['last_login']):
+                candidates.append((lineno, record['id'], user))
+        existing = dict(
+            User.objects
+            .filter(username__in=[user.username for _, _, user in candidates])
+            .values_list('username', 'pk')
+        )
+        taken_emails = set(
+            User.objects
+            .filter(email__in=[user.email for _, _, user in candidates])
+            .exclude(username__in=existing)
+            .values_list('email', flat=True)
+        )
+        new = []
+        seen_usernames, seen_emails = set(), set()
+        for lineno, exported_id, user in candidates:
+            if user.username in existing:
+                self.user_ids[exported_id] = existing[user.username]
+                self.counts['users_matched'] += 1
+            elif user.email in taken_emails or user.email in seen_emails or user.username in seen_usernames:
+                self.errors.append((lineno, f'Username or email of {user.username} is already in use'))
+            else:
+                seen_usernames.add(user.username)
+                seen_emails.add(user.email)
+                new.append((exported_id, user))
+        User.objects.bulk_create([user for _, user in new])
+        for exported_id, user in new:
+            self.user_ids[exported_id] = user.pk
+        cache.bump_users([user.pk for _, user in new])
+        cache.bump_feeds([user.pk for _, user in new])
+        self.counts['users_created'] += len(new)
+
+    def _import_posts(self, records):
+        new = []
+        for lineno, record in records:
+            author_id = self.user_ids.get(record.get('author')) if _is_id(record.get('author')) else None
+            if author_id is None:
+                self.errors.append((lineno, f"Unknown author {record.get('author')}"))
+                continue
+            post = Post(
+                author_id = author_id,
+                text = record.get('text'),
+                created_at = _aware(record.get('created_at')) or timezone.now(),
+            )
+            if self._clean(lineno, post, exclude=['author']):
+                new.append(post)
+        new = self._drop_present(new)
+        if not new:
+            return
+        #auto_now_add overwrites the imported dates on create, so they are put back after
+        created_at = [post.created_at for post in new]
+        Post.objects.bulk_create(new)
+        for post, value in zip(new, created_at):
+            post.created_at = value
+        Post.objects.bulk_update(new, ['created_at'])
+        #bulk_create sends no signals, so derived data is maintained here as in seed
+        cache.bump_posts([post.pk for post in new])
+        timeline.bulk_fan_out(new)
+        tags.index_posts(new)
+        _add_posts_counts(Counter(post.author_id for post in new))
+        self.counts['posts_created'] += len(new)
+
+    def _drop_present(self, posts):
+        #Posts already imported by an earlier run, found with one query
+        if not posts:
+            return posts
+        present = set(
+            Post.objects
+            .filter(
+                author_id__in = {post.author_id for post in posts},
+                created_at__in = {post.created_at for post in posts},
+            )
+            .values_list('author_id', 'created_at', 'text')
+        )
+        new = [post for post in posts if (post.author_id, post.created_at, post.text) not in present]
+        self.counts['posts_matched'] += len(posts) - len(new)
+        return new
+
+    def _clean(self, lineno, instance, exclude):
+        try:
+            instance.clean_fields(exclude=exclude)
+        except ValidationError as error:
+            fields = ', '.join(f'{field}: {" ".join(messages)}' for field, messages in error.message_dict.items())
+            self.errors.append((lineno, fields))
+            return False
+        return True
+
+
+def _add_posts_counts(counts):
+    #One UPDATE per distinct delta, as graph.apply_follow_deltas does
+    by_delta = defaultdict(list)
+    for author_id, delta in counts.items():
+        by_delta[delta].append(author_id)
+    for delta, author_ids in by_delta.items():
+        User.objects.filter(pk__in=author_ids).update(posts_count=F('posts_count') + delta)
+
+def _is_id(value):
+    #Exported ids are only used as keys of the id map
+    return isinstance(value, (int, str)) and not isinstance(value, bool)
+
+def _aware(value):
+    if isinstance(value, datetime) and timezone.is_naive(value):
+        return timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
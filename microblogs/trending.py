@@ -0,0 +1,122 @@
+"""Trending hashtags over a sliding window of time buckets.
+
+Every post using a hashtag increments that hashtag's counter for the bucket
+the post was created in, so writes touch one small row per hashtag and the
+Post table is never aggregated. Scoring streams the buckets of the current
+window ordered by hashtag, decays each bucket by its age, and keeps only the
+best TRENDING_SIZE hashtags in a heap, so memory stays constant however many
+hashtags are in use. The result is stored as a snapshot in the shared cache
+for TRENDING_SNAPSHOT_TIMEOUT seconds, refreshed by the refresh_trending
+command, and requests only read that. Uses are counted once the posts using
+them commit.
+"""
+import heapq
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from microblogs.models import Hashtag, HashtagBucket
+
+BUCKET_SECONDS = getattr(settings, 'TRENDING_BUCKET_SECONDS', 60)
+WINDOW = timedelta(minutes=getattr(settings, 'TRENDING_WINDOW_MINUTES', 60))
+HALF_LIFE_MINUTES = getattr(settings, 'TRENDING_HALF_LIFE_MINUTES', 15)
+SIZE = getattr(settings, 'TRENDING_SIZE', 10)
+#Seconds a snapshot is served for; refresh_trending replaces it sooner
+SNAPSHOT_TIMEOUT = getattr(settings, 'TRENDING_SNAPSHOT_TIMEOUT', 300)
+CACHE_ALIAS = getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')
+SNAPSHOT_KEY = 'trending:snapshot'
+REFRESH_LOCK_KEY = 'trending:refreshing'
+#Seconds a reader may hold the refresh lock; longer than a refresh ever takes
+REFRESH_LOCK_TIMEOUT = 60
+STREAM_CHUNK_SIZE = 2000
+
+
+def bucket_start(moment):
+    timestamp = int(moment.timestamp())
+    return datetime.fromtimestamp(timestamp - timestamp % BUCKET_SECONDS, tz=dt_timezone.utc)
+
+def record(uses):
+    """Add hashtag uses to their buckets.
+
+    `uses` is an iterable of (hashtag_id, created_at) pairs, one per post
+    using the hashtag. Uses are summed per bucket first, so a batch costs one
+    insert plus one update per distinct (hashtag, bucket) pair.
+    """
+    counts = Counter((hashtag_id, bucket_start(created_at)) for hashtag_id, created_at in uses)
+    if not counts:
+        return
+    with transaction.atomic(savepoint=False):
+        HashtagBucket.objects.bulk_create(
+            [HashtagBucket(hashtag_id=hashtag_id, started_at=started_at) for hashtag_id, started_at in counts],
+            ignore_conflicts = True,
+        )
+        #F() increments stay correct when several processes count the same bucket
+        for (hashtag_id, started_at), count in counts.items():
+            HashtagBucket.objects.filter(hashtag_id=hashtag_id, started_at=started_at).update(
+                count = F('count') + count
+            )
+
+def compute(now=None, size=SIZE):
+    #Return the `size` hashtags with the highest decayed counts, best first
+    now = now or timezone.now()
+    rows = (
+        HashtagBucket.objects
+        .filter(started_at__gt=now - WINDOW, started_at__lte=now)
+        .order_by('hashtag_id')
+        .values_list('hashtag_id', 'started_at', 'count')
+        .iterator(chunk_size=STREAM_CHUNK_SIZE)
+    )
+    heap = []
+    for hashtag_id, buckets in groupby(rows, key=itemgetter(0)):
+        score = total = 0
+        for _, started_at, count in buckets:
+            age = (now - started_at).total_seconds() / 60
+            score += count * 0.5 ** (age / HALF_LIFE_MINUTES)
+            total += count
+        if len(heap) < size:
+            heapq.heappush(heap, (score, hashtag_id, total))
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, (score, hashtag_id, total))
+    top = sorted(heap, reverse=True)
+    names = Hashtag.objects.in_bulk([hashtag_id for _, hashtag_id, _ in top])
+    return [
+        {'name': names[hashtag_id].name, 'score': round(score, 3), 'count': total}
+        for score, hashtag_id, total in top if hashtag_id in names
+    ]
+
+def refresh(now=None):
+    #Recompute the snapshot served to readers
+    now = now or timezone.now()
+    snapshot = {'generated_at': now.isoformat(), 'hashtags': compute(now)}
+    caches[CACHE_ALIAS].set(SNAPSHOT_KEY, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+def snapshot():
+    """Return the latest snapshot.
+
+    If refresh_trending has not run yet, the one reader that takes the lock
+    computes it; readers arriving meanwhile are served an empty snapshot
+    rather than all scanning the buckets at once.
+    """
+    cache = caches[CACHE_ALIAS]
+    latest = cache.get(SNAPSHOT_KEY)
+    if latest:
+        return latest
+    if not cache.add(REFRESH_LOCK_KEY, True, REFRESH_LOCK_TIMEOUT):
+        return {'generated_at': None, 'hashtags': []}
+    try:
+        return refresh()
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+
+def prune(now=None):
+    #Delete buckets that have left the window; returns how many were deleted
+    now = now or timezone.now()
+    return HashtagBucket.objects.filter(started_at__lte=now - WINDOW).delete()[0]
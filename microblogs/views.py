@@ -1,13 +1,135 @@
-from django.shortcuts import render, redirect
+import asyncio
+import hmac
 
-from microblogs.forms import SignUpForm
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render, redirect
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+
+from microblogs import api, archive, availability, fragments, pagination, profiling, search, tags, timeline, transfer, trending
+from microblogs.ratelimit import ratelimit
+from microblogs.cache import fragment_cache
+from microblogs.forms import PostForm, SignUpForm
+from microblogs.models import Post, User
 
 def home(request):
     return render(request, 'home.html')
 
 def feed(request):
-    return render(request, 'feed.html')
+    return _render_feed(request, PostForm())
+
+@require_POST
+@ratelimit('new_post', by='user')
+def new_post(request):
+    if not request.user.is_authenticated:
+        return redirect('home')
+    form = PostForm(request.POST)
+    if form.is_valid():
+        Post.objects.create(author=request.user, text=form.cleaned_data.get('text'))
+        return redirect('feed')
+    return _render_feed(request, form)
+
+def profile(request, user_id):
+    author = get_object_or_404(User, pk=user_id)
+    try:
+        page = archive.author_page(author.pk, request.GET.get('cursor'))
+    except pagination.InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+    rendered = fragments.render_posts(
+        [(post.pk, post.author_id) for post in page.items],
+        {post.pk: post for post in page.items},
+    )
+    return render(request, 'profile.html', {
+        'author': author, 'posts': rendered, 'next_cursor': page.next_cursor,
+    })
+
+def search_view(request):
+    query = request.GET.get('q', '').strip()
+    kind = 'users' if request.GET.get('kind') == 'users' else 'posts'
+    page = pagination.Page([], None)
+    if query:
+        try:
+            if kind == 'users':
+                page = search.search_users(query, request.GET.get('cursor'))
+            else:
+                page = search.search_posts(query, request.GET.get('cursor'))
+        except pagination.InvalidCursor:
+            return HttpResponseBadRequest('Invalid cursor')
+    results = page.items
+    if kind == 'posts':
+        results = fragments.render_posts(
+            [(post.pk, post.author_id) for post in page.items],
+            {post.pk: post for post in page.items},
+        )
+    return render(request, 'search.html', {
+        'query': query, 'kind': kind, 'results': results, 'next_cursor': page.next_cursor,
+    })
+
+def hashtag(request, name):
+    try:
+        page = tags.hashtag_page(name, request.GET.get('cursor'))
+    except pagination.InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+    return _render_post_list(request, page, f'#{name.lower()}', reverse('hashtag', args=[name]))
+
+def mentions(request):
+    if not request.user.is_authenticated:
+        return redirect('home')
+    try:
+        page = tags.mentions_page(request.user, request.GET.get('cursor'))
+    except pagination.InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+    return _render_post_list(request, page, f'Mentions of {request.user.username}', reverse('mentions'))
+
+def feed_json(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    return _api_response(request, api.feed_response, request.user)
+
+def user_posts_json(request, user_id):
+    return _api_response(request, api.author_response, user_id)
+
+def hashtag_json(request, name):
+    return _api_response(request, api.hashtag_response, name)
+
+def trending_json(request):
+    return JsonResponse(trending.snapshot())
+
+def cache_stats(request):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    return JsonResponse(fragment_cache.stats())
+
+def export_jsonl(request):
+    #Streams the export as it is read, never holding the tables in memory
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    models = [name for name in transfer.EXPORTS if name in request.GET.getlist('model', transfer.EXPORTS)]
+    response = StreamingHttpResponse(transfer.export_lines(models), content_type='application/x-ndjson')
+    response['Content-Disposition'] = 'attachment; filename="clucker.jsonl"'
+    return response
+
+def metrics(request):
+    #Prometheus scrapes without a session, so it sends the token or comes from an allowed address
+    if not (request.user.is_staff or _is_metrics_scraper(request)):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(
+        profiling.registry.prometheus(fragment_cache.stats()),
+        content_type = 'text/plain; version=0.0.4; charset=utf-8',
+    )
 
+@ratelimit('availability', methods=('GET',), json=True)
+def availability_json(request):
+    #Live checks for the sign up form, e.g. ?username=@name&email=name@example.org
+    fields = [field for field in availability.FIELDS if field in request.GET]
+    if not fields:
+        return JsonResponse({'error': 'Pass a username or an email'}, status=400)
+    return JsonResponse({field: availability.check(field, request.GET[field]) for field in fields})
+
+@ratelimit('sign_up')
 def sign_up(request):
     if request.method == 'POST':
         form = SignUpForm(request.POST)
@@ -17,3 +139,114 @@ def sign_up(request):
     else:
         form = SignUpForm()
     return render(request, 'sign_up.html', {'form': form})
+
+#Async counterparts of the feed, posting and profile views for ASGI servers.
+#They use the async ORM so a worker is not tied up while waiting on queries.
+
+async def feed_async(request):
+    user = await _aget_user(request)
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    try:
+        before = pagination.decode_cursor(request.GET.get('cursor'))
+    except pagination.InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    limit = pagination.PAGE_SIZE
+    posts = await timeline.aget_feed(user.pk, limit + 1, before)
+    return JsonResponse(_page_json(pagination.make_page(posts, limit)))
+
+@ratelimit('new_post', by='user', json=True)
+async def new_post_async(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    user = await _aget_user(request)
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    form = PostForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    post = await Post.objects.acreate(author=user, text=form.cleaned_data.get('text'))
+    return JsonResponse(_post_json(post), status=201)
+
+async def profile_async(request, user_id):
+    try:
+        author, page = await asyncio.gather(
+            User.objects.aget(pk=user_id),
+            archive.aauthor_page(user_id, request.GET.get('cursor')),
+        )
+    except User.DoesNotExist:
+        return JsonResponse({'error': 'No such user'}, status=404)
+    except pagination.InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    for post in page.items:
+        Post.author.field.set_cached_value(post, author)
+    data = _page_json(page)
+    data['user'] = _user_json(author)
+    return JsonResponse(data)
+
+async def _aget_user(request):
+    #request.user loads lazily with a blocking query, so resolve it in a thread
+    return await sync_to_async(get_user)(request)
+
+def _render_feed(request, form):
+    posts, next_cursor = [], None
+    if request.user.is_authenticated:
+        try:
+            posts, next_cursor = fragments.feed_fragments(request.user, request.GET.get('cursor'))
+        except pagination.InvalidCursor:
+            return HttpResponseBadRequest('Invalid cursor')
+    return render(request, 'feed.html', {
+        'form': form, 'posts': posts, 'next_cursor': next_cursor,
+        'trending': trending.snapshot()['hashtags'],
+    })
+
+def _render_post_list(request, page, heading, url):
+    rendered = fragments.render_posts(
+        [(post.pk, post.author_id) for post in page.items],
+        {post.pk: post for post in page.items},
+    )
+    return render(request, 'post_list.html', {
+        'heading': heading, 'posts': rendered, 'url': url, 'next_cursor': page.next_cursor,
+    })
+
+def _is_metrics_scraper(request):
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+def _api_response(request, respond, subject):
+    #Pages of microblogs.api: ?cursor= pages on and ?fields= picks the fields
+    try:
+        fields = api.parse_fields(request.GET.get('fields'))
+        return respond(request, subject, request.GET.get('cursor'), fields)
+    except api.InvalidFields as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    except pagination.InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+def _page_json(page):
+    return {
+        'posts': [_post_json(post) for post in page.items],
+        'next_cursor': page.next_cursor,
+    }
+
+def _post_json(post):
+    return {
+        'id': post.pk,
+        'author': post.author.username,
+        'text': post.text,
+        'created_at': post.created_at.isoformat(),
+    }
+
+def _user_json(user):
+    return {
+        'id': user.pk,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'bio': user.bio,
+        'followers_count': user.followers_count,
+        'following_count': user.following_count,
+        'posts_count': user.posts_count,
+    }